@@ -4,9 +4,11 @@ import asyncio
 import dotenv
 
 from src.jsonl_session import JsonlSession
+from src.session_store import open_session
 from src.load_agent import create_handoff_obj, load_main_agent, load_sub_agents
 from src.cli_run_session import run_session, session_cleanup
 from src.logger import logger
+from src.search_index import start_indexer as start_search_indexer
 
 
 if __name__ == "__main__":
@@ -17,6 +19,7 @@ if __name__ == "__main__":
 
     logger.setup()
     logger.log("app.start")
+    start_search_indexer()
 
     while True:
         try:
@@ -27,7 +30,7 @@ if __name__ == "__main__":
             agent.handoffs = [create_handoff_obj(sub_agent) for sub_agent in agents_list]
 
             # Create a session
-            session = JsonlSession("cli", path="data/sessions/cli.jsonl")
+            session = open_session("cli", path="data/sessions/cli.jsonl")
 
             # Start session
             asyncio.run(run_session(agent, session))
@@ -37,7 +40,10 @@ if __name__ == "__main__":
             # Raised by archive_session tool
             if e.code == 94: # Start a new session
                 logger.log("app.start_new_session")
-                session_cleanup(session_path="data/sessions/cli.jsonl")
+                if isinstance(session, JsonlSession):
+                    session_cleanup(session_path="data/sessions/cli.jsonl")
+                else:
+                    asyncio.run(session.clear_session())
 
             # Raised by request_restart tool
             elif e.code == 95: # Exit application
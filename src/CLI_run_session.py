@@ -5,8 +5,12 @@ import time
 
 from agents import Runner, MaxTurnsExceeded
 
+from src.budget_session import with_token_budget
 from src.jsonl_session import JsonlSession
+from src.session_segments import remove_segments
+from src.sqlite_session import SqliteSession
 
+from src.load_agent import recall_query
 from src.logger import logger
 from src.settings import settings
 
@@ -26,10 +30,11 @@ def session_cleanup(session_path: str = "data/sessions/0.jsonl"):
         os.fsync(f.fileno())
 
     os.replace(tmp_path, session_path)
+    remove_segments(session_path)
     logger.log("session.cleanup_completed")
 
 
-async def run_session(agent, session: JsonlSession):
+async def run_session(agent, session: JsonlSession | SqliteSession):
     """Create agents and session, run the main chat loop."""
 
     current_agent = agent
@@ -46,10 +51,11 @@ async def run_session(agent, session: JsonlSession):
         logger.log("chat role=user input=" + user_input.replace("\n", "\\n"))
 
         try:
+            recall_query.set(user_input)
             result = await Runner.run(
                 current_agent,
                 user_input,
-                session=session, # type: ignore
+                session=with_token_budget(session), # type: ignore
                 max_turns=settings.default_max_turns,
             )
 
@@ -57,6 +63,9 @@ async def run_session(agent, session: JsonlSession):
             if last_agent is not None:
                 current_agent = last_agent
 
+            # Turn boundary: make this turn's items durable.
+            await session.flush()
+
             name = getattr(current_agent, "name", "Agent")
             print(f"{name}: {result.final_output}")
             logger.log("chat role=assistant name=" + name + " output=" + str(result.final_output).replace("\n", "\\n"))
@@ -0,0 +1,127 @@
+"""Pool of ready-made agent bundles for new sessions.
+
+Building an agent bundle (main agent + sub-agents + handoffs) is pure CPU and
+file work, so it is done ahead of time in a worker thread and handed out on
+demand.
+
+Notes:
+    - Bundles carry per-build values (e.g. <CURRENT_DATETIME>), so bundles
+      older than `AGENT_POOL_MAX_AGE_S` are discarded instead of handed out.
+      While the pool is full, the refill loop rebuilds each bundle as it
+      expires, so an idle app still has fresh bundles ready.
+    - `take()` never waits for a refill: with an empty pool it builds inline,
+      which is what happened before the pool existed.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable
+
+from src.logger import logger
+
+
+AGENT_POOL_SIZE = 2
+AGENT_POOL_MAX_AGE_S = 300.0
+
+
+class AgentPool:
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        *,
+        size: int = AGENT_POOL_SIZE,
+        max_age_s: float = AGENT_POOL_MAX_AGE_S,
+    ):
+        self.factory = factory
+        self.size = size
+        self.max_age_s = max_age_s
+        # (built_at monotonic, bundle), oldest first
+        self._ready: deque[tuple[float, Any]] = deque()
+        self._refill_task: asyncio.Task | None = None
+        # Wakes a refill loop waiting on a full pool.
+        self._wake = asyncio.Event()
+        self._generation = 0
+
+    def _pop_fresh(self) -> Any | None:
+        self._drop_expired()
+        return self._ready.pop()[1] if self._ready else None
+
+    def _drop_expired(self) -> None:
+        now = time.monotonic()
+        while self._ready and now - self._ready[0][0] > self.max_age_s:
+            self._ready.popleft()
+
+    def take(self) -> Any:
+        """Return a pooled bundle (or build one inline) and schedule a refill."""
+
+        bundle = self._pop_fresh()
+        if bundle is None:
+            logger.log("agents.pool miss")
+            bundle = self.factory()
+        self._schedule_refill()
+        return bundle
+
+    async def take_async(self) -> Any:
+        """Like `take()`, but a miss builds in a worker thread."""
+
+        bundle = self._pop_fresh()
+        if bundle is None:
+            logger.log("agents.pool miss")
+            bundle = await asyncio.to_thread(self.factory)
+        self._schedule_refill()
+        return bundle
+
+    def clear(self) -> None:
+        """Drop pooled bundles (e.g. after agent configs changed)."""
+
+        self._ready.clear()
+        # A refill in flight may still be building from the old configs.
+        self._generation += 1
+        self._schedule_refill()
+
+    def start(self) -> None:
+        """Fill the pool in the background (call on the running loop)."""
+
+        self._schedule_refill()
+
+    async def stop(self) -> None:
+        task, self._refill_task = self._refill_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _schedule_refill(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = loop.create_task(self._refill())
+        else:
+            self._wake.set()
+
+    async def _refill(self) -> None:
+        while True:
+            self._drop_expired()
+            if len(self._ready) >= self.size:
+                # Full: wait for a take/clear, or for the oldest bundle to expire.
+                self._wake.clear()
+                timeout = self._ready[0][0] + self.max_age_s - time.monotonic() + 0.01
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            generation = self._generation
+            t0 = time.perf_counter()
+            try:
+                bundle = await asyncio.to_thread(self.factory)
+            except Exception as e:
+                logger.log(f"agents.pool build_failed err={e!r}")
+                return
+            if generation != self._generation:
+                continue
+            self._ready.append((time.monotonic(), bundle))
+            elapsed_ms = int((time.perf_counter() - t0) * 1000)
+            logger.log(f"agents.pool ready={len(self._ready)} build_ms={elapsed_ms}")
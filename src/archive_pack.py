@@ -0,0 +1,205 @@
+"""Cold storage for archived sessions: monthly append-only packs.
+
+    data/archive/2026-10.pack   gzip members, one per archived session
+    data/archive/2026-10.idx    JSONL, one line per member:
+        {"session_id", "offset", "length", "items", "bytes", "sha256",
+         "archived_at"}
+
+Notes:
+    - A member is the session's raw JSONL (sealed segments, then the active
+      file), gzip-compressed. `offset`/`length` locate it in the pack;
+      `bytes`/`sha256` describe the uncompressed JSONL.
+    - Packs and indexes are only appended to. A member is fsynced before its
+      index line is written, so an index line always points at a complete
+      member; a failed write (or a member short of `expected_items`) is
+      truncated away.
+    - A session archived again (after a restore) gets a new member; the
+      newest index line wins.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+
+ARCHIVE_DIR = Path("data/archive")
+ARCHIVE_READ_CHUNK = 64 * 1024
+
+_append_lock = threading.Lock()
+
+
+class MemberIncomplete(ValueError):
+    """The lines written do not match the item count the caller expects."""
+
+
+def pack_id_for(ts: float) -> str:
+    """Return the pack a member archived at `ts` goes to ("YYYY-MM", local time)."""
+
+    return time.strftime("%Y-%m", time.localtime(ts))
+
+
+def append_member(
+    session_id: str,
+    lines: Iterable[bytes],
+    *,
+    archive_dir: str | os.PathLike[str] = ARCHIVE_DIR,
+    expected_items: Callable[[], int] | None = None,
+) -> dict[str, Any]:
+    """Compress JSONL lines into the current month's pack and index them.
+
+    Args:
+        expected_items: Called once the member is written; on a different
+            count the member is truncated away and nothing is indexed.
+
+    Returns:
+        The index entry (plus "pack").
+
+    Raises:
+        MemberIncomplete: The member does not hold `expected_items()` lines.
+    """
+
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    pack_id = pack_id_for(now)
+    pack_path = archive_dir / f"{pack_id}.pack"
+
+    digest = hashlib.sha256()
+    items = size = 0
+    with _append_lock:
+        with pack_path.open("ab") as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            try:
+                with gzip.GzipFile(filename="", mode="wb", fileobj=f, mtime=0) as gz:
+                    for line in lines:
+                        gz.write(line)
+                        digest.update(line)
+                        items += 1
+                        size += len(line)
+                f.flush()
+                os.fsync(f.fileno())
+                if expected_items is not None and (expected := expected_items()) != items:
+                    raise MemberIncomplete(f"member of {session_id} has {items} items, expected {expected}")
+            except BaseException:
+                f.truncate(offset)
+                raise
+            length = f.tell() - offset
+
+        entry = {
+            "session_id": session_id,
+            "offset": offset,
+            "length": length,
+            "items": items,
+            "bytes": size,
+            "sha256": digest.hexdigest(),
+            "archived_at": int(now * 1000),
+        }
+        with (archive_dir / f"{pack_id}.idx").open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    return {**entry, "pack": pack_id}
+
+
+def _read_index(idx_path: Path) -> list[dict[str, Any]]:
+    entries: list[dict[str, Any]] = []
+    try:
+        lines = idx_path.read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return entries
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # Torn last line of an interrupted append.
+            continue
+        if isinstance(entry, dict) and isinstance(entry.get("session_id"), str):
+            entries.append({**entry, "pack": idx_path.stem})
+    return entries
+
+
+def list_members(*, archive_dir: str | os.PathLike[str] = ARCHIVE_DIR) -> list[dict[str, Any]]:
+    """Return the newest member of every archived session, newest first."""
+
+    latest: dict[str, dict[str, Any]] = {}
+    for idx_path in sorted(Path(archive_dir).glob("*.idx")):
+        for entry in _read_index(idx_path):
+            latest[entry["session_id"]] = entry
+    return sorted(latest.values(), key=lambda e: int(e.get("archived_at") or 0), reverse=True)
+
+
+def find_member(session_id: str, *, archive_dir: str | os.PathLike[str] = ARCHIVE_DIR) -> dict[str, Any] | None:
+    """Return the newest index entry of an archived session, or None."""
+
+    for idx_path in sorted(Path(archive_dir).glob("*.idx"), reverse=True):
+        found = [e for e in _read_index(idx_path) if e["session_id"] == session_id]
+        if found:
+            return found[-1]
+    return None
+
+
+def iter_member(
+    entry: dict[str, Any],
+    *,
+    archive_dir: str | os.PathLike[str] = ARCHIVE_DIR,
+    chunk_size: int = ARCHIVE_READ_CHUNK,
+) -> Iterator[bytes]:
+    """Stream the uncompressed JSONL of a member in chunks.
+
+    Raises:
+        ValueError: The member is damaged, truncated or does not match its
+            checksum (the checksum is only known after the last chunk).
+    """
+
+    pack_path = Path(archive_dir) / f"{entry['pack']}.pack"
+    corrupt = ValueError(f"archive member corrupt: session_id={entry['session_id']} pack={entry['pack']}")
+    decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    digest = hashlib.sha256()
+    with pack_path.open("rb") as f:
+        f.seek(int(entry["offset"]))
+        remaining = int(entry["length"])
+        while remaining > 0:
+            raw = f.read(min(chunk_size, remaining))
+            if not raw:
+                break
+            remaining -= len(raw)
+            try:
+                data = decomp.decompress(raw)
+            except zlib.error as e:
+                raise corrupt from e
+            if data:
+                digest.update(data)
+                yield data
+        tail = decomp.flush()
+        if tail:
+            digest.update(tail)
+            yield tail
+
+    if remaining > 0 or not decomp.eof or digest.hexdigest() != entry.get("sha256"):
+        raise corrupt
+
+
+def iter_member_items(
+    entry: dict[str, Any],
+    *,
+    archive_dir: str | os.PathLike[str] = ARCHIVE_DIR,
+) -> Iterator[dict[str, Any]]:
+    """Stream the items of a member, oldest first."""
+
+    buf = b""
+    for chunk in iter_member(entry, archive_dir=archive_dir):
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if buf.strip():
+        yield json.loads(buf)
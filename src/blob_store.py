@@ -0,0 +1,86 @@
+"""Content-addressed store for large tool outputs.
+
+Big `function_call_output` items (full files from read_file, thousands of
+grep matches) are stored once under `data/blobs/<aa>/<sha256>`, shared by
+all sessions. The session keeps a trimmed preview plus a reference line;
+the full content is read back only on request (`read_blob` tool).
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Any
+
+
+BLOBS_DIR = Path("data/blobs")
+
+# Outputs longer than this (characters) are moved to the blob store.
+BLOB_THRESHOLD_CHARS = 8000
+# Characters of the original output kept inline as a preview.
+BLOB_PREVIEW_CHARS = 2000
+
+_REF_RE = re.compile(r"\[blob sha256=([0-9a-f]{64}) chars=(\d+)\b[^\]]*\]\s*$")
+
+
+def blob_path(sha: str) -> Path:
+    return BLOBS_DIR / sha[:2] / sha
+
+
+def put_blob(text: str) -> str:
+    """Store text and return its sha256. Identical content is stored once."""
+
+    data = text.encode("utf-8")
+    sha = hashlib.sha256(data).hexdigest()
+    p = blob_path(sha)
+    if p.exists():
+        return sha
+
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(f"{sha}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, p)
+    return sha
+
+
+def get_blob(sha: str) -> str | None:
+    """Return stored text for a sha256, or None if unknown."""
+
+    if not re.fullmatch(r"[0-9a-f]{64}", sha or ""):
+        return None
+    try:
+        return blob_path(sha).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+
+def blob_ref(output: str) -> tuple[str, int] | None:
+    """Return (sha256, chars) if an output was offloaded, else None."""
+
+    m = _REF_RE.search(output)
+    if not m:
+        return None
+    return m.group(1), int(m.group(2))
+
+
+def needs_offload(item: dict[str, Any]) -> bool:
+    output = item.get("output")
+    return (
+        item.get("type") == "function_call_output"
+        and isinstance(output, str)
+        and len(output) > BLOB_THRESHOLD_CHARS
+        and blob_ref(output) is None
+    )
+
+
+def offload_item(item: dict[str, Any]) -> dict[str, Any]:
+    """Replace a large function_call_output with preview + blob reference."""
+
+    if not needs_offload(item):
+        return item
+
+    output = item["output"]
+    sha = put_blob(output)
+    preview = output[:BLOB_PREVIEW_CHARS]
+    ref = f"[blob sha256={sha} chars={len(output)}; output truncated, call read_blob(sha256) for the full text]"
+    return {**item, "output": f"{preview}\n...\n{ref}"}
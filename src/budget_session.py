@@ -0,0 +1,154 @@
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from src import sqlite_session
+from src.jsonl_session import JsonlSession, read_tail_with_tokens
+from src.settings import settings
+from src.sqlite_session import SqliteSession
+
+
+# Items per SQLite read when walking a session backwards.
+_SQLITE_TAIL_BATCH = 200
+
+
+def estimate_text_tokens(s: str) -> int:
+    """Cheap local token estimate: ~4 ASCII characters per token, ~1 token per CJK character."""
+
+    # CJK characters take 3 bytes in UTF-8: 2 extra bytes each.
+    wide = (len(s.encode("utf-8")) - len(s)) // 2
+    return (len(s) - wide) // 4 + wide
+
+
+def estimate_tokens(item: dict[str, Any]) -> int:
+    """Cheap local token estimate for one stored item.
+
+    Notes:
+        - See `estimate_text_tokens`, plus a small per-item overhead.
+        - Counted over the item's JSON, so tool calls/outputs are included.
+    """
+
+    return 4 + estimate_text_tokens(json.dumps(item, ensure_ascii=False))
+
+
+def is_turn_start(item: dict[str, Any]) -> bool:
+    return item.get("role") in ("user", "system", "developer")
+
+
+def select_window(items: list[dict[str, Any]], tokens: list[int], max_tokens: int) -> int:
+    """Return the start index of the most recent items that fit `max_tokens`.
+
+    Notes:
+        - The window only starts at a user/system message. A function_call is
+          therefore never separated from its function_call_output (or from
+          the reasoning item before it).
+        - If even the newest turn is over budget, that turn is kept whole.
+    """
+
+    best: int | None = None
+    total = 0
+    for i in range(len(items) - 1, -1, -1):
+        total += tokens[i]
+        if not is_turn_start(items[i]):
+            continue
+        if total > max_tokens and best is not None:
+            break
+        best = i
+        if total > max_tokens:
+            break
+    return 0 if best is None else best
+
+
+def window_is_closed(items: list[dict[str, Any]], tokens: list[int], max_tokens: int) -> bool:
+    """Return True if older items cannot change `select_window` on these items.
+
+    Notes:
+        - That is the case once a turn start has more than `max_tokens`
+          after it (inclusive): `select_window` stops there.
+    """
+
+    total = 0
+    for i in range(len(items) - 1, -1, -1):
+        total += tokens[i]
+        if total > max_tokens and is_turn_start(items[i]):
+            return True
+    return False
+
+
+def _sqlite_tail_with_tokens(session_id: str, db_path: Any, max_tokens: int) -> tuple[list[dict[str, Any]], list[int]]:
+    items: list[dict[str, Any]] = []
+    tokens: list[int] = []
+    stop = sqlite_session.count_items(session_id, db_path=db_path)
+    while stop > 0 and not window_is_closed(items, tokens, max_tokens):
+        start = max(0, stop - _SQLITE_TAIL_BATCH)
+        batch = sqlite_session.read_items_range(session_id, start, stop, db_path=db_path)
+        items = batch + items
+        tokens = [estimate_tokens(it) for it in batch] + tokens
+        stop = start
+    return items, tokens
+
+
+@dataclass
+class BudgetedSession:
+    """Session wrapper whose get_items returns only what fits a token budget.
+
+    Notes:
+        - Storage is untouched; all other calls go to the wrapped session.
+        - Pass this (not the inner session) to Runner.run/run_streamed.
+    """
+
+    inner: JsonlSession | SqliteSession
+    max_tokens: int
+
+    @property
+    def session_id(self) -> str:
+        return self.inner.session_id
+
+    async def get_items(self, limit: int | None = None) -> list[dict[str, Any]]:
+        """Return the most recent items that fit the token budget.
+
+        Notes:
+            - Reads backwards and stops once the window is fixed, so older
+              history (e.g. sealed segments) is never loaded.
+        """
+
+        if isinstance(self.inner, JsonlSession):
+            items, tokens = read_tail_with_tokens(
+                self.inner.path,
+                estimate_tokens,
+                lambda items, tokens: window_is_closed(items, tokens, self.max_tokens),
+            )
+        else:
+            items, tokens = await asyncio.to_thread(
+                _sqlite_tail_with_tokens, self.inner.session_id, self.inner.db_path, self.max_tokens
+            )
+
+        items = items[select_window(items, tokens, self.max_tokens):]
+        if isinstance(limit, int) and limit > 0:
+            return items[-limit:]
+        return items
+
+    async def add_items(self, items: Iterable[dict[str, Any]]) -> None:
+        await self.inner.add_items(items)
+
+    async def pop_item(self) -> dict[str, Any] | None:
+        return await self.inner.pop_item()
+
+    async def clear_session(self) -> None:
+        await self.inner.clear_session()
+
+    async def flush(self) -> dict[str, Any]:
+        return await self.inner.flush()
+
+
+def with_token_budget(
+    session: JsonlSession | SqliteSession,
+    max_tokens: int | None = None,
+) -> JsonlSession | SqliteSession | BudgetedSession:
+    """Wrap a session for Runner input using `history_token_budget` (0 disables)."""
+
+    budget = settings.history_token_budget if max_tokens is None else max_tokens
+    if budget and budget > 0:
+        return BudgetedSession(session, budget)
+    return session
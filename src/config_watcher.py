@@ -0,0 +1,89 @@
+"""Watch agent configs and settings for changes.
+
+Watched files:
+    data/setting.json
+    agents/agent.json, agents/agent.md
+    agents/sub_agents/<name>/agent.json, agents/sub_agents/<name>/agent.md
+
+Notes:
+    - Polls (mtime_ns, size) of that handful of files. `src/fs_watcher.py`
+      would have to watch all of `data/` (sessions included) to see
+      setting.json.
+    - The callback gets the changed paths and runs on the watcher thread.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Callable
+
+from src.logger import logger
+
+
+CONFIG_POLL_INTERVAL_S = 1.0
+SETTINGS_PATH = Path("data/setting.json")
+AGENTS_DIR = Path("agents")
+
+
+def config_paths() -> list[Path]:
+    paths = [SETTINGS_PATH, AGENTS_DIR / "agent.json", AGENTS_DIR / "agent.md"]
+    try:
+        sub_dirs = sorted(d for d in (AGENTS_DIR / "sub_agents").iterdir() if d.is_dir() and not d.name.startswith("_"))
+    except OSError:
+        sub_dirs = []
+    for d in sub_dirs:
+        paths.extend([d / "agent.json", d / "agent.md"])
+    return paths
+
+
+def _snapshot() -> dict[Path, tuple[int, int] | None]:
+    snap: dict[Path, tuple[int, int] | None] = {}
+    for p in config_paths():
+        try:
+            st = os.stat(p)
+            snap[p] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            snap[p] = None
+    return snap
+
+
+class ConfigWatcher:
+    def __init__(
+        self,
+        on_change: Callable[[list[Path]], None],
+        *,
+        interval_s: float = CONFIG_POLL_INTERVAL_S,
+    ):
+        self.on_change = on_change
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._snapshot = _snapshot()
+
+    def start(self) -> "ConfigWatcher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="config-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def check(self) -> list[Path]:
+        """Compare with the previous snapshot; call `on_change` if anything changed."""
+
+        new = _snapshot()
+        old, self._snapshot = self._snapshot, new
+        changed = sorted(p for p in old.keys() | new.keys() if old.get(p) != new.get(p))
+        if changed:
+            try:
+                self.on_change(changed)
+            except Exception as e:
+                logger.log(f"config.watch_callback_failed changed={len(changed)} err={e!r}")
+        return changed
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.check()
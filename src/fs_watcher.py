@@ -0,0 +1,264 @@
+"""Filesystem watcher: file created/modified/deleted events for a directory tree.
+
+Backends:
+    - inotify (Linux, via ctypes; no extra dependency).
+    - Polling (everywhere else): compares (mtime, size) snapshots.
+
+Usage:
+    watcher = FsWatcher("data/sessions")
+    watcher.subscribe(lambda ev: print(ev.kind, ev.path))
+    watcher.start()
+
+Notes:
+    - Callbacks run on the watcher thread; keep them short and thread-safe.
+    - Events are coalesced per path over `coalesce_s`, so a burst of appends
+      to one file yields one "modified" event.
+    - kind is "created", "modified", "deleted", or "overflow" (events were
+      lost; subscribers should rescan). Paths are `root / relative path`.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from src.logger import logger
+
+
+WATCH_POLL_INTERVAL_S = 1.0
+WATCH_COALESCE_S = 0.1
+
+# inotify(7) masks.
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF
+_IN_EVENT = struct.Struct("iIII")
+
+
+@dataclass(frozen=True)
+class FileEvent:
+    kind: str
+    path: Path
+
+
+def _merge(prev: str | None, kind: str) -> str:
+    if prev == "created" and kind == "modified":
+        return "created"
+    if prev == "deleted" and kind == "created":
+        return "modified"
+    return kind
+
+
+class _InotifyBackend:
+    """Recursive inotify watch of a directory tree."""
+
+    def __init__(self, root: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.root = root
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: dict[int, Path] = {}
+        self._add_tree(root, emit=None)
+
+    def _add_dir(self, d: Path) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(d), _IN_MASK)
+        if wd >= 0:
+            self._dirs[wd] = d
+
+    def _add_tree(self, d: Path, *, emit: Callable[[str, Path], None] | None) -> None:
+        for dirpath, _dirnames, filenames in os.walk(d):
+            self._add_dir(Path(dirpath))
+            if emit is not None:
+                # Files created before the watch on a new directory was added.
+                for name in filenames:
+                    emit("created", Path(dirpath) / name)
+
+    def read(self, timeout: float, emit: Callable[[str, Path], None]) -> None:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        pos = 0
+        while pos + _IN_EVENT.size <= len(data):
+            wd, mask, _cookie, name_len = _IN_EVENT.unpack_from(data, pos)
+            name = data[pos + _IN_EVENT.size: pos + _IN_EVENT.size + name_len].rstrip(b"\0")
+            pos += _IN_EVENT.size + name_len
+
+            if mask & _IN_Q_OVERFLOW:
+                emit("overflow", self.root)
+                continue
+            if mask & _IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            d = self._dirs.get(wd)
+            if d is None or not name:
+                continue
+
+            p = d / os.fsdecode(name)
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    self._add_tree(p, emit=emit)
+                continue
+            if mask & (_IN_CREATE | _IN_MOVED_TO):
+                emit("created", p)
+            elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                emit("deleted", p)
+            elif mask & (_IN_MODIFY | _IN_CLOSE_WRITE):
+                emit("modified", p)
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class _PollingBackend:
+    """Portable fallback: diff (mtime_ns, size) snapshots of the tree."""
+
+    def __init__(self, root: Path, interval_s: float):
+        self.root = root
+        self.interval_s = interval_s
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        snap: dict[Path, tuple[int, int]] = {}
+        for dirpath, _dirnames, filenames in os.walk(self.root):
+            for name in filenames:
+                p = Path(dirpath) / name
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                snap[p] = (st.st_mtime_ns, st.st_size)
+        return snap
+
+    def read(self, timeout: float, emit: Callable[[str, Path], None]) -> None:
+        time.sleep(min(timeout, self.interval_s))
+        new = self._scan()
+        old = self._snapshot
+        for p, sig in new.items():
+            prev = old.get(p)
+            if prev is None:
+                emit("created", p)
+            elif prev != sig:
+                emit("modified", p)
+        for p in old.keys() - new.keys():
+            emit("deleted", p)
+        self._snapshot = new
+
+    def close(self) -> None:
+        pass
+
+
+class FsWatcher:
+    """Watch a directory tree and publish FileEvents to subscribers."""
+
+    def __init__(
+        self,
+        root: str | os.PathLike[str],
+        *,
+        backend: str = "auto",
+        poll_interval_s: float = WATCH_POLL_INTERVAL_S,
+        coalesce_s: float = WATCH_COALESCE_S,
+    ):
+        """
+        Args:
+            backend: "auto" (inotify on Linux, else polling), "inotify" or "poll".
+        """
+
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.coalesce_s = coalesce_s
+        self._subscribers: list[Callable[[FileEvent], None]] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self._backend: _InotifyBackend | _PollingBackend
+        if backend == "poll" or (backend == "auto" and not sys.platform.startswith("linux")):
+            self._backend = _PollingBackend(self.root, poll_interval_s)
+        else:
+            try:
+                self._backend = _InotifyBackend(self.root)
+            except (OSError, AttributeError):
+                if backend == "inotify":
+                    raise
+                self._backend = _PollingBackend(self.root, poll_interval_s)
+        self.backend = "inotify" if isinstance(self._backend, _InotifyBackend) else "poll"
+
+    def subscribe(self, callback: Callable[[FileEvent], None]) -> None:
+        self._subscribers.append(callback)
+
+    def start(self) -> "FsWatcher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="fs-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._backend.close()
+
+    def _loop(self) -> None:
+        pending: dict[Path, str] = {}
+        seen = 0
+
+        def emit(kind: str, path: Path) -> None:
+            nonlocal seen
+            seen += 1
+            pending[path] = _merge(pending.get(path), kind)
+
+        last_seen = 0
+        first_at = last_at = 0.0
+        while not self._stop.is_set():
+            try:
+                self._backend.read(self.coalesce_s, emit)
+            except Exception as e:
+                logger.log(f"fs.watch_read_failed root={self.root} err={e!r}")
+                time.sleep(self.coalesce_s)
+                continue
+
+            now = time.monotonic()
+            if seen != last_seen:
+                first_at = first_at or now
+                last_seen, last_at = seen, now
+            if not pending:
+                continue
+
+            # Publish once the burst is over, or at least every 10 * coalesce_s.
+            quiet = now - last_at >= self.coalesce_s or self.backend == "poll"
+            if quiet or now - first_at >= 10 * self.coalesce_s:
+                events, pending = pending, {}
+                first_at = 0.0
+                for path, kind in events.items():
+                    self._publish(FileEvent(kind, path))
+
+    def _publish(self, event: FileEvent) -> None:
+        for cb in list(self._subscribers):
+            try:
+                cb(event)
+            except Exception as e:
+                logger.log(f"fs.watch_subscriber_failed kind={event.kind} path={event.path} err={e!r}")
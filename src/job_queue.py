@@ -0,0 +1,226 @@
+"""Persistent background job queue.
+
+Jobs are journaled as one JSON file each under `data/jobs/` and executed by
+a fixed number of asyncio workers on the app event loop.
+
+    data/jobs/<job_id>.json
+        {"id", "type", "payload", "state", "attempts", "created_at",
+         "updated_at", "next_run_at", "last_error"}
+
+Notes:
+    - state: "pending" -> "running" -> done (journal deleted) or back to
+      "pending" with exponential backoff; "failed" after `JOB_MAX_ATTEMPTS`
+      (journal kept for inspection).
+    - On startup, "pending" and interrupted "running" jobs are resumed.
+    - `submit()` is thread-safe and may be called before the queue runs
+      (e.g. from a worker thread or the CLI); the job waits in the journal.
+    - Bounded: `submit()` raises JobQueueFull past `JOB_QUEUE_MAX` open jobs.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from src.logger import logger
+
+
+JOBS_DIR = Path("data/jobs")
+JOB_CONCURRENCY = 2
+JOB_QUEUE_MAX = 1000
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF_BASE_S = 5.0
+JOB_BACKOFF_MAX_S = 600.0
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+@dataclass
+class Job:
+    type: str
+    payload: dict[str, Any]
+    id: str = field(default_factory=lambda: f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}")
+    state: str = "pending"
+    attempts: int = 0
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    next_run_at: float = 0.0
+    last_error: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Job":
+        names = cls.__dataclass_fields__.keys()
+        return cls(**{k: v for k, v in data.items() if k in names})
+
+
+Handler = Callable[[dict[str, Any]], Awaitable[Any]]
+
+
+def backoff_s(attempts: int) -> float:
+    """Delay before retry number `attempts` (1-based)."""
+
+    return min(JOB_BACKOFF_MAX_S, JOB_BACKOFF_BASE_S * 2 ** max(0, attempts - 1))
+
+
+class JobQueue:
+    def __init__(
+        self,
+        jobs_dir: str | os.PathLike[str] = JOBS_DIR,
+        *,
+        concurrency: int = JOB_CONCURRENCY,
+        max_jobs: int = JOB_QUEUE_MAX,
+    ):
+        self.jobs_dir = Path(jobs_dir)
+        self.concurrency = concurrency
+        self.max_jobs = max_jobs
+        self._handlers: dict[str, Handler] = {}
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._workers: list[asyncio.Task] = []
+
+    def register(self, job_type: str, handler: Handler) -> None:
+        self._handlers[job_type] = handler
+
+    # --- Journal
+
+    def _journal_path(self, job: Job) -> Path:
+        return self.jobs_dir / f"{job.id}.json"
+
+    def _save(self, job: Job) -> None:
+        job.updated_at = time.time()
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        p = self._journal_path(job)
+        tmp = p.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(asdict(job), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, p)
+
+    def _load_journal(self) -> None:
+        if not self.jobs_dir.exists():
+            return
+        for p in sorted(self.jobs_dir.glob("*.json")):
+            try:
+                job = Job.from_dict(json.loads(p.read_text(encoding="utf-8")))
+            except Exception as e:
+                logger.log(f"jobs.journal_unreadable file={p.name} err={e!r}")
+                continue
+            if job.state == "running":
+                # Interrupted by a crash/restart.
+                job.state = "pending"
+                self._save(job)
+            self._jobs.setdefault(job.id, job)
+
+    # --- Submit
+
+    def submit(self, job_type: str, payload: dict[str, Any]) -> Job:
+        """Journal a new job and wake a worker. Thread-safe."""
+
+        with self._lock:
+            open_jobs = sum(1 for j in self._jobs.values() if j.state in ("pending", "running"))
+            if open_jobs >= self.max_jobs:
+                raise JobQueueFull(f"{open_jobs} open jobs")
+            job = Job(type=job_type, payload=payload)
+            self._save(job)
+            self._jobs[job.id] = job
+
+        logger.log(f"jobs.submitted id={job.id} type={job_type}")
+        self._notify()
+        return job
+
+    def _notify(self) -> None:
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    def list_jobs(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return [asdict(j) for j in sorted(self._jobs.values(), key=lambda j: j.created_at)]
+
+    # --- Run
+
+    async def start(self) -> None:
+        """Resume journaled jobs and start the workers (on the running loop)."""
+
+        if self._workers:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        with self._lock:
+            self._load_journal()
+        n = sum(1 for j in self._jobs.values() if j.state == "pending")
+        logger.log(f"jobs.start concurrency={self.concurrency} resumed={n}")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for t in self._workers:
+            t.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _take_ready(self) -> tuple[Job | None, float | None]:
+        """Claim the next due job; else return the delay until one is due."""
+
+        now = time.time()
+        with self._lock:
+            pending = [j for j in self._jobs.values() if j.state == "pending" and j.type in self._handlers]
+            if not pending:
+                return None, None
+            job = min(pending, key=lambda j: (j.next_run_at, j.created_at))
+            if job.next_run_at > now:
+                return None, job.next_run_at - now
+            job.state = "running"
+            job.attempts += 1
+            self._save(job)
+            return job, None
+
+    async def _worker(self) -> None:
+        assert self._wake is not None
+        while True:
+            job, delay = self._take_ready()
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Job) -> None:
+        t0 = time.perf_counter()
+        try:
+            await self._handlers[job.type](job.payload)
+        except asyncio.CancelledError:
+            with self._lock:
+                job.state = "pending"
+                self._save(job)
+            raise
+        except Exception as e:
+            with self._lock:
+                job.last_error = repr(e)
+                if job.attempts >= JOB_MAX_ATTEMPTS:
+                    job.state = "failed"
+                else:
+                    job.state = "pending"
+                    job.next_run_at = time.time() + backoff_s(job.attempts)
+                self._save(job)
+            logger.log(f"jobs.error id={job.id} type={job.type} attempt={job.attempts} state={job.state} err={e!r}")
+            return
+
+        elapsed_ms = int((time.perf_counter() - t0) * 1000)
+        with self._lock:
+            self._jobs.pop(job.id, None)
+            self._journal_path(job).unlink(missing_ok=True)
+        logger.log(f"jobs.done id={job.id} type={job.type} attempt={job.attempts} elapsed_ms={elapsed_ms}")
+        self._notify()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,384 @@
+"""Sidecar offset index for session JSONL files.
+
+Each `<session>.jsonl` may have a `<session>.jsonl.idx` next to it that maps
+item number -> byte offset of its line, plus a one-byte kind code per item.
+Readers use it to jump to item N, or to "the last K user/assistant messages",
+without scanning the JSONL file.
+
+File format (version 1, all integers little-endian):
+
+    Header, 32 bytes:
+        magic       8s   b"TBJLIDX\\0"
+        version     u32  1
+        reserved    u32  0
+        src_size    u64  size in bytes of the .jsonl covered by this index
+        src_mtime   u64  st_mtime_ns of the .jsonl when the index was written
+
+    Records, 9 bytes each, one per valid item (blank/corrupted lines have none):
+        offset      u64  byte offset of the first byte of the item's line
+        kind        u8   item kind code (see KIND_* below)
+
+Notes:
+    - The index is a cache. The JSONL file stays the source of truth.
+    - If the index is missing, unreadable, or its (src_size, src_mtime) does
+      not match the JSONL file, it is rebuilt from the JSONL.
+    - Writers append records and then rewrite the header in place.
+"""
+
+import json
+import os
+import struct
+import threading
+from array import array
+from pathlib import Path
+from functools import wraps
+from typing import Any, Iterable
+
+
+MAGIC = b"TBJLIDX\0"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sIIQQ")
+_RECORD = struct.Struct("<QB")
+
+# Item kind codes.
+KIND_OTHER = 0
+KIND_USER = 1
+KIND_ASSISTANT = 2
+KIND_SYSTEM = 3
+KIND_FUNCTION_CALL = 4
+KIND_FUNCTION_CALL_OUTPUT = 5
+KIND_AGENT_HANDOFF = 6
+KIND_REASONING = 7
+
+_ROLE_KINDS = {
+    "user": KIND_USER,
+    "assistant": KIND_ASSISTANT,
+    "system": KIND_SYSTEM,
+    "developer": KIND_SYSTEM,
+}
+_TYPE_KINDS = {
+    "function_call": KIND_FUNCTION_CALL,
+    "function_call_output": KIND_FUNCTION_CALL_OUTPUT,
+    "agent_handoff": KIND_AGENT_HANDOFF,
+    "reasoning": KIND_REASONING,
+}
+
+CHAT_KINDS = frozenset((KIND_USER, KIND_ASSISTANT))
+
+
+def item_kind(item: dict[str, Any]) -> int:
+    """Return the kind code of a stored item."""
+
+    kind = _ROLE_KINDS.get(item.get("role"))  # type: ignore[arg-type]
+    if kind is not None:
+        return kind
+    return _TYPE_KINDS.get(item.get("type"), KIND_OTHER)  # type: ignore[arg-type]
+
+
+def index_path_for(path: str | os.PathLike[str]) -> Path:
+    """Return the sidecar index path for a JSONL file."""
+
+    p = Path(path)
+    return p.with_name(p.name + ".idx")
+
+
+def parse_line(line: bytes) -> dict[str, Any] | None:
+    """Parse one raw JSONL line, or return None if it is blank/invalid."""
+
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        # json.loads accepts utf-8 bytes directly.
+        obj = json.loads(line)
+    except Exception:
+        # Ignore truncated/corrupted lines.
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def _locked(fn):
+    """Run a JsonlIndex method under the instance lock."""
+
+    @wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return fn(self, *args, **kwargs)
+
+    return wrapper
+
+
+class JsonlIndex:
+    """In-memory view of a `.jsonl.idx` file.
+
+    Notes:
+        - Use `get_index()` instead of constructing directly; it validates
+          freshness and rebuilds when needed.
+        - `offsets` and `kinds` are parallel arrays, one entry per item.
+    """
+
+    def __init__(self, path: str | os.PathLike[str]):
+        self.path = Path(path)
+        self.idx_path = index_path_for(self.path)
+        self.offsets: array = array("Q")
+        self.kinds = bytearray()
+        self.src_size = 0
+        self.src_mtime_ns = 0
+        # Serializes the session writer thread with readers that rebuild.
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    # --- Load / rebuild
+
+    def _matches(self, st: os.stat_result) -> bool:
+        return self.src_size == st.st_size and self.src_mtime_ns == st.st_mtime_ns
+
+    def _load_from_disk(self) -> bool:
+        """Load the idx file. Returns False if missing or malformed."""
+
+        try:
+            raw = self.idx_path.read_bytes()
+        except OSError:
+            return False
+        if len(raw) < _HEADER.size:
+            return False
+
+        magic, version, _reserved, src_size, src_mtime_ns = _HEADER.unpack_from(raw, 0)
+        body = memoryview(raw)[_HEADER.size:]
+        if magic != MAGIC or version != VERSION or len(body) % _RECORD.size:
+            return False
+
+        offsets = array("Q")
+        kinds = bytearray()
+        for off, kind in _RECORD.iter_unpack(body):
+            offsets.append(off)
+            kinds.append(kind)
+
+        self.offsets = offsets
+        self.kinds = kinds
+        self.src_size = src_size
+        self.src_mtime_ns = src_mtime_ns
+        return True
+
+    @_locked
+    def rebuild(self) -> None:
+        """Rebuild the index by scanning the JSONL file."""
+
+        offsets = array("Q")
+        kinds = bytearray()
+        pos = 0
+        try:
+            with self.path.open("rb") as f:
+                for line in f:
+                    obj = parse_line(line)
+                    if obj is not None:
+                        offsets.append(pos)
+                        kinds.append(item_kind(obj))
+                    pos += len(line)
+            st = self.path.stat()
+        except FileNotFoundError:
+            st = None
+
+        self.offsets = offsets
+        self.kinds = kinds
+        self.src_size = st.st_size if st else 0
+        self.src_mtime_ns = st.st_mtime_ns if st else 0
+        self._write_all()
+
+    def _header_bytes(self) -> bytes:
+        return _HEADER.pack(MAGIC, VERSION, 0, self.src_size, self.src_mtime_ns)
+
+    def _write_all(self) -> None:
+        body = b"".join(_RECORD.pack(off, kind) for off, kind in zip(self.offsets, self.kinds))
+        try:
+            self.idx_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.idx_path.with_name(self.idx_path.name + ".tmp")
+            tmp.write_bytes(self._header_bytes() + body)
+            os.replace(tmp, self.idx_path)
+        except OSError:
+            # Best-effort: the index is only a cache.
+            pass
+
+    @_locked
+    def ensure_fresh(self) -> None:
+        """Make sure the index matches the current JSONL file."""
+
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            if len(self.offsets) or self.src_size:
+                self.offsets = array("Q")
+                self.kinds = bytearray()
+                self.src_size = 0
+                self.src_mtime_ns = 0
+            return
+
+        if self._matches(st):
+            return
+        if self._load_from_disk() and self._matches(st):
+            return
+        self.rebuild()
+
+    # --- Writer side
+
+    @_locked
+    def note_append(self, *, start: int, records: Iterable[tuple[int, int]]) -> None:
+        """Record items that were just appended to the JSONL file.
+
+        Args:
+            start: File size before the append.
+            records: (offset, kind) for each appended item.
+
+        Notes:
+            - If the index did not cover exactly `start` bytes, it is stale
+              and gets rebuilt from the JSONL instead.
+        """
+
+        if self.src_size != start:
+            if not (self._load_from_disk() and self.src_size == start):
+                self.rebuild()
+                return
+
+        recs = list(records)
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return
+
+        for off, kind in recs:
+            self.offsets.append(off)
+            self.kinds.append(kind)
+        self.src_size = st.st_size
+        self.src_mtime_ns = st.st_mtime_ns
+
+        try:
+            if not self.idx_path.exists():
+                self._write_all()
+                return
+            with self.idx_path.open("r+b") as f:
+                f.seek(0, os.SEEK_END)
+                f.write(b"".join(_RECORD.pack(off, kind) for off, kind in recs))
+                f.seek(0)
+                f.write(self._header_bytes())
+        except OSError:
+            pass
+
+    @_locked
+    def reset(self) -> None:
+        """Drop all records (after the JSONL file was cleared)."""
+
+        self.offsets = array("Q")
+        self.kinds = bytearray()
+        try:
+            st = self.path.stat()
+            self.src_size = st.st_size
+            self.src_mtime_ns = st.st_mtime_ns
+        except FileNotFoundError:
+            self.src_size = 0
+            self.src_mtime_ns = 0
+        self._write_all()
+
+    @_locked
+    def truncate(self, n: int) -> None:
+        """Keep only the first `n` records (after the JSONL was truncated to offsets[n])."""
+
+        del self.offsets[n:]
+        del self.kinds[n:]
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return
+        self.src_size = st.st_size
+        self.src_mtime_ns = st.st_mtime_ns
+
+        try:
+            with self.idx_path.open("r+b") as f:
+                f.truncate(_HEADER.size + n * _RECORD.size)
+                f.seek(0)
+                f.write(self._header_bytes())
+        except OSError:
+            self._write_all()
+
+    # --- Reader side
+
+    def read_range(self, start: int, stop: int | None = None) -> list[dict[str, Any]]:
+        """Read items [start, stop) with a single seek."""
+
+        n = len(self.offsets)
+        stop = n if stop is None else min(stop, n)
+        start = max(0, start)
+        if start >= stop:
+            return []
+
+        begin = self.offsets[start]
+        end = self.offsets[stop] if stop < n else self.src_size
+
+        with self.path.open("rb") as f:
+            f.seek(begin)
+            chunk = f.read(end - begin)
+
+        items: list[dict[str, Any]] = []
+        for line in chunk.split(b"\n"):
+            obj = parse_line(line)
+            if obj is not None:
+                items.append(obj)
+        return items
+
+    def read_at(self, positions: Iterable[int]) -> list[dict[str, Any]]:
+        """Read the items at the given positions (in the given order)."""
+
+        items: list[dict[str, Any]] = []
+        with self.path.open("rb") as f:
+            for i in positions:
+                f.seek(self.offsets[i])
+                obj = parse_line(f.readline())
+                if obj is not None:
+                    items.append(obj)
+        return items
+
+    def last_positions(self, kinds: Iterable[int], count: int) -> list[int]:
+        """Return positions of the last `count` items whose kind is in `kinds` (oldest first)."""
+
+        wanted = frozenset(kinds)
+        found: list[int] = []
+        for i in range(len(self.kinds) - 1, -1, -1):
+            if self.kinds[i] in wanted:
+                found.append(i)
+                if len(found) >= count:
+                    break
+        found.reverse()
+        return found
+
+
+_indexes: dict[str, JsonlIndex] = {}
+
+
+def get_index(path: str | os.PathLike[str], *, check: bool = True) -> JsonlIndex:
+    """Return the index for a JSONL file (process-wide, one per path).
+
+    Args:
+        check: Validate against the JSONL file and rebuild if stale. Writers
+            pass False and rely on `note_append()` to detect staleness.
+    """
+
+    key = os.path.abspath(path)
+    idx = _indexes.get(key)
+    if idx is None:
+        idx = JsonlIndex(path)
+        _indexes[key] = idx
+    if check:
+        idx.ensure_fresh()
+    return idx
+
+
+def drop_index(path: str | os.PathLike[str]) -> None:
+    """Forget and delete the index of a JSONL file (e.g. after archiving)."""
+
+    _indexes.pop(os.path.abspath(path), None)
+    try:
+        index_path_for(path).unlink()
+    except FileNotFoundError:
+        pass
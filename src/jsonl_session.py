@@ -1,8 +1,348 @@
+import asyncio
 import json
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, BinaryIO, Callable, Iterable, Iterator
+
+from src.blob_store import needs_offload, offload_item
+from src.jsonl_index import get_index, item_kind, parse_line
+from src.logger import logger
+from src.session_cache import item_cache
+from src.session_segments import (
+    layout_change,
+    load_manifest,
+    read_snapshot,
+    read_sealed_items,
+    read_sealed_tail,
+    read_segment,
+    read_segment_with_tokens,
+    remove_segments,
+    sealed_item_count,
+    unseal_last,
+)
+from src.session_writer import SessionWriter, get_writer
+from src.settings import settings
+
+
+# Chunk size for reverse (tail) reads.
+TAIL_CHUNK_SIZE = 64 * 1024
+
+# Called as fn(session_id, items) after items were appended to any session
+# store (e.g. the search indexer). Must not block.
+append_listeners: list[Callable[[str, list[dict[str, Any]]], None]] = []
+
+
+def notify_append(session_id: str, items: list[dict[str, Any]]) -> None:
+    for fn in list(append_listeners):
+        try:
+            fn(session_id, items)
+        except Exception as e:
+            logger.log(f"sessions.append_listener_failed err={e!r}")
+
+
+def iter_lines_reversed(f: BinaryIO, *, chunk_size: int = TAIL_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield raw lines of a binary file from last to first.
+
+    Notes:
+        - Reads fixed-size chunks backwards from EOF.
+        - Works on bytes and splits on b"\\n" only. In UTF-8 that byte never occurs
+          inside a multi-byte sequence, so a character cut by a chunk boundary is
+          re-joined before the line is decoded.
+        - A truncated last line (no trailing newline) is yielded as-is; callers
+          decide whether it parses.
+    """
+
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    carry = b""
+    while pos > 0:
+        step = min(chunk_size, pos)
+        pos -= step
+        f.seek(pos)
+        buf = f.read(step) + carry
+        parts = buf.split(b"\n")
+        # The first part may continue in the previous chunk.
+        carry = parts[0]
+        for line in reversed(parts[1:]):
+            yield line
+    if carry:
+        yield carry
+
+
+def read_tail_items(path: str | os.PathLike[str], limit: int) -> list[dict[str, Any]]:
+    """Return the last `limit` valid items of a JSONL file.
+
+    Notes:
+        - Only decodes as many lines as needed, so cost does not grow with file size.
+        - Blank/corrupted lines are skipped and do not count toward `limit`.
+    """
+
+    items: list[dict[str, Any]] = []
+    with open(path, "rb") as f:
+        for line in iter_lines_reversed(f):
+            obj = parse_line(line)
+            if obj is None:
+                continue
+            items.append(obj)
+            if len(items) >= limit:
+                break
+    items.reverse()
+    return items
+
+
+def _read_active_items(path: str | os.PathLike[str], limit: int | None = None) -> list[dict[str, Any]]:
+    """Return items of the active (plain JSONL) segment."""
+
+    if not os.path.exists(path):
+        return []
+
+    if isinstance(limit, int) and limit > 0:
+        try:
+            cached = item_cache.get(path, only_cached=True)
+            if cached is not None:
+                return cached[-limit:]
+        except Exception:
+            pass
+        try:
+            idx = get_index(path)
+            return idx.read_range(len(idx) - limit)
+        except Exception:
+            pass
+        try:
+            return read_tail_items(path, limit)
+        except Exception:
+            return []
+
+    try:
+        return item_cache.get(path) or []
+    except Exception:
+        return []
+
+
+def read_items(path: str | os.PathLike[str], limit: int | None = None) -> list[dict[str, Any]]:
+    """Return items of a JSONL session, across sealed segments.
+
+    Notes:
+        - Without `limit`, go through the shared parsed-item cache
+          (see `src/session_cache.py`), which only parses appended bytes.
+        - With `limit`, slice the cached items if the file is already cached;
+          otherwise jump to the last `limit` items via the sidecar offset
+          index (see `src/jsonl_index.py`), falling back to a reverse tail read.
+        - Sealed segments (see `src/session_segments.py`) are only opened when
+          the active file has fewer than `limit` items.
+        - A missing/unreadable active file yields []; a missing sealed
+          segment raises FileNotFoundError.
+        - Item dicts may be shared with other readers. Treat them as read-only.
+    """
+
+    return read_snapshot(path, lambda: _read_items(path, limit))
+
+
+def _read_items(path: str | os.PathLike[str], limit: int | None) -> list[dict[str, Any]]:
+    items = _read_active_items(path, limit)
+    if isinstance(limit, int) and limit > 0:
+        if len(items) >= limit or not load_manifest(path):
+            return items
+        return read_sealed_tail(path, limit - len(items)) + items
+
+    if not load_manifest(path):
+        return items
+    return read_sealed_items(path) + items
+
+
+def item_count(path: str | os.PathLike[str]) -> int:
+    """Return the number of items of a JSONL session (sealed + active)."""
+
+    return read_snapshot(path, lambda: _item_count(path))
+
+
+def _item_count(path: str | os.PathLike[str]) -> int:
+    n = sealed_item_count(path)
+    if os.path.exists(path):
+        try:
+            n += len(get_index(path))
+        except Exception:
+            n += len(item_cache.get(path) or [])
+    return n
+
+
+def read_items_range(path: str | os.PathLike[str], start: int, stop: int) -> list[dict[str, Any]]:
+    """Return items [start, stop) of a JSONL session, across sealed segments.
+
+    Notes:
+        - Positions count from the oldest item, sealed segments first.
+        - Only the segments overlapping the range are opened; the active file
+          is read with one seek via the offset index.
+    """
+
+    return read_snapshot(path, lambda: _read_items_range(path, start, stop))
+
+
+def _read_items_range(path: str | os.PathLike[str], start: int, stop: int) -> list[dict[str, Any]]:
+    start = max(0, start)
+    if start >= stop:
+        return []
+
+    items: list[dict[str, Any]] = []
+    pos = 0
+    for seg in load_manifest(path):
+        n = int(seg.get("items") or 0)
+        if pos + n > start and pos < stop:
+            seg_items = read_segment(path, str(seg.get("id")))
+            items.extend(seg_items[max(0, start - pos): stop - pos])
+        pos += n
+        if pos >= stop:
+            return items
+
+    if not os.path.exists(path):
+        return items
+    a_start, a_stop = max(0, start - pos), stop - pos
+    try:
+        cached = item_cache.get(path, only_cached=True)
+        if cached is not None:
+            return items + cached[a_start:a_stop]
+    except Exception:
+        pass
+    try:
+        return items + get_index(path).read_range(a_start, a_stop)
+    except Exception:
+        return items + (item_cache.get(path) or [])[a_start:a_stop]
+
+
+def read_items_with_tokens(
+    path: str | os.PathLike[str],
+    estimator: Callable[[dict[str, Any]], int],
+) -> tuple[list[dict[str, Any]], list[int]]:
+    """Return all items of a JSONL session plus per-item token estimates.
+
+    Notes:
+        - Estimates are cached next to the parsed items, so each item is
+          estimated once per process.
+    """
+
+    return read_snapshot(path, lambda: _read_items_with_tokens(path, estimator))
+
+
+def _read_items_with_tokens(
+    path: str | os.PathLike[str],
+    estimator: Callable[[dict[str, Any]], int],
+) -> tuple[list[dict[str, Any]], list[int]]:
+    items: list[dict[str, Any]] = []
+    tokens: list[int] = []
+    for seg in load_manifest(path):
+        seg_items, seg_tokens = read_segment_with_tokens(path, str(seg.get("id")), estimator)
+        items.extend(seg_items)
+        tokens.extend(seg_tokens)
+
+    if os.path.exists(path):
+        try:
+            active_items, active_tokens = item_cache.get_with_tokens(path, estimator)
+        except Exception:
+            active_items, active_tokens = [], []
+        items.extend(active_items)
+        tokens.extend(active_tokens)
+    return items, tokens
+
+
+def read_tail_with_tokens(
+    path: str | os.PathLike[str],
+    estimator: Callable[[dict[str, Any]], int],
+    enough: Callable[[list[dict[str, Any]], list[int]], bool],
+) -> tuple[list[dict[str, Any]], list[int]]:
+    """Return the newest items of a JSONL session plus token estimates.
+
+    Reads backwards until `enough(items, tokens)` holds: the active file,
+    then sealed segments newest first.
+
+    Notes:
+        - Older segments are never opened once `enough` is satisfied, so the
+          cost follows the tail that is needed, not the session length (the
+          active file is bounded by `SEGMENT_MAX_BYTES`).
+        - Estimates are cached per file next to the parsed items.
+    """
+
+    def read() -> tuple[list[dict[str, Any]], list[int]]:
+        items: list[dict[str, Any]] = []
+        tokens: list[int] = []
+        if os.path.exists(path):
+            try:
+                items, tokens = item_cache.get_with_tokens(path, estimator)
+            except Exception:
+                items, tokens = [], []
+        for seg in reversed(load_manifest(path)):
+            if enough(items, tokens):
+                break
+            seg_items, seg_tokens = read_segment_with_tokens(path, str(seg.get("id")), estimator)
+            items = seg_items + items
+            tokens = seg_tokens + tokens
+        return items, tokens
+
+    return read_snapshot(path, read)
+
+
+def _journal_path(path: Path) -> Path:
+    return path.with_name(path.name + ".journal")
+
+
+def _truncate_active(path: Path, n: int) -> None:
+    """Cut the active file down to its first `n` items.
+
+    Notes:
+        - O(1): the cut point comes from the offset index, then ftruncate.
+        - Crash-safe: the target is journaled (and fsynced) first, so an
+          interrupted truncation is finished by `recover_truncation()`.
+    """
+
+    idx = get_index(path)
+    n = max(0, n)
+    if n >= len(idx):
+        return
+    size = idx.offsets[n]
+
+    journal = _journal_path(path)
+    with journal.open("w", encoding="utf-8") as f:
+        f.write(json.dumps({"size": size, "items": n}))
+        f.flush()
+        os.fsync(f.fileno())
+
+    with path.open("r+b") as f:
+        f.truncate(size)
+        f.flush()
+        os.fsync(f.fileno())
+
+    idx.truncate(n)
+    item_cache.note_truncate(path, items=n, size=size)
+    journal.unlink()
+
+
+def recover_truncation(path: str | os.PathLike[str]) -> bool:
+    """Finish a truncation interrupted by a crash. Returns True if one was found."""
+
+    p = Path(path)
+    journal = _journal_path(p)
+    try:
+        data = json.loads(journal.read_text(encoding="utf-8"))
+        size = int(data["size"])
+    except FileNotFoundError:
+        return False
+    except Exception:
+        # Journal itself was cut short: the truncation never started.
+        journal.unlink(missing_ok=True)
+        return False
+
+    try:
+        with p.open("r+b") as f:
+            if f.seek(0, os.SEEK_END) > size:
+                f.truncate(size)
+            os.fsync(f.fileno())
+    except FileNotFoundError:
+        pass
+
+    item_cache.invalidate(p)
+    get_index(p)
+    journal.unlink(missing_ok=True)
+    return True
 
 
 @dataclass
@@ -12,68 +352,130 @@ class JsonlSession:
     Notes:
         - Stores items as JSON Lines (one JSON object per line).
         - Designed for single-writer per session_id.
-        - pop_item() is intentionally not implemented.
+        - Appends go through a per-file background writer (group commit).
+          `durability` defaults to `settings.session_durability`.
+        - pop_item()/truncate_to() cut the file with ftruncate at an indexed
+          line offset, guarded by a `<path>.journal` for crash safety.
     """
 
     session_id: str
     path: str | os.PathLike[str]
+    durability: str | None = None
+    _writer: SessionWriter | None = field(default=None, init=False, repr=False, compare=False)
 
     def _path(self) -> Path:
         return Path(self.path)
 
+    def writer(self) -> SessionWriter:
+        """Return the background writer of this session file."""
+
+        if self._writer is None:
+            recover_truncation(self._path())
+            self._writer = get_writer(self._path(), self.durability or settings.session_durability)
+        return self._writer
+
     async def get_items(self, limit: int | None = None) -> list[dict[str, Any]]:
         """Return stored items.
 
         Args:
-            limit: Optional max number of items.
+            limit: Optional max number of items. When set, only the last
+                `limit` lines are read instead of the whole file.
+        """
+
+        return read_items(self._path(), limit)
+
+    async def add_items(self, items: Iterable[dict[str, Any]]) -> None:
+        """Append items to the session.
+
+        Notes:
+            - Returns once the items are written (and fsynced in "always" mode).
+            - The writer keeps the offset index up to date.
+            - Large function_call_output items are moved to the blob store
+              (see `src/blob_store.py`).
+            - `append_listeners` are notified afterwards.
+        """
+
+        items = list(items)
+        if any(needs_offload(it) for it in items):
+            # Large tool outputs go to the blob store; keep a preview inline.
+            items = await asyncio.to_thread(lambda: [offload_item(it) for it in items])
+
+        lines = [
+            ((json.dumps(it, ensure_ascii=False) + "\n").encode("utf-8"), item_kind(it))
+            for it in items
+        ]
+        await self.writer().append(lines)
+        notify_append(self.session_id, items)
+
+    async def flush(self) -> dict[str, Any]:
+        """Make all appended items durable. Call at turn boundaries.
+
+        Returns:
+            Writer counters (writes, fsyncs, latencies).
         """
 
+        w = self.writer()
+        await w.flush()
+        return w.stats.as_dict()
+
+    async def pop_item(self) -> dict[str, Any] | None:
+        """Remove and return the most recent item, or None if empty."""
+
         p = self._path()
-        if not p.exists():
-            return []
 
-        items: list[dict[str, Any]] = []
-        try:
-            with p.open("r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        obj = json.loads(line)
-                    except Exception:
-                        # Ignore truncated/corrupted lines.
-                        continue
-                    if isinstance(obj, dict):
-                        items.append(obj)
-        except Exception:
-            return []
+        def _pop() -> dict[str, Any] | None:
+            recover_truncation(p)
+            idx = get_index(p)
+            if len(idx) == 0:
+                # Active file is empty: continue in the newest sealed segment.
+                if not unseal_last(p):
+                    return None
+                idx = get_index(p)
+                if len(idx) == 0:
+                    return None
+            n = len(idx) - 1
+            items = idx.read_at([n])
+            _truncate_active(p, n)
+            return items[0] if items else None
 
-        if isinstance(limit, int) and limit > 0:
-            return items[-limit:]
-        return items
+        return await self.writer().call(_pop)
 
-    async def add_items(self, items: Iterable[dict[str, Any]]) -> None:
-        """Append items to the session."""
+    async def truncate_to(self, n: int) -> None:
+        """Keep only the first `n` items of the session.
+
+        Notes:
+            - No rewrite: the active file is ftruncated at item n's offset.
+            - If `n` falls inside a sealed segment, newer segments are dropped
+              and that segment becomes the active file again.
+        """
 
         p = self._path()
-        p.parent.mkdir(parents=True, exist_ok=True)
 
-        with p.open("a", encoding="utf-8") as f:
-            for it in items:
-                f.write(json.dumps(it, ensure_ascii=False))
-                f.write("\n")
-            f.flush()
-            os.fsync(f.fileno())
+        def _truncate() -> None:
+            recover_truncation(p)
+            sealed = sealed_item_count(p)
+            while n < sealed:
+                _truncate_active(p, 0)
+                if not unseal_last(p):
+                    break
+                sealed = sealed_item_count(p)
+            _truncate_active(p, n - sealed)
 
-    async def pop_item(self) -> dict[str, Any]:
-        raise NotImplementedError("pop_item is not supported by JsonlSession")
+        await self.writer().call(_truncate)
 
     async def clear_session(self) -> None:
         """Clear all stored items."""
 
         p = self._path()
-        p.parent.mkdir(parents=True, exist_ok=True)
-        tmp = p.with_suffix(p.suffix + ".tmp")
-        tmp.write_text("", encoding="utf-8")
-        os.replace(tmp, p)
+
+        def _clear() -> None:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_suffix(p.suffix + ".tmp")
+            tmp.write_text("", encoding="utf-8")
+            with layout_change(p):
+                os.replace(tmp, p)
+                get_index(p, check=False).reset()
+                remove_segments(p)
+
+        # Run in the writer thread so queued appends land before the clear.
+        await self.writer().call(_clear)
@@ -1,84 +1,319 @@
 import os
+import asyncio
+import contextvars
 import json
 import importlib
 import frontmatter
+import hashlib
 import random
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable
 
 from agents import Agent, ModelSettings
 from agents import handoff
+from src.budget_session import estimate_text_tokens
 from src.logger import logger
+from src.search_index import search_index
 from src.settings import settings
-from src.tools import *
+from src.tool_registry import get_tool
 
 
-def prompt_replace(prompt: str):
-    if "<NAME>" in prompt:
-        prompt = prompt.replace("<NAME>", settings.name)
-    
-    if "<DEFAULT_PROMPT>" in prompt:
-        default_prompt = "\n".join(settings.default_prompt)
-        prompt = prompt.replace("<DEFAULT_PROMPT>", default_prompt)
-
-    if "<ROOT_PATH>" in prompt:
-        ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        prompt = prompt.replace("<ROOT_PATH>", ROOT_PATH)
-
-    if "<PREVIOUS_CONV_SUMMARY>" in prompt:
+# --- File-derived prompt pieces, cached until their files change
+
+_PLACEHOLDER_RE = re.compile(r"<([A-Z_]+)>")
+_N_SUMMARIES = 10
+
+
+def _stat_sig(path: str) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+# key -> (value, {path: stat signature when the value was built})
+_file_cache: dict[str, tuple[Any, dict[str, tuple[int, int] | None]]] = {}
+_file_cache_lock = threading.Lock()
+
+
+def _cached(key: str, build: Callable[[], tuple[Any, list[str]]]) -> Any:
+    """Return a value derived from files, rebuilt when any of its files change.
+
+    Notes:
+        - `build()` returns (value, paths it depends on). Directories count as
+          dependencies too: their mtime changes when entries are added or removed.
+        - Paths known from the previous build are stat'ed before rebuilding,
+          so an edit racing a rebuild still invalidates the new entry.
+    """
+
+    with _file_cache_lock:
+        hit = _file_cache.get(key)
+    if hit is not None and all(_stat_sig(p) == sig for p, sig in hit[1].items()):
+        return hit[0]
+
+    before = {p: _stat_sig(p) for p in (hit[1] if hit is not None else ())}
+    value, deps = build()
+    sigs = {p: before[p] if p in before else _stat_sig(p) for p in deps}
+    with _file_cache_lock:
+        _file_cache[key] = (value, sigs)
+    return value
+
+
+def invalidate_caches() -> None:
+    """Forget cached configs and compiled templates (e.g. after settings changed)."""
+
+    with _file_cache_lock:
+        _file_cache.clear()
+
+
+def _load_json(path: str) -> dict[str, Any]:
+    def build() -> tuple[Any, list[str]]:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f), [path]
+
+    return _cached("json:" + path, build)
+
+
+def _previous_summaries() -> str:
+    summaries_dir = "data/session_summaries"
+
+    def build() -> tuple[Any, list[str]]:
         summary = ""
-        n_summaries = 10
+        deps = [summaries_dir]
         try:
-            files = sorted(os.listdir("data/session_summaries"), reverse=True)
-            for index, f in enumerate(files):
-                if index >= n_summaries:
-                    break
-                summary_file = os.path.join("data/session_summaries", f)
+            files = sorted(os.listdir(summaries_dir), reverse=True)[:_N_SUMMARIES]
+            for f in files:
+                summary_file = os.path.join(summaries_dir, f)
+                deps.append(summary_file)
                 with open(summary_file, "r", encoding="utf-8") as sf:
-                    prev_summary = sf.read()
-                    summary = prev_summary + "\n" + summary
-
-            prompt = prompt.replace("<PREVIOUS_CONV_SUMMARY>", summary)
+                    summary = sf.read() + "\n" + summary
         except Exception:
-            prompt = prompt.replace("<PREVIOUS_CONV_SUMMARY>", "")
-
-    if "<CURRENT_MOOD>" in prompt:
-        # Valence, Arousal, Stress, Energy
-        # 愉快程度，亢奋程度，压力值，精力值
-        valence = random.randint(2, 8)
-        arousal = random.randint(2, 8)
-        stress = random.randint(2, 8)
-        energy = random.randint(2, 8)
-        mood_str = f"Valence:{valence}, Arousal:{arousal}, Stress:{stress}, Energy:{energy} (out of 10)"
-        prompt = prompt.replace("<CURRENT_MOOD>", mood_str)
-
-    if "<CURRENT_DATETIME>" in prompt:
-        from datetime import datetime
-        now = datetime.now()
-        datetime_str = now.strftime("%Y-%m-%d %H:%M:%S")
-        prompt = prompt.replace("<CURRENT_DATETIME>", datetime_str)
-
-    if "<DEVELOPER_MD_FILES>" in prompt:
-        developer_md_contents = ''
-        for file in os.listdir("agents/sub_agents/developer"):
-            file_path = os.path.join("agents/sub_agents/developer", file)
-            if file.endswith(".md") and file != "agent.md" and not file.startswith("_"):
-                post = frontmatter.load(file_path)
-                title = post.get("title", file)
-                abstract = post.get("abstract", "No Abstract")
-                developer_md_contents += f"{title}: {abstract}\n"
-        prompt = prompt.replace("<DEVELOPER_MD_FILES>", developer_md_contents)
+            summary = ""
+        return summary, deps
+
+    return _cached("summaries", build)
+
+
+# The user message the current run answers (set by the chat loops before Runner.run).
+recall_query: contextvars.ContextVar[str] = contextvars.ContextVar("recall_query", default="")
+
+
+def _format_note(hit: dict[str, Any]) -> str:
+    if hit["kind"] == "diary":
+        return f"[diary {os.path.splitext(os.path.basename(hit['session_id']))[0]}]\n{hit['text']}"
+    day = datetime.fromtimestamp(hit["created_at"] / 1000).strftime("%Y-%m-%d")
+    return f"[session {hit['session_id']}, {day}]\n{hit['text']}"
+
 
-    if "<RECORDER_MD_FILES>" in prompt:
-        recorder_md_contents = ''
-        for file in os.listdir("agents/sub_agents/recorder"):
-            file_path = os.path.join("agents/sub_agents/recorder", file)
+def recall_notes(query: str) -> str:
+    """Return the summaries/diary entries most relevant to `query`.
+
+    Notes:
+        - BM25 over the notes of `src/search_index.py`, which the indexer
+          keeps current in the background; never waits for it. Best
+          `settings.recall_top_k` entries that fit
+          `settings.recall_token_budget` together.
+        - Falls back to the newest summaries when there is no query.
+    """
+
+    if not query.strip():
+        return _previous_summaries()
+
+    t0 = time.perf_counter()
+    notes: list[str] = []
+    used = 0
+    for hit in search_index.recall(query, k=settings.recall_top_k):
+        note = _format_note(hit)
+        tokens = estimate_text_tokens(note)
+        if used + tokens > settings.recall_token_budget:
+            # A shorter, less relevant entry may still fit.
+            continue
+        notes.append(note)
+        used += tokens
+    logger.log(f"agents.recall notes={len(notes)} tokens={used} elapsed_ms={int((time.perf_counter() - t0) * 1000)}")
+    return "\n\n".join(notes)
+
+
+def _md_catalog(dir_path: str) -> str:
+    """Return "title: abstract" lines of the knowledge .md files of a sub-agent."""
+
+    def build() -> tuple[Any, list[str]]:
+        contents = ""
+        deps = [dir_path]
+        for file in os.listdir(dir_path):
+            file_path = os.path.join(dir_path, file)
             if file.endswith(".md") and file != "agent.md" and not file.startswith("_"):
+                deps.append(file_path)
                 post = frontmatter.load(file_path)
                 title = post.get("title", file)
                 abstract = post.get("abstract", "No Abstract")
-                recorder_md_contents += f"{title}: {abstract}\n"
-        prompt = prompt.replace("<RECORDER_MD_FILES>", recorder_md_contents)
+                contents += f"{title}: {abstract}\n"
+        return contents, deps
+
+    return _cached("md:" + dir_path, build)
+
+
+def _current_mood() -> str:
+    # Valence, Arousal, Stress, Energy
+    # 愉快程度，亢奋程度，压力值，精力值
+    valence = random.randint(2, 8)
+    arousal = random.randint(2, 8)
+    stress = random.randint(2, 8)
+    energy = random.randint(2, 8)
+    return f"Valence:{valence}, Arousal:{arousal}, Stress:{stress}, Energy:{energy} (out of 10)"
 
-    return prompt
+
+_PLACEHOLDERS: dict[str, Callable[[], str]] = {
+    "NAME": lambda: settings.name,
+    "DEFAULT_PROMPT": lambda: "\n".join(settings.default_prompt),
+    "ROOT_PATH": lambda: os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "PREVIOUS_CONV_SUMMARY": _previous_summaries,
+    "CURRENT_MOOD": _current_mood,
+    "CURRENT_DATETIME": lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    "DEVELOPER_MD_FILES": lambda: _md_catalog("agents/sub_agents/developer"),
+    "RECORDER_MD_FILES": lambda: _md_catalog("agents/sub_agents/recorder"),
+}
+# Expanded when a template is compiled (their values may hold other placeholders).
+_SETTINGS_PLACEHOLDERS = ("NAME", "DEFAULT_PROMPT", "ROOT_PATH")
+# Differ between agent builds; least volatile first.
+_VOLATILE_PLACEHOLDERS = ("PREVIOUS_CONV_SUMMARY", "CURRENT_MOOD", "CURRENT_DATETIME")
+_CONTEXT_HEADER = "\n\n---\n\nCurrent values of the placeholders above:\n"
+
+
+def compile_template(prompt: str) -> list[str]:
+    """Split a prompt into static text and placeholder slots.
+
+    Returns:
+        Alternating parts: even indexes are static text, odd indexes are
+        placeholder names (only known placeholders become slots).
+
+    Notes:
+        - Settings placeholders (<NAME>, <DEFAULT_PROMPT>, <ROOT_PATH>) are
+          expanded here, so compiled templates depend on the settings.
+    """
+
+    for name in _SETTINGS_PLACEHOLDERS:
+        if f"<{name}>" in prompt:
+            prompt = prompt.replace(f"<{name}>", _PLACEHOLDERS[name]())
+
+    parts = [""]
+    pos = 0
+    for m in _PLACEHOLDER_RE.finditer(prompt):
+        if m.group(1) not in _PLACEHOLDERS:
+            continue
+        parts[-1] += prompt[pos:m.start()]
+        parts.extend([m.group(1), ""])
+        pos = m.end()
+    parts[-1] += prompt[pos:]
+    return parts
+
+
+def render_prompt(
+    parts: list[str],
+    *,
+    layout: str | None = None,
+    values: dict[str, str] | None = None,
+) -> tuple[str, int]:
+    """Fill the slots of a compiled template (see `compile_template`).
+
+    Args:
+        layout: "inline" fills every slot in place. "stable_prefix" leaves
+            volatile placeholders (<PREVIOUS_CONV_SUMMARY>, <CURRENT_MOOD>,
+            <CURRENT_DATETIME>) as written and lists their values in a
+            trailing block, so everything before it is byte-identical across
+            builds (provider-side prompt caching). Default: `settings.prompt_layout`.
+        values: Placeholder values to use instead of computing them.
+
+    Returns:
+        (prompt, length of the stable prefix in characters), where the stable
+        prefix is the text before the first volatile value.
+    """
+
+    layout = layout or settings.prompt_layout
+    given = values or {}
+    values = {name: given[name] if name in given else _PLACEHOLDERS[name]() for name in set(parts[1::2])}
+    volatile = [name for name in _VOLATILE_PLACEHOLDERS if name in values]
+
+    if layout != "stable_prefix":
+        out: list[str] = []
+        prefix = None
+        for i, p in enumerate(parts):
+            if i % 2 and p in volatile and prefix is None:
+                prefix = sum(len(s) for s in out)
+            out.append(values[p] if i % 2 else p)
+        text = "".join(out)
+        return text, len(text) if prefix is None else prefix
+
+    body = "".join(p if not i % 2 else f"<{p}>" if p in volatile else values[p] for i, p in enumerate(parts))
+    if not volatile:
+        return body, len(body)
+    prefix = body + _CONTEXT_HEADER
+    return prefix + "\n".join(f"<{name}>:\n{values[name]}" for name in volatile), len(prefix)
+
+
+def render_template(parts: list[str]) -> str:
+    return render_prompt(parts)[0]
+
+
+def _log_prompt(agent_name: str, text: str, stable_prefix: int) -> None:
+    prefix_hash = hashlib.sha256(text[:stable_prefix].encode("utf-8")).hexdigest()[:12]
+    logger.log(
+        f"agents.prompt agent={agent_name} layout={settings.prompt_layout} chars={len(text)} "
+        + f"stable_prefix_chars={stable_prefix} stable_prefix_sha={prefix_hash}"
+    )
+
+
+def _load_template(path: str) -> list[str]:
+    def build() -> tuple[Any, list[str]]:
+        with open(path, "r", encoding="utf-8") as f:
+            return compile_template(f.read()), [path]
+
+    return _cached("template:" + path, build)
+
+
+def prompt_replace(prompt: str):
+    return render_template(compile_template(prompt))
+
+
+def agent_instructions(agent_name: str, template_path: str) -> str | Callable[[Any, Agent], Any]:
+    """Return the instructions of an agent built from a template file.
+
+    Notes:
+        - Without <PREVIOUS_CONV_SUMMARY>: the rendered prompt.
+        - With it: a callable the SDK invokes per run. The slot is filled on
+          the first run with the notes recalled for that run's user message
+          (`recall_query`), then kept for the agent's lifetime so the prompt
+          stays stable across turns. Other slots keep their build-time values.
+    """
+
+    parts = _load_template(template_path)
+    names = set(parts[1::2])
+    if "PREVIOUS_CONV_SUMMARY" not in names:
+        instructions, stable_prefix = render_prompt(parts)
+        _log_prompt(agent_name, instructions, stable_prefix)
+        return instructions
+
+    frozen = {name: _PLACEHOLDERS[name]() for name in names if name != "PREVIOUS_CONV_SUMMARY"}
+    recalled: str | None = None
+
+    async def instructions(_ctx: Any, _agent: Agent) -> str:
+        nonlocal recalled
+        if recalled is None:
+            query = recall_query.get()
+            summary = await asyncio.to_thread(recall_notes, query)
+            text, stable_prefix = render_prompt(parts, values={**frozen, "PREVIOUS_CONV_SUMMARY": summary})
+            _log_prompt(agent_name, text, stable_prefix)
+            if not query:
+                # Nothing to recall against yet: retry on the next run.
+                return text
+            recalled = summary
+        return render_prompt(parts, values={**frozen, "PREVIOUS_CONV_SUMMARY": recalled})[0]
+
+    return instructions
 
 
 def load_agent_tools(tool_names):
@@ -98,8 +333,8 @@ def load_agent_tools(tool_names):
             else:
                 logger.log(f"Warning! tool_not_found_in_agents_module tool={tool_name}")
         else:
-            # "read_files"
-            tool = globals().get(tool_name, None)
+            # "read_files": imported on first call (see `src/tool_registry.py`)
+            tool = get_tool(tool_name)
             if tool:
                 tools.append(tool)
             else:
@@ -109,16 +344,13 @@ def load_agent_tools(tool_names):
 def load_main_agent():
     # Load main agent from agents/agent.md
 
-    with open("agents/agent.json", "r", encoding="utf-8") as f:
-        agent_config = json.load(f)
-        model = agent_config.get("model", "gpt-5-mini")
-        tools = load_agent_tools(agent_config.get("tools", []))
-        temperature = agent_config.get("temperature", 1.0)
-
-    with open("agents/agent.md", "r", encoding="utf-8") as f:
-        instructions = prompt_replace(f.read())
+    agent_config = _load_json("agents/agent.json")
+    model = agent_config.get("model", "gpt-5-mini")
+    tools = load_agent_tools(agent_config.get("tools", []))
+    temperature = agent_config.get("temperature", 1.0)
 
-    # Inject summaries of previous conversations into <PREVIOUS_CONV_SUMMARY>
+    # Injects summaries of previous conversations into <PREVIOUS_CONV_SUMMARY>
+    instructions = agent_instructions("Tennisbot", "agents/agent.md")
 
     agent = Agent(
         name="Tennisbot",
@@ -147,39 +379,34 @@ def load_sub_agents(handoffs):
         agent_file = os.path.join(dir_path, "agent.json")
         if not os.path.exists(agent_file):
             continue
-        with open(agent_file, "r", encoding="utf-8") as f:
-            agent_config = json.load(f)
-            model = agent_config.get("model", "gpt-5-mini")
-            tools = load_agent_tools(agent_config.get("tools", []))
-
-            temperature = agent_config.get("temperature", 0.5)
-        with open(os.path.join(dir_path, "agent.md"), "r", encoding="utf-8") as f:
-            instructions = prompt_replace(f.read())
-
-            sub_agents.append(Agent(
-                name="Tennisbot the " + dirs,
-                instructions=instructions,
-                model=model,
-                tools=tools,
-                model_settings=ModelSettings(
-                    temperature=temperature,
-                    max_tokens=2048,
-                ),
-                handoffs=handoffs,
-            ))
+        agent_config = _load_json(agent_file)
+        model = agent_config.get("model", "gpt-5-mini")
+        tools = load_agent_tools(agent_config.get("tools", []))
+        temperature = agent_config.get("temperature", 0.5)
+
+        instructions = agent_instructions("Tennisbot the " + dirs, os.path.join(dir_path, "agent.md"))
+
+        sub_agents.append(Agent(
+            name="Tennisbot the " + dirs,
+            instructions=instructions,
+            model=model,
+            tools=tools,
+            model_settings=ModelSettings(
+                temperature=temperature,
+                max_tokens=2048,
+            ),
+            handoffs=handoffs,
+        ))
 
     return sub_agents
 
 def create_handoff_obj(agent):
     if agent.name == "Tennisbot":
-        with open("agents/agent.json", "r", encoding="utf-8") as f:
-            agent_config = json.load(f)
-            tool_description = agent_config.get("handoff_description", "")
+        agent_config = _load_json("agents/agent.json")
     else:
         folder_name = agent.name.replace("Tennisbot the ", "")
-        with open(f"agents/sub_agents/{folder_name}/agent.json", "r", encoding="utf-8") as f:
-            agent_config = json.load(f)
-            tool_description = agent_config.get("handoff_description", "")
+        agent_config = _load_json(os.path.join("agents/sub_agents", folder_name, "agent.json"))
+    tool_description = agent_config.get("handoff_description", "")
 
     async def on_handoff(_):
         logger.log(f"agent.handoff to {agent.name}")
@@ -0,0 +1,536 @@
+"""Full-text search over past conversations (SQLite FTS5).
+
+Indexed documents:
+    - user/assistant text of every session (via `session_history.extract_text`)
+    - session summaries, `data/session_summaries/<session_id>.md`
+    - the recorder's diary, `agents/sub_agents/recorder/diary/**/*.md`, one
+      note per blank-line separated group (recall only)
+
+Database `data/search/search.db`:
+
+    docs(session_id UNINDEXED, kind UNINDEXED, role UNINDEXED, created_at UNINDEXED, text)
+        FTS5, trigram tokenizer when available (substring search, works for
+        CJK text), else unicode61. kind is "message" or "summary".
+    notes(session_id UNINDEXED, kind UNINDEXED, created_at UNINDEXED, body UNINDEXED, terms)
+        FTS5 (unicode61) over summaries and diary for `recall()`. terms are
+        the words of body with CJK runs split into overlapping bigrams, so
+        two-character words match (trigram cannot). kind is "summary" or
+        "diary" (session_id then holds the path relative to the diary dir).
+    sources(source TEXT PRIMARY KEY, stamp INTEGER, items INTEGER)
+        What was backfilled: "session:<id>" / "summary:<id>" / "diary:<path>"
+        -> file mtime_ns; for sessions also the number of items indexed.
+
+Notes:
+    - Fed incrementally: `start_indexer()` registers a listener on
+      JsonlSession/SqliteSession.add_items; appended items are queued and
+      written by one background thread in batched transactions. Items past
+      the session's indexed item count are read back from the store, so no
+      message is indexed twice.
+    - Sessions/summaries created before the indexer was running are
+      backfilled once at startup (`start_indexer()` queues it).
+    - Rows of archived sessions are kept, so old conversations stay
+      searchable.
+    - Summaries are re-indexed when written (`add_summary()`), diary files
+      as the recorder writes them (`watch_diary()`); `refresh_notes()`
+      queues a full rescan (by mtime) for anything missed.
+    - Rebuild from scratch: `python -m src.search_index --rebuild`
+"""
+
+import argparse
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from src import jsonl_session, sqlite_session
+from src.fs_watcher import FileEvent, FsWatcher
+from src.logger import logger
+from src.session_history import extract_text
+from src.sessions_index import SESSIONS_DIR
+from src.settings import settings
+
+
+SEARCH_DB_PATH = Path("data/search/search.db")
+SUMMARIES_DIR = Path("data/session_summaries")
+DIARY_DIR = Path("agents/sub_agents/recorder/diary")
+
+# Max rows returned by one search.
+SEARCH_MAX_RESULTS = 100
+# Max OR'ed terms of one recall query.
+RECALL_MAX_TERMS = 64
+# Max queued jobs drained into one transaction.
+_BATCH_JOBS = 64
+
+
+def _connect(db_path: str | Path) -> sqlite3.Connection:
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("PRAGMA busy_timeout=5000")
+    return con
+
+
+def _ensure_schema(con: sqlite3.Connection) -> None:
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS sources "
+        "(source TEXT PRIMARY KEY, stamp INTEGER NOT NULL DEFAULT 0, items INTEGER NOT NULL DEFAULT 0)"
+    )
+    if "items" not in {row[1] for row in con.execute("PRAGMA table_info(sources)")}:
+        con.execute("ALTER TABLE sources ADD COLUMN items INTEGER NOT NULL DEFAULT 0")
+        # Indexed item counts unknown: re-index sessions on the next backfill.
+        con.execute("DELETE FROM sources WHERE source LIKE 'session:%'")
+    if not con.execute("SELECT 1 FROM sqlite_master WHERE name = 'notes'").fetchone():
+        con.execute(
+            "CREATE VIRTUAL TABLE notes USING fts5("
+            "session_id UNINDEXED, kind UNINDEXED, created_at UNINDEXED, body UNINDEXED, terms, tokenize='unicode61')"
+        )
+        # Index created before notes existed: let the next scan fill them.
+        con.execute("DELETE FROM sources WHERE source LIKE 'summary:%'")
+    if con.execute("SELECT 1 FROM sqlite_master WHERE name = 'docs'").fetchone():
+        return
+    cols = "session_id UNINDEXED, kind UNINDEXED, role UNINDEXED, created_at UNINDEXED, text"
+    try:
+        con.execute(f"CREATE VIRTUAL TABLE docs USING fts5({cols}, tokenize='trigram')")
+    except sqlite3.OperationalError:
+        # SQLite < 3.34: no trigram tokenizer.
+        con.execute(f"CREATE VIRTUAL TABLE docs USING fts5({cols}, tokenize='unicode61')")
+
+
+def _message_rows(session_id: str, items: list[dict[str, Any]], created_at: int) -> list[tuple]:
+    rows: list[tuple] = []
+    for it in items:
+        role = it.get("role")
+        if role not in ("user", "assistant"):
+            continue
+        text = extract_text(it).strip()
+        if text:
+            rows.append((session_id, "message", role, created_at, text))
+    return rows
+
+
+# Kana, CJK ideographs, Hangul: written without spaces between words.
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_CJK_RE = re.compile(f"[{_CJK}]")
+_TERM_RE = re.compile(f"[{_CJK}]+|[^\\W{_CJK}]+")
+
+
+def _terms(text: str) -> list[str]:
+    """Split text into recall terms: words, and overlapping bigrams of CJK runs."""
+
+    terms: list[str] = []
+    for run in _TERM_RE.findall(text.lower()):
+        if len(run) > 1 and _CJK_RE.match(run):
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return terms
+
+
+def _diary_chunks(text: str) -> list[str]:
+    """Split a diary file into its blank-line separated groups."""
+
+    return [c.strip() for c in re.split(r"\n\s*\n", text) if c.strip()]
+
+
+def _read_session_items(session_id: str) -> tuple[list[dict[str, Any]], int]:
+    """Return (all items, mtime_ns) of a stored session."""
+
+    path = SESSIONS_DIR / f"{session_id}.jsonl"
+    if path.exists():
+        return jsonl_session.read_items(path), path.stat().st_mtime_ns
+    if settings.session_backend == "sqlite" and sqlite_session.has_session(session_id):
+        return sqlite_session.read_items(session_id), time.time_ns()
+    return [], 0
+
+
+def _session_item_count(session_id: str) -> int:
+    path = SESSIONS_DIR / f"{session_id}.jsonl"
+    if path.exists():
+        return jsonl_session.item_count(path)
+    if settings.session_backend == "sqlite":
+        return sqlite_session.count_items(session_id)
+    return 0
+
+
+def _read_session_range(session_id: str, start: int, stop: int) -> list[dict[str, Any]]:
+    path = SESSIONS_DIR / f"{session_id}.jsonl"
+    if path.exists():
+        return jsonl_session.read_items_range(path, start, stop)
+    if settings.session_backend == "sqlite":
+        return sqlite_session.read_items_range(session_id, start, stop)
+    return []
+
+
+class SearchIndex:
+    """FTS5 index with a single background writer thread."""
+
+    def __init__(self, db_path: str | Path = SEARCH_DB_PATH):
+        self.db_path = Path(db_path)
+        self._queue: queue.Queue[tuple[str, Any] | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _con(self) -> sqlite3.Connection:
+        con = _connect(self.db_path)
+        if not self._schema_ready:
+            # Readers (search/recall) may race the indexer thread here on a fresh db.
+            with self._schema_lock:
+                if not self._schema_ready:
+                    _ensure_schema(con)
+                    self._schema_ready = True
+        return con
+
+    # --- Feeding
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="search-indexer", daemon=True)
+                self._thread.start()
+
+    def add_items(self, session_id: str, items: list[dict[str, Any]]) -> None:
+        """Queue indexing of a session's appended items (non-blocking).
+
+        Notes:
+            - `items` only decides whether there is anything to index; the
+              indexer reads the items past its indexed count from the store.
+        """
+
+        if any(it.get("role") in ("user", "assistant") for it in items):
+            self._queue.put(("items", (session_id, items, int(time.time() * 1000))))
+
+    def add_summary(self, session_id: str) -> None:
+        """Queue (re)indexing of `data/session_summaries/<session_id>.md`."""
+
+        self._queue.put(("summary", session_id))
+
+    def queue_backfill(self) -> None:
+        self._queue.put(("backfill", None))
+
+    def add_diary(self, rel: str) -> None:
+        """Queue (re)indexing of one diary file (path relative to DIARY_DIR; also on deletion)."""
+
+        self._queue.put(("diary", rel))
+
+    def refresh_notes(self) -> None:
+        """Queue a rescan of summaries and diary for changes (non-blocking)."""
+
+        self._queue.put(("notes", None))
+
+    def wait_idle(self, timeout: float = 10.0) -> bool:
+        """Block until queued work is written (tests/CLI)."""
+
+        done = threading.Event()
+        self._queue.put(("barrier", done))
+        return done.wait(timeout)
+
+    def _loop(self) -> None:
+        con = self._con()
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < _BATCH_JOBS:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._apply(con, jobs)
+            except Exception as e:
+                logger.log(f"search.index_failed jobs={len(jobs)} err={e!r}")
+            for kind, arg in jobs:
+                if kind == "barrier":
+                    arg.set()
+
+    def _apply(self, con: sqlite3.Connection, jobs: list[tuple[str, Any]]) -> None:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            for kind, arg in jobs:
+                if kind == "items":
+                    session_id, _items, created_at = arg
+                    self._index_new_items(con, session_id, created_at)
+                elif kind == "summary":
+                    self._index_summary(con, arg)
+                elif kind == "backfill":
+                    self._backfill(con)
+                elif kind == "diary":
+                    self._index_diary(con, arg)
+                elif kind == "notes":
+                    self._scan_notes(con, dict(con.execute("SELECT source, stamp FROM sources").fetchall()))
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+
+    # --- Backfill
+
+    def _index_session(self, con: sqlite3.Connection, session_id: str) -> None:
+        items, stamp = _read_session_items(session_id)
+        con.execute("DELETE FROM docs WHERE session_id = ? AND kind = 'message'", (session_id,))
+        con.executemany(
+            "INSERT INTO docs (session_id, kind, role, created_at, text) VALUES (?, ?, ?, ?, ?)",
+            _message_rows(session_id, items, stamp // 1_000_000),
+        )
+        con.execute(
+            "INSERT OR REPLACE INTO sources (source, stamp, items) VALUES (?, ?, ?)",
+            (f"session:{session_id}", stamp, len(items)),
+        )
+
+    def _index_new_items(self, con: sqlite3.Connection, session_id: str, created_at: int) -> None:
+        """Index the items of a session past its indexed item count."""
+
+        row = con.execute("SELECT items FROM sources WHERE source = ?", (f"session:{session_id}",)).fetchone()
+        total = _session_item_count(session_id)
+        if row is None or total < row[0]:
+            # First items seen for the session, or its history was cut: index it whole.
+            self._index_session(con, session_id)
+            return
+        if total == row[0]:
+            # Already indexed (by an earlier whole-session pass).
+            return
+        con.executemany(
+            "INSERT INTO docs (session_id, kind, role, created_at, text) VALUES (?, ?, ?, ?, ?)",
+            _message_rows(session_id, _read_session_range(session_id, row[0], total), created_at),
+        )
+        con.execute("UPDATE sources SET items = ? WHERE source = ?", (total, f"session:{session_id}"))
+
+    def _index_summary(self, con: sqlite3.Connection, session_id: str) -> None:
+        path = SUMMARIES_DIR / f"{session_id}.md"
+        try:
+            text = path.read_text(encoding="utf-8").strip()
+            stamp = path.stat().st_mtime_ns
+        except OSError:
+            return
+        con.execute("DELETE FROM docs WHERE session_id = ? AND kind = 'summary'", (session_id,))
+        con.execute("DELETE FROM notes WHERE session_id = ? AND kind = 'summary'", (session_id,))
+        if text:
+            con.execute(
+                "INSERT INTO docs (session_id, kind, role, created_at, text) VALUES (?, 'summary', NULL, ?, ?)",
+                (session_id, stamp // 1_000_000, text),
+            )
+            self._insert_notes(con, session_id, "summary", stamp, [text])
+        con.execute("INSERT OR REPLACE INTO sources (source, stamp) VALUES (?, ?)", (f"summary:{session_id}", stamp))
+
+    @staticmethod
+    def _insert_notes(con: sqlite3.Connection, session_id: str, kind: str, stamp: int, bodies: list[str]) -> None:
+        con.executemany(
+            "INSERT INTO notes (session_id, kind, created_at, body, terms) VALUES (?, ?, ?, ?, ?)",
+            [(session_id, kind, stamp // 1_000_000, body, " ".join(_terms(body))) for body in bodies],
+        )
+
+    def _index_diary(self, con: sqlite3.Connection, rel: str) -> None:
+        path = DIARY_DIR / rel
+        con.execute("DELETE FROM notes WHERE session_id = ? AND kind = 'diary'", (rel,))
+        try:
+            text = path.read_text(encoding="utf-8")
+            stamp = path.stat().st_mtime_ns
+        except OSError:
+            # Deleted.
+            con.execute("DELETE FROM sources WHERE source = ?", (f"diary:{rel}",))
+            return
+        self._insert_notes(con, rel, "diary", stamp, _diary_chunks(text))
+        con.execute("INSERT OR REPLACE INTO sources (source, stamp) VALUES (?, ?)", (f"diary:{rel}", stamp))
+
+    def _scan_notes(self, con: sqlite3.Connection, known: dict[str, int]) -> None:
+        """(Re)index new or modified summaries and diary files."""
+
+        for p in SUMMARIES_DIR.glob("*.md"):
+            stamp = known.get(f"summary:{p.stem}")
+            try:
+                mtime_ns = p.stat().st_mtime_ns
+            except FileNotFoundError:
+                # Deleted since the glob.
+                continue
+            if stamp is None or mtime_ns > stamp:
+                self._index_summary(con, p.stem)
+
+        diary = {p.relative_to(DIARY_DIR).as_posix(): p for p in DIARY_DIR.glob("**/*.md")}
+        for rel, p in diary.items():
+            try:
+                mtime_ns = p.stat().st_mtime_ns
+            except FileNotFoundError:
+                # Deleted since the glob: _index_diary drops its notes.
+                mtime_ns = None
+            if known.get(f"diary:{rel}") != mtime_ns:
+                self._index_diary(con, rel)
+        for source in known:
+            if source.startswith("diary:") and source[len("diary:"):] not in diary:
+                self._index_diary(con, source[len("diary:"):])
+
+    def _backfill(self, con: sqlite3.Connection) -> None:
+        known = dict(con.execute("SELECT source, stamp FROM sources").fetchall())
+
+        session_ids = {p.stem for p in SESSIONS_DIR.glob("*.jsonl")}
+        if settings.session_backend == "sqlite":
+            session_ids.update(sqlite_session.list_sessions())
+        for sid in sorted(session_ids):
+            if f"session:{sid}" not in known:
+                self._index_session(con, sid)
+
+        self._scan_notes(con, known)
+
+    def rebuild(self) -> dict[str, Any]:
+        """Drop and re-create the index from all stores (synchronous)."""
+
+        con = self._con()
+        try:
+            con.execute("DROP TABLE IF EXISTS docs")
+            con.execute("DROP TABLE IF EXISTS notes")
+            con.execute("DROP TABLE IF EXISTS sources")
+            _ensure_schema(con)
+            self._apply(con, [("backfill", None)])
+            (n,) = con.execute("SELECT COUNT(*) FROM docs").fetchone()
+        finally:
+            con.close()
+        return {"ok": True, "docs": n}
+
+    # --- Query
+
+    def search(self, query: str, *, limit: int = 20, session_id: str | None = None) -> list[dict[str, Any]]:
+        """Search messages and summaries, best match first.
+
+        Notes:
+            - `query` is matched as a literal phrase (substring with the
+              trigram tokenizer). Queries shorter than 3 characters fall back
+              to a substring scan (trigram cannot match them).
+        """
+
+        query = (query or "").strip()
+        if not query or not self.db_path.exists():
+            return []
+        limit = max(1, min(int(limit), SEARCH_MAX_RESULTS))
+
+        where = ""
+        params: list[Any] = []
+        if session_id:
+            where = " AND session_id = ?"
+            params.append(session_id)
+
+        con = self._con()
+        try:
+            if len(query) >= 3:
+                phrase = '"' + query.replace('"', '""') + '"'
+                sql = (
+                    "SELECT session_id, kind, role, created_at, "
+                    "snippet(docs, 4, '[', ']', '...', 16), bm25(docs) "
+                    f"FROM docs WHERE docs MATCH ?{where} ORDER BY bm25(docs) LIMIT ?"
+                )
+                rows = con.execute(sql, [phrase, *params, limit]).fetchall()
+            else:
+                sql = (
+                    "SELECT session_id, kind, role, created_at, substr(text, 1, 200), 0 "
+                    f"FROM docs WHERE instr(lower(text), lower(?)) > 0{where} ORDER BY created_at DESC LIMIT ?"
+                )
+                rows = con.execute(sql, [query, *params, limit]).fetchall()
+        except sqlite3.OperationalError:
+            return []
+        finally:
+            con.close()
+
+        return [
+            {
+                "session_id": sid,
+                "kind": kind,
+                "role": role,
+                "created_at": created_at,
+                "snippet": snippet,
+                "score": -float(rank),
+            }
+            for sid, kind, role, created_at, snippet, rank in rows
+        ]
+
+    def recall(self, text: str, *, k: int = 8) -> list[dict[str, Any]]:
+        """Return the `k` summaries/diary notes most relevant to free text (BM25).
+
+        Notes:
+            - Any term may match (OR query); notes sharing more and rarer
+              terms with `text` rank higher.
+            - Returns whole notes: {"session_id", "kind", "created_at",
+              "text", "score"}.
+        """
+
+        terms = list(dict.fromkeys(_terms(text or "")))[:RECALL_MAX_TERMS]
+        if not terms or not self.db_path.exists():
+            return []
+        match = " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+        con = self._con()
+        try:
+            rows = con.execute(
+                "SELECT session_id, kind, created_at, body, bm25(notes) FROM notes "
+                "WHERE notes MATCH ? ORDER BY bm25(notes) LIMIT ?",
+                (match, max(1, int(k))),
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return []
+        finally:
+            con.close()
+
+        return [
+            {"session_id": sid, "kind": kind, "created_at": created_at, "text": body, "score": -float(rank)}
+            for sid, kind, created_at, body, rank in rows
+        ]
+
+
+search_index = SearchIndex()
+
+
+def _on_items_added(session_id: str, items: list[dict[str, Any]]) -> None:
+    search_index.add_items(session_id, items)
+
+
+def _on_diary_event(ev: FileEvent) -> None:
+    if ev.kind == "overflow":
+        search_index.refresh_notes()
+    elif ev.path.suffix == ".md":
+        search_index.add_diary(ev.path.relative_to(DIARY_DIR).as_posix())
+
+
+def watch_diary(*, backend: str = "auto") -> FsWatcher:
+    """Start a watcher that re-indexes diary files as they are written."""
+
+    watcher = FsWatcher(DIARY_DIR, backend=backend)
+    watcher.subscribe(_on_diary_event)
+    return watcher.start()
+
+
+def start_indexer() -> SearchIndex:
+    """Start the background indexer, hook it into add_items and queue a backfill."""
+
+    if _on_items_added not in jsonl_session.append_listeners:
+        jsonl_session.append_listeners.append(_on_items_added)
+    search_index.start()
+    search_index.queue_backfill()
+    return search_index
+
+
+def search(query: str, *, limit: int = 20, session_id: str | None = None) -> list[dict[str, Any]]:
+    return search_index.search(query, limit=limit, session_id=session_id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tennisbot conversation search")
+    parser.add_argument("query", nargs="?", help="Text to search for")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from all sessions and summaries")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(json.dumps(search_index.rebuild(), ensure_ascii=False, indent=2))
+    if args.query:
+        t0 = time.perf_counter()
+        results = search(args.query, limit=args.limit)
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        print(f"{len(results)} results in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    elif not args.rebuild:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
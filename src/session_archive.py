@@ -1,32 +1,67 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, Iterator
 from pathlib import Path
-import threading
+import gzip
+import hashlib
+import json
+import os
 import time
 import asyncio
 
 from agents import Agent, Runner
 
-from src.session_history import get_recent_messages
-from src.sessions_index import SESSIONS_DIR, list_session_ids, rebuild_sessions_index, set_active_session_id
+from src import archive_pack, sqlite_session
+from src.job_queue import JobQueue, JobQueueFull, job_queue
+from src.jsonl_index import parse_line
+from src.jsonl_session import item_count
+from src.logger import logger
+from src.search_index import search_index
+from src.session_segments import load_manifest, remove_session_files, segment_file
+from src.session_history import get_all_messages
+from src.sessions_index import SESSIONS_DIR, sessions_index
+from src.settings import settings
 
 
-async def summarize_session(messages: list[dict[str, Any]], session_id: str) -> None:
-    """Summarize session messages and persist summary as markdown file."""
+# Max transcript characters per summarizer call (map chunk / reduce group).
+SUMMARY_CHUNK_CHARS = 12000
+# Max concurrent summarizer calls per session.
+SUMMARY_CONCURRENCY = 4
+# Max merge levels; past it the partials are cut to fit the final call.
+SUMMARY_MAX_LEVELS = 4
+# Cached partial summaries, keyed by sha256 of (prompt, text).
+SUMMARY_CACHE_DIR = Path("data/summary_cache")
 
-    if not messages:
-        return
+_FINAL_PROMPT = "请用中文，用一句话总结此会话。\n"
+_MAP_PROMPT = "请用中文简洁地总结这一段对话的要点，保留事实、决定和未完成的事项。\n"
+_REDUCE_PROMPT = "以下是同一会话按时间顺序的分段摘要。请用中文，用一句话总结整个会话。\n"
+_MERGE_PROMPT = "以下是同一会话按时间顺序的分段摘要。请用中文把它们合并为一段简洁的摘要。\n"
 
-    transcript_lines: list[str] = []
-    for m in messages:
-        role = m.get("role")
-        text = (m.get("text") or "").strip()
-        if role in ("user", "assistant") and text:
-            transcript_lines.append(f"{role}: {text}")
 
-    prompt = "请用中文，用一句话总结此会话。\n" + "\n".join(transcript_lines)
+def _chunk_lines(lines: list[str], max_chars: int) -> list[str]:
+    """Greedily pack lines into chunks of at most ~max_chars.
+
+    Notes:
+        - Packing starts from the first line, so appending messages only
+          changes the last chunk; earlier chunks (and their cached
+          summaries) stay the same.
+    """
+
+    chunks: list[str] = []
+    cur: list[str] = []
+    size = 0
+    for line in lines:
+        if cur and size + len(line) + 1 > max_chars:
+            chunks.append("\n".join(cur))
+            cur, size = [], 0
+        cur.append(line)
+        size += len(line) + 1
+    if cur:
+        chunks.append("\n".join(cur))
+    return chunks
+
 
+async def _summarize_text(prompt: str, text: str) -> str:
     summarizer = Agent(
         name="SessionSummarizer",
         instructions=(
@@ -37,63 +72,321 @@ async def summarize_session(messages: list[dict[str, Any]], session_id: str) ->
         tools=[],
     )
 
-    result = await Runner.run(summarizer, prompt)
-    summary_md = str(getattr(result, "final_output", "")).strip() or "(empty summary)"
+    result = await Runner.run(summarizer, prompt + text)
+    return str(getattr(result, "final_output", "")).strip()
+
+
+async def _summarize_cached(prompt: str, text: str, sem: asyncio.Semaphore) -> str:
+    key = hashlib.sha256((prompt + "\0" + text).encode("utf-8")).hexdigest()
+    path = SUMMARY_CACHE_DIR / key[:2] / f"{key}.txt"
+    try:
+        return path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        pass
+
+    async with sem:
+        summary = await _summarize_text(prompt, text)
+    if summary:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(summary, encoding="utf-8")
+        os.replace(tmp, path)
+    return summary
+
+
+async def summarize_transcript(lines: list[str]) -> str:
+    """Summarize a transcript of any length into one sentence (map-reduce).
+
+    Notes:
+        - A transcript that fits one chunk is summarized in a single call.
+        - Otherwise chunks are summarized concurrently (at most
+          `SUMMARY_CONCURRENCY` calls in flight), then the partial summaries
+          are merged level by level until they fit one final call. Every
+          level at least halves their number (partials too long to share a
+          group are cut), and after `SUMMARY_MAX_LEVELS` levels the rest is
+          cut to fit.
+        - Partial summaries are cached on disk, so re-summarizing a session
+          that only grew re-runs just the changed chunk(s).
+    """
+
+    sem = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+    chunks = _chunk_lines(lines, SUMMARY_CHUNK_CHARS)
+    if len(chunks) <= 1:
+        return await _summarize_text(_FINAL_PROMPT, chunks[0] if chunks else "")
+
+    partials = await asyncio.gather(*(_summarize_cached(_MAP_PROMPT, c, sem) for c in chunks))
+    for _level in range(SUMMARY_MAX_LEVELS):
+        parts = [f"[{i + 1}] {p}" for i, p in enumerate(partials) if p]
+        groups = _chunk_lines(parts, SUMMARY_CHUNK_CHARS)
+        if len(groups) <= 1:
+            return await _summarize_text(_REDUCE_PROMPT, groups[0] if groups else "")
+        if len(groups) > (len(parts) + 1) // 2:
+            # Partials too long to share a group: merge pairs, half a chunk each.
+            half = SUMMARY_CHUNK_CHARS // 2
+            groups = ["\n".join(p[:half] for p in parts[i:i + 2]) for i in range(0, len(parts), 2)]
+        partials = await asyncio.gather(*(_summarize_cached(_MERGE_PROMPT, g, sem) for g in groups))
+
+    parts = [f"[{i + 1}] {p}" for i, p in enumerate(partials) if p]
+    share = SUMMARY_CHUNK_CHARS // max(1, len(parts))
+    return await _summarize_text(_REDUCE_PROMPT, "\n".join(p[:share] for p in parts))
+
+
+async def summarize_session(messages: list[dict[str, Any]], session_id: str) -> None:
+    """Summarize session messages and persist summary as markdown file."""
+
+    if not messages:
+        return
+
+    transcript_lines: list[str] = []
+    for m in messages:
+        role = m.get("role")
+        text = (m.get("text") or "").strip()
+        if role in ("user", "assistant") and text:
+            transcript_lines.append(f"{role}: {text}")
+
+    t0 = time.perf_counter()
+    summary_md = await summarize_transcript(transcript_lines) or "(empty summary)"
+    elapsed_ms = int((time.perf_counter() - t0) * 1000)
+    logger.log(f"session.summary session_id={session_id} lines={len(transcript_lines)} elapsed_ms={elapsed_ms}")
 
     out_dir = Path("data/session_summaries")
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{session_id}.md"
     out_path.write_text(summary_md, encoding="utf-8")
+    search_index.add_summary(session_id)
 
 
-def _summarize_session_bg(*, messages, session_id: str) -> None:
-    """Run session summarization in a background thread."""
+# Items per SQLite read/write batch when packing or restoring a session.
+_SQLITE_BATCH = 1000
 
-    try:
-        asyncio.run(summarize_session(messages=messages, session_id=session_id))
-    except Exception as e:
-        # Best-effort: do not crash caller.
-        print(f"[session_archive] summarize failed for {session_id}: {e}")
+
+def _file_lines(p: Path) -> Iterator[bytes]:
+    opener = gzip.open if p.suffix == ".gz" else open
+    with opener(p, "rb") as f:
+        for line in f:
+            # Same lines as item_count(): truncated/corrupted ones are skipped.
+            if parse_line(line) is not None:
+                yield line if line.endswith(b"\n") else line + b"\n"
+
+
+def _segment_lines(db_path: Path, seg_id: str) -> list[bytes]:
+    """Return the raw lines of one sealed segment.
+
+    Raises:
+        FileNotFoundError: The segment listed in the manifest cannot be read.
+    """
+
+    # Retry: the compactor may gzip the segment between lookup and open.
+    for _ in range(3):
+        p = segment_file(db_path, seg_id)
+        if p is None:
+            continue
+        try:
+            return list(_file_lines(p))
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError(f"sealed segment {seg_id} of {db_path.name} is missing")
+
+
+def _session_lines(session_id: str) -> Iterator[bytes]:
+    """Yield the raw JSONL lines of a session, oldest first (any backend).
+
+    Raises:
+        FileNotFoundError: A sealed segment cannot be read, so the archive
+            member would be incomplete.
+    """
+
+    db_path = SESSIONS_DIR / f"{session_id}.jsonl"
+    if db_path.exists():
+        for seg in load_manifest(db_path):
+            yield from _segment_lines(db_path, str(seg.get("id")))
+        yield from _file_lines(db_path)
+        return
+
+    start = 0
+    while True:
+        items = sqlite_session.read_items_range(session_id, start, start + _SQLITE_BATCH)
+        if not items:
+            return
+        for it in items:
+            yield (json.dumps(it, ensure_ascii=False) + "\n").encode("utf-8")
+        start += _SQLITE_BATCH
 
 
 def archive_session_store(*, session_id: str) -> dict[str, Any]:
     """Archive a session.
 
     Behavior:
-        - Summarize the session content via a lightweight summarizer agent.
-        - Persist summary as a markdown file under `data/session_summaries/`.
-        - Delete the session store file (.jsonl).
-        - Rebuild sessions index.
+        - Copy the raw items into cold storage (see `src/archive_pack.py`).
+        - Queue a "summarize_session" job (see `src/job_queue.py`) that
+          summarizes the session via a lightweight summarizer agent and
+          persists it as a markdown file under `data/session_summaries/`.
+          The messages are captured in the job journal first.
+        - Delete the live store (.jsonl file, offset index and sealed
+          segments, or the SQLite rows when `session_backend` is "sqlite").
+        - Remove the session from the sessions index.
+
+    Notes:
+        - The live store is only deleted once the archive member holds
+          every item of the session and the summary job is queued; on any
+          failure it is kept and archiving can be retried.
 
     Returns:
-        Dict with ok flag and updated active_session_id.
+        Dict with ok flag and the archived session id.
     """
 
     if not session_id.isdigit():
         return {"ok": False, "error": "invalid_session_id"}
-    
-    messages = get_recent_messages(session_id=session_id, limit=200)
-    threading.Thread(
-        target=_summarize_session_bg,
-        kwargs={"messages": messages, "session_id": session_id},
-        daemon=True,
-    ).start()
 
     db_path = SESSIONS_DIR / f"{session_id}.jsonl"
-    if not db_path.exists():
+    if not db_path.exists() and not (settings.session_backend == "sqlite" and sqlite_session.has_session(session_id)):
         return {"ok": False, "error": "session_store_missing"}
-    db_path.unlink()
 
-    index = rebuild_sessions_index()
+    def expected_items() -> int:
+        return item_count(db_path) if db_path.exists() else sqlite_session.count_items(session_id)
 
-    if index.get("active_session_id") == session_id:
-        remaining = list_session_ids()
-        if remaining:
-            index = set_active_session_id(remaining[0])
-        else:
-            index["active_session_id"] = None
+    t0 = time.perf_counter()
+    try:
+        entry = archive_pack.append_member(session_id, _session_lines(session_id), expected_items=expected_items)
+    except archive_pack.MemberIncomplete as e:
+        # Items appended meanwhile; nothing was left in the pack.
+        logger.log(f"session.archive_pack_incomplete session_id={session_id} err={e}")
+        return {"ok": False, "error": "archive_pack_incomplete"}
+    except Exception as e:
+        logger.log(f"session.archive_pack_failed session_id={session_id} err={e!r}")
+        return {"ok": False, "error": "archive_pack_failed"}
+    elapsed_ms = int((time.perf_counter() - t0) * 1000)
+
+    # The whole conversation (chat text only), captured before deletion.
+    messages = get_all_messages(session_id=session_id)
+    if messages:
+        try:
+            job_queue.submit("summarize_session", {"session_id": session_id, "messages": messages})
+        except JobQueueFull:
+            return {"ok": False, "error": "job_queue_full"}
+
+    logger.log(
+        f"session.archived session_id={session_id} pack={entry['pack']} items={entry['items']} "
+        + f"bytes={entry['bytes']} packed_bytes={entry['length']} elapsed_ms={elapsed_ms}"
+    )
+
+    if db_path.exists():
+        remove_session_files(db_path)
+    else:
+        sqlite_session.delete_session(session_id)
+
+    # Drops the session; the newest remaining one becomes active if needed.
+    sessions_index.note_removed(session_id)
 
     return {
         "ok": True,
         "archived_session_id": session_id,
-    }
\ No newline at end of file
+        "pack": entry["pack"],
+    }
+
+
+def restore_session_store(*, session_id: str) -> dict[str, Any]:
+    """Restore an archived session from cold storage into the live sessions.
+
+    Notes:
+        - The archive member is kept; archiving the session again appends a
+          new one.
+        - The live file is written to a temp file first and only moved into
+          place once the member passed its checksum.
+    """
+
+    if not session_id.isdigit():
+        return {"ok": False, "error": "invalid_session_id"}
+
+    entry = archive_pack.find_member(session_id)
+    if entry is None:
+        return {"ok": False, "error": "archived_session_missing"}
+
+    db_path = SESSIONS_DIR / f"{session_id}.jsonl"
+    use_sqlite = settings.session_backend == "sqlite"
+    if db_path.exists() or (use_sqlite and sqlite_session.has_session(session_id)):
+        return {"ok": False, "error": "session_exists"}
+
+    try:
+        if use_sqlite:
+            # Verify the whole member before the first insert.
+            items = list(archive_pack.iter_member_items(entry))
+            sqlite_session.create_session(session_id)
+            for i in range(0, len(items), _SQLITE_BATCH):
+                sqlite_session.append_items(session_id, items[i: i + _SQLITE_BATCH])
+        else:
+            tmp = db_path.with_name(db_path.name + ".restore.tmp")
+            try:
+                with tmp.open("wb") as f:
+                    for chunk in archive_pack.iter_member(entry):
+                        f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, db_path)
+            finally:
+                tmp.unlink(missing_ok=True)
+    except (OSError, ValueError) as e:
+        logger.log(f"session.restore_failed session_id={session_id} err={e!r}")
+        return {"ok": False, "error": "archive_member_corrupt"}
+
+    sessions_index.note_created(session_id)
+    logger.log(f"session.restored session_id={session_id} pack={entry['pack']} items={entry['items']}")
+    return {"ok": True, "restored_session_id": session_id, "items": entry["items"]}
+
+
+def archive_idle_sessions(*, days: float) -> dict[str, Any]:
+    """Queue an "archive_session" job for every session idle for more than `days`.
+
+    Notes:
+        - The active session is never archived.
+        - Sessions with an "archive_session" job still pending or running are
+          skipped, so repeated sweeps do not pile up duplicates.
+        - Stops early once the job queue is full; the rest is picked up by
+          the next sweep.
+    """
+
+    cutoff_ms = (time.time() - days * 86400) * 1000
+    index = sessions_index.snapshot()
+    open_ids = {
+        j["payload"].get("session_id")
+        for j in job_queue.list_jobs()
+        if j["type"] == "archive_session" and j["state"] in ("pending", "running")
+    }
+    queued: list[str] = []
+    for meta in index.get("sessions", []):
+        sid = meta.get("session_id")
+        if sid == index.get("active_session_id") or sid in open_ids:
+            continue
+        # Sessions never used after creation: fall back to the creation time (the id).
+        last = int(meta.get("last_activity") or 0) or int(sid)
+        if last < cutoff_ms:
+            try:
+                job_queue.submit("archive_session", {"session_id": sid})
+            except JobQueueFull:
+                logger.log(f"session.archive_idle_queue_full queued={len(queued)}")
+                break
+            queued.append(sid)
+    return {"ok": True, "queued": queued}
+
+
+async def _summarize_job(payload: dict[str, Any]) -> None:
+    await summarize_session(payload.get("messages") or [], str(payload["session_id"]))
+
+
+async def _archive_job(payload: dict[str, Any]) -> None:
+    res = await asyncio.to_thread(archive_session_store, session_id=str(payload["session_id"]))
+    if not res.get("ok") and res.get("error") != "session_store_missing":
+        raise RuntimeError(res.get("error"))
+
+
+async def _archive_idle_job(payload: dict[str, Any]) -> None:
+    res = await asyncio.to_thread(archive_idle_sessions, days=float(payload.get("days") or 0))
+    logger.log(f"jobs.archive_idle days={payload.get('days')} queued={len(res['queued'])}")
+
+
+def register_archive_jobs(queue: JobQueue = job_queue) -> None:
+    """Register the archive job handlers on a job queue."""
+
+    queue.register("summarize_session", _summarize_job)
+    queue.register("archive_session", _archive_job)
+    queue.register("archive_idle", _archive_idle_job)
@@ -0,0 +1,234 @@
+"""Process-wide cache of parsed session items.
+
+`JsonlSession.get_items`, `history_events_from_session` and
+`get_recent_messages` all read the same JSONL files. This cache keeps the
+parsed items per file so they share one parse.
+
+Notes:
+    - Entries are keyed by absolute path and validated by (inode, size, mtime).
+    - If a file only grew, just the appended bytes are parsed. A short
+      fingerprint of the bytes before the old end guards against rewrites
+      that happen to grow the file.
+    - Entries are evicted least-recently-used once the total parsed bytes
+      exceed `ITEM_CACHE_MAX_BYTES`.
+    - `.gz` files (sealed session segments) are immutable and parsed whole.
+    - Returned lists are fresh, but the item dicts are shared. Treat them as
+      read-only.
+"""
+
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from src.jsonl_index import parse_line
+
+
+ITEM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Bytes before the parsed end kept to detect in-place rewrites.
+_FINGERPRINT_BYTES = 64
+
+
+def _parse_lines(chunk: bytes, items: list[dict[str, Any]]) -> None:
+    for line in chunk.split(b"\n"):
+        obj = parse_line(line)
+        if obj is not None:
+            items.append(obj)
+
+
+@dataclass
+class _Entry:
+    ino: int = 0
+    mtime_ns: int = 0
+    # Bytes consumed so far (always ends at a newline).
+    parsed_size: int = 0
+    fingerprint: bytes = b""
+    # Uncompressed bytes parsed (what counts toward the size bound).
+    nbytes: int = 0
+    items: list[dict[str, Any]] = field(default_factory=list)
+    # Per-item token estimates, filled lazily by get_with_tokens().
+    tokens: list[int] = field(default_factory=list)
+
+
+class ItemCache:
+    """LRU cache of parsed JSONL items, bounded by total file bytes."""
+
+    def __init__(self, *, max_bytes: int = ITEM_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+
+    def _load(self, path: str, entry: _Entry, start: int) -> None:
+        """Parse from `start` to the last complete line and update the entry."""
+
+        if path.endswith(".gz"):
+            # Sealed segments are immutable: always parsed whole.
+            with gzip.open(path, "rb") as f:
+                data = f.read()
+            _parse_lines(data, entry.items)
+            entry.parsed_size = os.path.getsize(path)
+            entry.nbytes = len(data)
+            return
+
+        with open(path, "rb") as f:
+            fp_start = max(0, start - _FINGERPRINT_BYTES)
+            f.seek(fp_start)
+            data = f.read()
+
+        body = data[start - fp_start:]
+        end = body.rfind(b"\n") + 1
+        _parse_lines(body[:end], entry.items)
+
+        entry.parsed_size = start + end
+        entry.nbytes = entry.parsed_size
+        whole = data[: (start - fp_start) + end]
+        entry.fingerprint = whole[-_FINGERPRINT_BYTES:]
+
+    def _fingerprint_ok(self, path: str, entry: _Entry) -> bool:
+        n = len(entry.fingerprint)
+        if n == 0:
+            return entry.parsed_size == 0
+        with open(path, "rb") as f:
+            f.seek(entry.parsed_size - n)
+            return f.read(n) == entry.fingerprint
+
+    def get(self, path: str | os.PathLike[str], *, only_cached: bool = False) -> list[dict[str, Any]] | None:
+        """Return all parsed items of a JSONL file.
+
+        Args:
+            only_cached: Return None instead of loading a file that is not cached yet.
+        """
+
+        key = os.path.abspath(path)
+        with self._lock:
+            try:
+                st = os.stat(key)
+            except FileNotFoundError:
+                self._drop(key)
+                return None if only_cached else []
+
+            entry = self._entries.get(key)
+            if entry is None and only_cached:
+                return None
+
+            if entry is not None and entry.ino == st.st_ino and st.st_size >= entry.parsed_size:
+                if st.st_size == entry.parsed_size and st.st_mtime_ns == entry.mtime_ns:
+                    self.hits += 1
+                elif not key.endswith(".gz") and self._fingerprint_ok(key, entry):
+                    # File only grew: parse the appended bytes.
+                    self.partial_hits += 1
+                    self._total_bytes -= entry.nbytes
+                    self._load(key, entry, entry.parsed_size)
+                    self._total_bytes += entry.nbytes
+                else:
+                    entry = None
+            else:
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                self._drop(key)
+                entry = _Entry()
+                self._load(key, entry, 0)
+                self._entries[key] = entry
+                self._total_bytes += entry.nbytes
+
+            entry.ino = st.st_ino
+            entry.mtime_ns = st.st_mtime_ns
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+            return list(entry.items)
+
+    def get_with_tokens(
+        self,
+        path: str | os.PathLike[str],
+        estimator: Callable[[dict[str, Any]], int],
+    ) -> tuple[list[dict[str, Any]], list[int]]:
+        """Return (items, token estimates) of a file.
+
+        Notes:
+            - Token counts are stored next to the cached items, so each item
+              is estimated once, and only new items after an append.
+        """
+
+        items = self.get(path) or []
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or len(entry.items) != len(items):
+                return items, [estimator(it) for it in items]
+            if len(entry.tokens) > len(entry.items):
+                del entry.tokens[len(entry.items):]
+            for it in entry.items[len(entry.tokens):]:
+                entry.tokens.append(estimator(it))
+            return items, list(entry.tokens)
+
+    def note_truncate(self, path: str | os.PathLike[str], *, items: int, size: int) -> None:
+        """Trim a cached entry after its file was truncated to `size` bytes / `items` items."""
+
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or key.endswith(".gz"):
+                return
+            if entry.parsed_size < size or len(entry.items) < items:
+                self._drop(key)
+                return
+            try:
+                with open(key, "rb") as f:
+                    f.seek(max(0, size - _FINGERPRINT_BYTES))
+                    fingerprint = f.read(min(size, _FINGERPRINT_BYTES))
+            except OSError:
+                self._drop(key)
+                return
+            del entry.items[items:]
+            del entry.tokens[items:]
+            self._total_bytes -= entry.nbytes - size
+            entry.parsed_size = entry.nbytes = size
+            entry.fingerprint = fingerprint
+            # Force a (no-op) revalidation on the next get().
+            entry.mtime_ns = 0
+
+    def invalidate(self, path: str | os.PathLike[str]) -> None:
+        """Forget a file (e.g. after it was archived or rewritten)."""
+
+        with self._lock:
+            self._drop(os.path.abspath(path))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "partial_hits": self.partial_hits,
+                "misses": self.misses,
+            }
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry.nbytes
+
+    def _evict(self, *, keep: str) -> None:
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            self._drop(key)
+
+
+item_cache = ItemCache()
@@ -0,0 +1,211 @@
+"""Rolling compaction of old conversation turns into a summary item.
+
+Once a session's history passes `session_compact_threshold_tokens`, the
+oldest turns are folded into one synthetic summary message at the head of
+the session. The raw items are kept in a compressed archive segment under
+`compacted/<session_id>/` next to the session file.
+
+Notes:
+    - Runs between turns, off the request path. Reading the history runs in
+      a worker thread and the slow part (the summarizer call) happens
+      without any lock; only the final splice runs
+      under the per-session run lock. It rewrites one bounded file: the
+      sealed segment holding the last folded item (earlier segments are
+      dropped), or the active file when every sealed segment was folded.
+    - If the session changed in a way that touches the folded prefix while
+      summarizing (e.g. pop_item/clear), the compaction is dropped.
+    - One summarizer call folds at most `COMPACT_MAX_FOLD_TOKENS`; a longer
+      prefix (e.g. a large legacy session) is folded over several passes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from agents import Agent, Runner
+
+from src.budget_session import estimate_tokens, is_turn_start, select_window
+from src.jsonl_index import get_index
+from src.jsonl_session import JsonlSession, read_items_range, read_items_with_tokens
+from src.logger import logger
+from src.session_cache import item_cache
+from src.session_history import extract_text
+from src.session_segments import layout_change, load_manifest, read_segment, remove_segments, replace_leading_segments
+from src.settings import settings
+
+
+SUMMARY_PREFIX = "[Earlier conversation summary]"
+
+# Upper bound of the (estimated) tokens folded by one summarizer call.
+COMPACT_MAX_FOLD_TOKENS = 24_000
+
+
+def is_summary_item(item: dict[str, Any]) -> bool:
+    content = item.get("content")
+    return item.get("role") == "system" and isinstance(content, str) and content.startswith(SUMMARY_PREFIX)
+
+
+def _transcript(items: list[dict[str, Any]]) -> str:
+    lines: list[str] = []
+    for it in items:
+        if is_summary_item(it):
+            lines.append("previous summary: " + str(it.get("content"))[len(SUMMARY_PREFIX):].strip())
+            continue
+        role = it.get("role")
+        if role in ("user", "assistant"):
+            text = extract_text(it).strip()
+            if text:
+                lines.append(f"{role}: {text}")
+        elif it.get("type") == "function_call":
+            lines.append(f"tool: {it.get('name') or 'tool'}")
+    return "\n".join(lines)
+
+
+async def summarize_items(items: list[dict[str, Any]]) -> str:
+    """Summarize old session items into a compact paragraph."""
+
+    prompt = "请用中文简洁地总结以下较早的对话，保留事实、决定和未完成的事项。\n" + _transcript(items)
+
+    summarizer = Agent(
+        name="SessionCompactor",
+        instructions=(
+            "用中文输出简洁、准确的对话摘要。重点关注用户输入和结果。"
+            "用户是Tennisatw，AI助理是Tennisbot"
+        ),
+        model="gpt-5-mini",
+        tools=[],
+    )
+
+    result = await Runner.run(summarizer, prompt)
+    return str(getattr(result, "final_output", "")).strip()
+
+
+def _fold_end(items: list[dict[str, Any]], tokens: list[int], cut: int, max_tokens: int) -> int:
+    """Return where to end the fold: at most `cut`, at a turn start, within `max_tokens`.
+
+    Notes:
+        - At least one turn past the head item is folded, even if it alone is
+          over `max_tokens`.
+    """
+
+    end: int | None = None
+    total = 0
+    for i in range(1, cut + 1):
+        total += tokens[i - 1]
+        if total > max_tokens and end is not None:
+            break
+        if i > 1 and (i == cut or is_turn_start(items[i])):
+            end = i
+    return end or cut
+
+
+def _archive_raw_items(path: Path, session_id: str, items: list[dict[str, Any]]) -> Path:
+    out_dir = path.parent / "compacted" / session_id
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / f"{int(time.time() * 1000)}.jsonl.gz"
+    with gzip.open(out_path, "wb") as f:
+        for it in items:
+            f.write((json.dumps(it, ensure_ascii=False) + "\n").encode("utf-8"))
+    return out_path
+
+
+def _splice(path: Path, folded: list[dict[str, Any]], summary_item: dict[str, Any]) -> bool:
+    """Replace the folded prefix with the summary item. Runs in the writer thread."""
+
+    n = len(folded)
+    # Only the segments overlapping the prefix are read (usually still cached).
+    if read_items_range(path, 0, n) != folded:
+        return False
+
+    start = 0
+    for i, seg in enumerate(load_manifest(path)):
+        count = int(seg.get("items") or 0)
+        if start + count >= n:
+            # The fold ends in this sealed segment: it keeps its unfolded rest.
+            rest = read_segment(path, str(seg.get("id")))[n - start:]
+            replace_leading_segments(path, i, [summary_item, *rest])
+            return True
+        start += count
+
+    # Every sealed segment was folded: rewrite the (bounded) active file.
+    rest = read_items_range(path, n, start + len(get_index(path)))
+    tmp = path.with_name(path.name + ".compact.tmp")
+    with tmp.open("wb") as f:
+        for it in [summary_item, *rest]:
+            f.write((json.dumps(it, ensure_ascii=False) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    with layout_change(path):
+        os.replace(tmp, path)
+        remove_segments(path)
+        item_cache.invalidate(path)
+        get_index(path)
+    return True
+
+
+async def compact_session(
+    session: JsonlSession,
+    *,
+    lock: asyncio.Lock,
+    threshold_tokens: int | None = None,
+) -> bool:
+    """Fold the oldest turns of a session into a summary item if it is too long.
+
+    Args:
+        session: The session store.
+        lock: The per-session run lock (serializes with Runner turns).
+        threshold_tokens: Trigger size; defaults to settings. The newest
+            half of the threshold is kept verbatim.
+
+    Returns:
+        True if the session was compacted.
+
+    Raises:
+        RuntimeError: The summarizer returned nothing.
+    """
+
+    threshold = settings.session_compact_threshold_tokens if threshold_tokens is None else threshold_tokens
+    if not threshold or threshold <= 0:
+        return False
+
+    path = Path(session.path)
+    compacted = False
+    # Every pass replaces at least two items with one, so this ends.
+    while True:
+        items, tokens = await asyncio.to_thread(read_items_with_tokens, path, estimate_tokens)
+        if sum(tokens) <= threshold:
+            return compacted
+
+        cut = _fold_end(items, tokens, select_window(items, tokens, threshold // 2), COMPACT_MAX_FOLD_TOKENS)
+        if cut <= 1:
+            return compacted
+        folded = items[:cut]
+
+        t0 = time.perf_counter()
+        summary = await summarize_items(folded)
+        if not summary:
+            raise RuntimeError("summarizer returned an empty summary")
+        summary_item = {"role": "system", "content": f"{SUMMARY_PREFIX}\n{summary}"}
+
+        async with lock:
+            archived = await asyncio.to_thread(_archive_raw_items, path, session.session_id, folded)
+            ok = await session.writer().call(lambda: _splice(path, folded, summary_item))
+
+        elapsed_ms = int((time.perf_counter() - t0) * 1000)
+        if not ok:
+            archived.unlink(missing_ok=True)
+            logger.log(f"session.compact.skipped session_id={session.session_id} reason=prefix_changed")
+            return compacted
+
+        logger.log(
+            "session.compact.done "
+            + f"session_id={session.session_id} folded_items={len(folded)} "
+            + f"folded_tokens={sum(tokens[:cut])} archive={archived} elapsed_ms={elapsed_ms}"
+        )
+        compacted = True
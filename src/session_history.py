@@ -1,7 +1,14 @@
+import asyncio
 import json
 from typing import Any
 
+from src.jsonl_index import CHAT_KINDS, get_index
+from src.jsonl_session import item_count, read_items, read_items_range
+from src import sqlite_session
+from src.session_cache import item_cache
+from src.session_segments import load_manifest, read_sealed_tail, read_snapshot
 from src.sessions_index import SESSIONS_DIR
+from src.settings import settings
 
 
 def extract_text(message_data: dict[str, Any]) -> str:
@@ -24,42 +31,75 @@ def extract_text(message_data: dict[str, Any]) -> str:
     return ""
 
 
-def history_events_from_session(*, session_id: str, limit: int = 200) -> list[dict[str, Any]]:
-    """Build frontend-compatible events from stored session messages.
+# Items per page for paginated history (REST and the `history_page` WS request).
+HISTORY_PAGE_SIZE = 50
+HISTORY_PAGE_MAX = 500
 
-    Notes:
-        - Reads from `data/sessions/{session_id}.jsonl`.
-        - Converts stored items into frontend-compatible WS events.
-        - Includes user/assistant chat, tool calls, and agent handoffs.
-    """
+# WS protocol version. 2 adds `history_batch` frames.
+WS_PROTOCOL_VERSION = 2
+# Upper bound for one `history_batch` frame (UTF-8 bytes of JSON).
+HISTORY_BATCH_MAX_BYTES = 64 * 1024
 
-    limit = max(1, min(int(limit), 2000))
+
+def session_item_count(session_id: str) -> int:
+    """Return the number of stored items of a session (0 if unknown)."""
 
     path = SESSIONS_DIR / f"{session_id}.jsonl"
-    if not path.exists():
-        return []
+    if path.exists() or load_manifest(path):
+        return item_count(path)
+    if settings.session_backend == "sqlite":
+        try:
+            return sqlite_session.count_items(session_id)
+        except Exception:
+            return 0
+    return 0
 
-    events: list[dict[str, Any]] = []
-    last_tool_name: str | None = None
 
-    try:
-        lines = path.read_text(encoding="utf-8").splitlines()
-    except Exception:
-        return []
+def read_session_page(
+    *,
+    session_id: str,
+    before: int | None = None,
+    limit: int = HISTORY_PAGE_SIZE,
+) -> tuple[list[dict[str, Any]], int]:
+    """Return (items, start) for the `limit` items before position `before`.
 
-    # Keep only the last `limit` items.
-    lines = lines[-limit:]
+    Notes:
+        - Positions count stored items from the oldest (0). `before=None`
+          means the end of the session.
+        - `start` is the position of the first returned item; pass it back
+          as `before` to get the previous page (0 means no older items).
+        - Rolling compaction (see `src/session_compactor.py`) shifts
+          positions; a stale cursor just yields an overlapping page.
+    """
 
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
+    total = session_item_count(session_id)
+    stop = total if before is None else max(0, min(int(before), total))
+    start = max(0, stop - max(1, int(limit)))
+    if start >= stop:
+        return [], stop
 
+    path = SESSIONS_DIR / f"{session_id}.jsonl"
+    if path.exists() or load_manifest(path):
+        items = read_items_range(path, start, stop)
+    else:
         try:
-            data = json.loads(line)
+            items = sqlite_session.read_items_range(session_id, start, stop)
         except Exception:
-            continue
+            items = []
+    return items, start
 
+
+def events_from_items(items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Convert stored items into frontend-compatible WS events.
+
+    Notes:
+        - Includes user/assistant chat, tool calls, and agent handoffs.
+    """
+
+    events: list[dict[str, Any]] = []
+    last_tool_name: str | None = None
+
+    for data in items:
         role = data.get("role")
         if role in ("user", "assistant"):
             text = extract_text(data)
@@ -88,38 +128,199 @@ def history_events_from_session(*, session_id: str, limit: int = 200) -> list[di
     return events
 
 
-async def push_session_history(ws: Any, *, session_id: str, limit: int = 200) -> None:
-    """Push session history to a connected WebSocket client."""
+def history_events_from_session(*, session_id: str, limit: int = 200) -> list[dict[str, Any]]:
+    """Build frontend-compatible events from the last `limit` stored items.
 
-    for ev in history_events_from_session(session_id=session_id, limit=limit):
-        await ws.send_text(json.dumps(ev, ensure_ascii=False))
+    Notes:
+        - Reads `data/sessions/{session_id}.jsonl`, or the SQLite store when
+          `session_backend` is "sqlite".
+    """
+
+    limit = max(1, min(int(limit), 2000))
+
+    path = SESSIONS_DIR / f"{session_id}.jsonl"
+    if path.exists():
+        items = read_items(path, limit)
+    elif settings.session_backend == "sqlite":
+        try:
+            items = sqlite_session.read_items(session_id, limit)
+        except Exception:
+            return []
+    else:
+        return []
+
+    return events_from_items(items)
+
+
+def history_page(*, session_id: str, before: int | None = None, limit: int = HISTORY_PAGE_SIZE) -> dict[str, Any]:
+    """Return one page of history as a `history_page` WS event.
+
+    Returns:
+        {"type": "history_page", "events": [...], "before": int, "has_more": bool}
+        where `before` is the cursor for the next (older) page.
+    """
+
+    limit = max(1, min(int(limit), HISTORY_PAGE_MAX))
+    items, start = read_session_page(session_id=session_id, before=before, limit=limit)
+    return {"type": "history_page", "events": events_from_items(items), "before": start, "has_more": start > 0}
+
+
+def batch_frames(events: list[dict[str, Any]], *, max_bytes: int = HISTORY_BATCH_MAX_BYTES) -> list[str]:
+    """Pack events into `history_batch` frames of at most ~`max_bytes` each.
+
+    Notes:
+        - Each event is JSON-encoded once; frames are joined from the encoded
+          parts. An event larger than `max_bytes` gets a frame of its own.
+        - Sizes are UTF-8 bytes (events keep non-ASCII text unescaped).
+    """
+
+    head, tail = '{"type": "history_batch", "events": [', "]}"
+    frames: list[str] = []
+    parts: list[str] = []
+    size = len(head) + len(tail)
+    for ev in events:
+        s = json.dumps(ev, ensure_ascii=False)
+        n = len(s.encode("utf-8"))
+        if parts and size + n + 1 > max_bytes:
+            frames.append(head + ",".join(parts) + tail)
+            parts = []
+            size = len(head) + len(tail)
+        parts.append(s)
+        size += n + 1
+    if parts:
+        frames.append(head + ",".join(parts) + tail)
+    return frames
+
+
+async def push_session_history(
+    ws: Any,
+    *,
+    session_id: str,
+    limit: int = HISTORY_PAGE_SIZE,
+    protocol: int = 1,
+) -> dict[str, Any]:
+    """Push the newest page of session history to a connected WebSocket client.
+
+    Notes:
+        - Protocol >= 2 clients get the events packed into `history_batch`
+          frames; protocol 1 clients get one frame per event.
+        - Ends with a `{"type": "meta", "event": "history_cursor"}` event
+          carrying the cursor for `history_page` requests (older pages are
+          fetched lazily). The client treats it as "history ready".
+
+    Returns:
+        {"events": int, "frames": int, "bytes": int} for logging.
+    """
+
+    page = await asyncio.to_thread(history_page, session_id=session_id, limit=limit)
+    if protocol >= 2:
+        frames = batch_frames(page["events"])
+    else:
+        frames = [json.dumps(ev, ensure_ascii=False) for ev in page["events"]]
+    frames.append(
+        json.dumps({"type": "meta", "event": "history_cursor", "before": page["before"], "has_more": page["has_more"]})
+    )
+    for frame in frames:
+        await ws.send_text(frame)
+    return {"events": len(page["events"]), "frames": len(frames), "bytes": sum(len(f) for f in frames)}
+
+
+def get_messages_page(*, session_id: str, before: int | None = None, limit: int = 50) -> dict[str, Any]:
+    """Return up to `limit` user/assistant messages stored before position `before`.
+
+    Returns:
+        {"messages": [...], "before": int, "has_more": bool}; pass `before`
+        back for the previous page.
+    """
+
+    limit = max(1, min(int(limit), 200))
+
+    found: list[tuple[int, dict[str, Any]]] = []
+    cursor = before
+    start = 0
+    while len(found) < limit:
+        items, start = read_session_page(session_id=session_id, before=cursor, limit=max(limit * 4, 100))
+        if not items:
+            break
+        chats = [(start + i, it) for i, it in enumerate(items) if _is_chat(it)]
+        found[:0] = chats[-(limit - len(found)):] if chats else []
+        if start == 0:
+            break
+        cursor = start
+
+    if len(found) >= limit:
+        start = found[0][0]
+    return {
+        "messages": _chat_messages([it for _, it in found]),
+        "before": start,
+        "has_more": start > 0,
+    }
 
 
 def get_recent_messages(*, session_id: str, limit: int = 50) -> list[dict[str, Any]]:
-    """Return recent chat messages from a session store."""
+    """Return the last `limit` user/assistant messages from a session store.
+
+    Notes:
+        - Uses the shared parsed-item cache when the file is already cached,
+          else the offset index kind codes, so tool calls/outputs in between
+          are never decoded.
+    """
 
     limit = max(1, min(int(limit), 200))
 
     path = SESSIONS_DIR / f"{session_id}.jsonl"
+    if settings.session_backend == "sqlite" and not path.exists():
+        try:
+            messages = sqlite_session.read_chat_items(session_id, limit)
+        except Exception:
+            return []
+        return _chat_messages(messages)
+
     if not path.exists():
         return []
 
+    def read() -> list[dict[str, Any]]:
+        cached = item_cache.get(path, only_cached=True)
+        if cached is not None:
+            messages = [it for it in cached if _is_chat(it)][-limit:]
+        else:
+            idx = get_index(path)
+            messages = idx.read_at(idx.last_positions(CHAT_KINDS, limit))
+        if len(messages) < limit:
+            messages = read_sealed_tail(path, limit - len(messages), keep=_is_chat) + messages
+        return messages
+
     try:
-        lines = path.read_text(encoding="utf-8").splitlines()
+        messages = read_snapshot(path, read)
     except Exception:
         return []
 
-    items: list[dict[str, Any]] = []
-    for line in lines[-limit:]:
-        line = line.strip()
-        if not line:
-            continue
+    return _chat_messages(messages)
 
+
+def get_all_messages(*, session_id: str) -> list[dict[str, Any]]:
+    """Return every user/assistant message of a session, oldest first."""
+
+    path = SESSIONS_DIR / f"{session_id}.jsonl"
+    if settings.session_backend == "sqlite" and not path.exists():
         try:
-            data = json.loads(line)
+            items = sqlite_session.read_items(session_id)
         except Exception:
-            continue
+            return []
+    else:
+        items = read_items(path)
+    return _chat_messages([it for it in items if _is_chat(it)])
+
 
+def _is_chat(item: dict[str, Any]) -> bool:
+    return item.get("role") in ("user", "assistant")
+
+
+def _chat_messages(messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Convert stored user/assistant items to {id, role, text} dicts."""
+
+    items: list[dict[str, Any]] = []
+    for data in messages:
         role = data.get("role")
         if role not in ("user", "assistant"):
             continue
@@ -0,0 +1,434 @@
+"""Segmented session storage with background compression.
+
+A JSONL session is split into fixed-size segments:
+
+    data/sessions/<id>.jsonl                     active segment, plain JSONL
+    data/sessions/segments/<id>/manifest.json    sealed segments, oldest first
+    data/sessions/segments/<id>/000001.jsonl.gz  sealed + compressed segment
+    data/sessions/segments/<id>/000002.jsonl     sealed, not compressed yet
+
+Notes:
+    - The session writer seals the active file once it reaches
+      `SEGMENT_MAX_BYTES`: it is moved under `segments/` and a new empty
+      active file takes its place. Appends stay cheap plain-file appends.
+    - A background compactor gzips sealed segments. Readers accept either
+      form, so a segment may be compressed while being read.
+    - manifest.json lists {"id", "items"} per sealed segment so readers can
+      count items without opening segments.
+    - Moving items between the active file and segments (seal, unseal, ...)
+      happens under `layout_change()`. Readers that combine both go through
+      `read_snapshot()`, so they never see items twice or not at all.
+"""
+
+import gzip
+import json
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, TypeVar
+
+from src.jsonl_index import drop_index, get_index
+from src.logger import logger
+from src.session_cache import item_cache
+
+
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+
+_MANIFEST = "manifest.json"
+_manifest_lock = threading.RLock()
+# Per session file: bumped when a layout change starts and when it ends, so
+# it is odd while one is in progress.
+_generations: dict[str, int] = {}
+# Optimistic read attempts before `read_snapshot()` takes the lock.
+_SNAPSHOT_RETRIES = 3
+# One compaction at a time (background compactor vs. explicit calls).
+_compact_lock = threading.Lock()
+
+
+T = TypeVar("T")
+
+
+@contextmanager
+def layout_change(path: str | os.PathLike[str]) -> Iterator[None]:
+    """Hold while moving items between a session's active file and its segments."""
+
+    key = os.path.abspath(path)
+    with _manifest_lock:
+        _generations[key] = _generations.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            _generations[key] += 1
+
+
+def read_snapshot(path: str | os.PathLike[str], read: Callable[[], T]) -> T:
+    """Run `read` (over sealed segments and the active file) against one layout.
+
+    Notes:
+        - Optimistic: `read` runs without the lock and is retried when a
+          layout change overlapped it; the last attempt holds the lock.
+    """
+
+    key = os.path.abspath(path)
+    for _ in range(_SNAPSHOT_RETRIES):
+        before = _generations.get(key, 0)
+        if before % 2:
+            continue
+        try:
+            out = read()
+        except FileNotFoundError:
+            if _generations.get(key, 0) == before:
+                raise
+            continue
+        if _generations.get(key, 0) == before:
+            return out
+    with _manifest_lock:
+        return read()
+
+
+def segments_dir_for(path: str | os.PathLike[str]) -> Path:
+    """Return the sealed-segments directory of a session file."""
+
+    p = Path(path)
+    return p.parent / "segments" / p.stem
+
+
+def load_manifest(path: str | os.PathLike[str]) -> list[dict[str, Any]]:
+    """Return sealed segments of a session, oldest first ([] if none)."""
+
+    try:
+        raw = (segments_dir_for(path) / _MANIFEST).read_text(encoding="utf-8")
+        data = json.loads(raw)
+    except (OSError, ValueError):
+        return []
+    segs = data.get("segments") if isinstance(data, dict) else None
+    return [s for s in segs if isinstance(s, dict)] if isinstance(segs, list) else []
+
+
+def _write_manifest(path: str | os.PathLike[str], segs: list[dict[str, Any]]) -> None:
+    d = segments_dir_for(path)
+    d.mkdir(parents=True, exist_ok=True)
+    tmp = d / (_MANIFEST + ".tmp")
+    tmp.write_text(json.dumps({"segments": segs}, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, d / _MANIFEST)
+
+
+def segment_file(path: str | os.PathLike[str], seg_id: str) -> Path | None:
+    """Return the current file of a sealed segment (compressed or not)."""
+
+    d = segments_dir_for(path)
+    for name in (f"{seg_id}.jsonl.gz", f"{seg_id}.jsonl"):
+        p = d / name
+        if p.exists():
+            return p
+    return None
+
+
+def read_segment(path: str | os.PathLike[str], seg_id: str) -> list[dict[str, Any]]:
+    """Return the items of one sealed segment (via the shared item cache)."""
+
+    return read_segment_with_tokens(path, seg_id, None)[0]
+
+
+def read_segment_with_tokens(
+    path: str | os.PathLike[str],
+    seg_id: str,
+    estimator: Callable[[dict[str, Any]], int] | None,
+) -> tuple[list[dict[str, Any]], list[int]]:
+    """Return (items, token estimates) of one sealed segment.
+
+    Raises:
+        FileNotFoundError: The segment is missing (sealed items are never
+            silently dropped).
+
+    Notes:
+        - With `estimator=None`, the token list is empty.
+    """
+
+    # Retry: the compactor may replace the file between lookup and read.
+    for _ in range(3):
+        p = segment_file(path, seg_id)
+        if p is None:
+            continue
+        try:
+            if estimator is None:
+                items, tokens = item_cache.get(p) or [], []
+            else:
+                items, tokens = item_cache.get_with_tokens(p, estimator)
+        except FileNotFoundError:
+            continue
+        if items or p.exists():
+            return items, tokens
+    raise FileNotFoundError(f"sealed segment {seg_id} of {Path(path).name} is missing")
+
+
+def sealed_item_count(path: str | os.PathLike[str]) -> int:
+    return sum(int(s.get("items") or 0) for s in load_manifest(path))
+
+
+def read_sealed_items(path: str | os.PathLike[str]) -> list[dict[str, Any]]:
+    """Return all items of all sealed segments, oldest first."""
+
+    items: list[dict[str, Any]] = []
+    for seg in load_manifest(path):
+        items.extend(read_segment(path, str(seg.get("id"))))
+    return items
+
+
+def read_sealed_tail(
+    path: str | os.PathLike[str],
+    limit: int,
+    *,
+    keep: Callable[[dict[str, Any]], bool] | None = None,
+) -> list[dict[str, Any]]:
+    """Return the last `limit` sealed items, opening segments newest first.
+
+    Args:
+        keep: Optional filter; only matching items are returned and counted.
+    """
+
+    parts: list[list[dict[str, Any]]] = []
+    need = limit
+    for seg in reversed(load_manifest(path)):
+        if need <= 0:
+            break
+        items = read_segment(path, str(seg.get("id")))
+        if keep is not None:
+            items = [it for it in items if keep(it)]
+        parts.append(items[-need:])
+        need -= len(parts[-1])
+
+    out: list[dict[str, Any]] = []
+    for items in reversed(parts):
+        out.extend(items)
+    return out
+
+
+def seal_active(path: str | os.PathLike[str]) -> str | None:
+    """Move the active file into a new sealed segment and start an empty one.
+
+    Notes:
+        - Must run in the session writer thread (serialized with appends).
+        - The caller has already fsynced the active file if needed.
+    """
+
+    p = Path(path)
+    try:
+        if p.stat().st_size == 0:
+            return None
+    except FileNotFoundError:
+        return None
+
+    n_items = len(get_index(p))
+    with layout_change(p):
+        segs = load_manifest(p)
+        last = max((int(s.get("id") or 0) for s in segs), default=0)
+        seg_id = f"{last + 1:06d}"
+
+        d = segments_dir_for(p)
+        d.mkdir(parents=True, exist_ok=True)
+        os.replace(p, d / f"{seg_id}.jsonl")
+        p.write_bytes(b"")
+
+        segs.append({"id": seg_id, "items": n_items})
+        _write_manifest(p, segs)
+        item_cache.invalidate(p)
+        get_index(p, check=False).reset()
+
+    schedule_compaction(p)
+    return seg_id
+
+
+def unseal_last(path: str | os.PathLike[str]) -> bool:
+    """Move the newest sealed segment back to the (empty) active file.
+
+    Returns:
+        False if there is no sealed segment or the active file is not empty.
+    """
+
+    p = Path(path)
+    with layout_change(p):
+        segs = load_manifest(p)
+        if not segs:
+            return False
+        try:
+            if p.stat().st_size:
+                return False
+        except FileNotFoundError:
+            pass
+
+        seg_id = str(segs[-1].get("id"))
+        src = segment_file(p, seg_id)
+        if src is None:
+            return False
+        tmp = p.with_name(p.name + ".tmp")
+        if src.suffix == ".gz":
+            with gzip.open(src, "rb") as fin, tmp.open("wb") as fout:
+                fout.write(fin.read())
+        else:
+            tmp.write_bytes(src.read_bytes())
+        os.replace(tmp, p)
+
+        _write_manifest(p, segs[:-1])
+        src.unlink()
+        item_cache.invalidate(src)
+        item_cache.invalidate(p)
+        get_index(p)
+    return True
+
+
+def replace_leading_segments(path: str | os.PathLike[str], upto: int, head_items: list[dict[str, Any]]) -> str:
+    """Replace sealed segments [0, upto] with one compressed segment holding `head_items`.
+
+    Returns:
+        The id of the new segment.
+
+    Notes:
+        - Must run in the session writer thread (serialized with sealing).
+        - Later segments and the active file are untouched.
+        - The new segment gets a fresh id and is written before the manifest
+          switches to it; a crash in between leaves only an unused file.
+    """
+
+    p = Path(path)
+    d = segments_dir_for(p)
+    segs = load_manifest(p)
+    seg_id = f"{max((int(s.get('id') or 0) for s in segs), default=0) + 1:06d}"
+
+    d.mkdir(parents=True, exist_ok=True)
+    tmp = d / f"{seg_id}.jsonl.gz.tmp"
+    with gzip.open(tmp, "wb", compresslevel=6) as f:
+        for it in head_items:
+            f.write((json.dumps(it, ensure_ascii=False) + "\n").encode("utf-8"))
+    with tmp.open("rb+") as f:
+        os.fsync(f.fileno())
+
+    with layout_change(p):
+        os.replace(tmp, d / f"{seg_id}.jsonl.gz")
+        _write_manifest(p, [{"id": seg_id, "items": len(head_items)}, *segs[upto + 1:]])
+        for seg in segs[:upto + 1]:
+            for name in (f"{seg.get('id')}.jsonl.gz", f"{seg.get('id')}.jsonl"):
+                item_cache.invalidate(d / name)
+                (d / name).unlink(missing_ok=True)
+    return seg_id
+
+
+def remove_segments(path: str | os.PathLike[str]) -> None:
+    """Delete all sealed segments of a session."""
+
+    d = segments_dir_for(path)
+    if not d.exists():
+        return
+    with layout_change(path):
+        for f in d.iterdir():
+            item_cache.invalidate(f)
+            try:
+                f.unlink()
+            except OSError:
+                pass
+        try:
+            d.rmdir()
+        except OSError:
+            pass
+
+
+def remove_session_files(path: str | os.PathLike[str]) -> None:
+    """Delete a session: active file, offset index, cache entry and segments."""
+
+    p = Path(path)
+    try:
+        p.unlink()
+    except FileNotFoundError:
+        pass
+    drop_index(p)
+    item_cache.invalidate(p)
+    remove_segments(p)
+
+
+# --- Background compaction
+
+
+def compact_segment(path: str | os.PathLike[str], seg_id: str) -> bool:
+    """Gzip one sealed segment in place. Returns True if it was compressed."""
+
+    with _compact_lock:
+        return _compact_segment(path, seg_id)
+
+
+def _compact_segment(path: str | os.PathLike[str], seg_id: str) -> bool:
+    d = segments_dir_for(path)
+    src = d / f"{seg_id}.jsonl"
+    if not src.exists():
+        return False
+
+    dst = d / f"{seg_id}.jsonl.gz"
+    tmp = d / f"{seg_id}.jsonl.gz.tmp"
+    with src.open("rb") as fin, gzip.open(tmp, "wb", compresslevel=6) as fout:
+        while True:
+            chunk = fin.read(1024 * 1024)
+            if not chunk:
+                break
+            fout.write(chunk)
+    with tmp.open("rb+") as f:
+        os.fsync(f.fileno())
+
+    with _manifest_lock:
+        # The segment may have been unsealed/removed meanwhile.
+        if not src.exists():
+            tmp.unlink()
+            return False
+        os.replace(tmp, dst)
+        src.unlink()
+    item_cache.invalidate(src)
+    return True
+
+
+def compact_session(path: str | os.PathLike[str]) -> int:
+    """Compress every uncompressed sealed segment of a session."""
+
+    n = 0
+    for seg in load_manifest(path):
+        try:
+            if compact_segment(path, str(seg.get("id"))):
+                n += 1
+        except OSError:
+            continue
+    return n
+
+
+_compact_queue: queue.Queue[str] = queue.Queue()
+_compactor: threading.Thread | None = None
+_compactor_lock = threading.Lock()
+
+
+def _compactor_loop() -> None:
+    while True:
+        path = _compact_queue.get()
+        try:
+            compact_session(path)
+        except Exception as e:
+            logger.log(f"segments.compaction_failed path={path} err={e!r}")
+
+
+def schedule_compaction(path: str | os.PathLike[str]) -> None:
+    """Queue a session for background compaction of its sealed segments."""
+
+    global _compactor
+    with _compactor_lock:
+        if _compactor is None or not _compactor.is_alive():
+            _compactor = threading.Thread(target=_compactor_loop, name="segment-compactor", daemon=True)
+            _compactor.start()
+    _compact_queue.put(str(path))
+
+
+def schedule_pending_compactions(sessions_dir: str | os.PathLike[str]) -> None:
+    """Queue every session that still has uncompressed sealed segments (startup)."""
+
+    root = Path(sessions_dir) / "segments"
+    if not root.exists():
+        return
+    for d in root.iterdir():
+        if d.is_dir() and any(d.glob("*.jsonl")):
+            schedule_compaction(Path(sessions_dir) / f"{d.name}.jsonl")
@@ -0,0 +1,76 @@
+import os
+from pathlib import Path
+
+from src import sqlite_session
+from src.budget_session import estimate_tokens
+from src.fs_watcher import FileEvent, FsWatcher
+from src.jsonl_index import drop_index
+from src.jsonl_session import JsonlSession, read_items_with_tokens
+from src.session_cache import item_cache
+from src.sessions_index import SESSIONS_DIR, handle_fs_event
+from src.settings import settings
+from src.sqlite_session import SqliteSession
+
+
+def open_session(session_id: str, path: str | os.PathLike[str] | None = None) -> JsonlSession | SqliteSession:
+    """Open a session store using the backend selected in data/setting.json.
+
+    Args:
+        session_id: Session id.
+        path: JSONL path override (default `data/sessions/{session_id}.jsonl`).
+            Ignored by the SQLite backend.
+    """
+
+    if settings.session_backend == "sqlite":
+        return SqliteSession(session_id)
+    return JsonlSession(session_id, path=path or SESSIONS_DIR / f"{session_id}.jsonl")
+
+
+def prefetch_session(session_id: str) -> int:
+    """Warm the caches the first turn of a session reads. Returns the item count.
+
+    Notes:
+        - JSONL: parses the session into the item cache together with the
+          per-item token estimates used by the token budget.
+        - SQLite: reads the rows once so their pages are in the OS cache.
+        - Blocking; run it in a worker thread.
+    """
+
+    if settings.session_backend == "sqlite":
+        return len(sqlite_session.read_items(session_id))
+    path = SESSIONS_DIR / f"{session_id}.jsonl"
+    if not path.exists():
+        return 0
+    items, _tokens = read_items_with_tokens(path, estimate_tokens)
+    return len(items)
+
+
+def _invalidate_caches(event: FileEvent) -> None:
+    """Drop parsed items / offset index of session files removed behind our back."""
+
+    if event.kind == "overflow":
+        item_cache.clear()
+        return
+    p = Path(event.path)
+    if event.kind != "deleted" or p.exists():
+        # Growth and rewrites are detected by the cache/index themselves.
+        return
+    if p.name.endswith((".jsonl", ".jsonl.gz")):
+        item_cache.invalidate(p)
+    if p.suffix == ".jsonl":
+        drop_index(p)
+
+
+def watch_sessions(sessions_dir: str | os.PathLike[str] = SESSIONS_DIR, *, backend: str = "auto") -> FsWatcher:
+    """Start a watcher on the sessions directory.
+
+    Notes:
+        - Keeps the sessions index and the parsed-item/offset-index caches
+          coherent with writes from other processes (e.g. the CLI), so
+          nothing needs to re-scan the directory per request.
+    """
+
+    watcher = FsWatcher(sessions_dir, backend=backend)
+    watcher.subscribe(handle_fs_event)
+    watcher.subscribe(_invalidate_caches)
+    return watcher.start()
@@ -0,0 +1,315 @@
+"""Per-session background writer with group commit.
+
+`JsonlSession.add_items` hands encoded lines to a `SessionWriter`, which owns
+one daemon thread per session file. The thread drains every batch queued
+since its last pass, writes them with one `write()` and, depending on the
+durability mode, one `fsync()`. The event loop never blocks on disk I/O.
+
+Durability modes (`session_durability` in data/setting.json):
+    - "always":      add_items returns after its data is fsynced.
+    - "batched(ms)": add_items returns after write(); fsync at most every `ms`.
+    - "os":          add_items returns after write(); never fsync on our own.
+
+`flush()` waits until everything queued so far is written and, unless the
+mode is "os", fsynced. Call it at turn boundaries.
+"""
+
+import asyncio
+import os
+import queue
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from src import session_segments
+from src.jsonl_index import get_index
+
+
+# Writer threads exit after this many idle seconds and restart on demand.
+WRITER_IDLE_EXIT_S = 30.0
+
+_BATCHED_RE = re.compile(r"^batched\((\d+)\)$")
+
+
+@dataclass(frozen=True)
+class Durability:
+    """Parsed durability mode."""
+
+    mode: str  # "always" | "batched" | "os"
+    interval_ms: int = 0
+
+
+def parse_durability(value: str) -> Durability:
+    """Parse a durability string like "always", "os" or "batched(50)"."""
+
+    v = (value or "").strip().lower()
+    if v in ("always", "os"):
+        return Durability(v)
+    m = _BATCHED_RE.match(v.replace(" ", ""))
+    if m:
+        return Durability("batched", int(m.group(1)))
+    raise ValueError(f"invalid_durability: {value!r}")
+
+
+@dataclass
+class WriterStats:
+    """Write/fsync counters of one session writer."""
+
+    batches: int = 0
+    groups: int = 0
+    items: int = 0
+    bytes: int = 0
+    fsyncs: int = 0
+    write_ms_total: float = 0.0
+    write_ms_max: float = 0.0
+    fsync_ms_total: float = 0.0
+    fsync_ms_max: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        d = asdict(self)
+        d["write_ms_avg"] = self.write_ms_total / self.groups if self.groups else 0.0
+        d["fsync_ms_avg"] = self.fsync_ms_total / self.fsyncs if self.fsyncs else 0.0
+        return d
+
+
+@dataclass
+class _Request:
+    """One unit of work for the writer thread."""
+
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    # Append: (encoded line, item kind) pairs.
+    lines: list[tuple[bytes, int]] | None = None
+    # Flush barrier.
+    flush: bool = False
+    # Exclusive callable run in the writer thread (e.g. clear/truncate).
+    call: Callable[[], Any] | None = None
+
+
+def _resolve(req: _Request, result: Any = None, error: BaseException | None = None) -> None:
+    def _set() -> None:
+        if req.future.done():
+            return
+        if error is not None:
+            req.future.set_exception(error)
+        else:
+            req.future.set_result(result)
+
+    try:
+        req.loop.call_soon_threadsafe(_set)
+    except RuntimeError:
+        # Submitting loop is closed; nobody is waiting anymore.
+        pass
+
+
+class SessionWriter:
+    """Group-commit writer for one JSONL session file."""
+
+    def __init__(self, path: str | os.PathLike[str], durability: Durability):
+        self.path = Path(path)
+        self.durability = durability
+        self.stats = WriterStats()
+        self._queue: queue.Queue[_Request] = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+
+    # --- Event loop side
+
+    def _submit(self, req: _Request) -> asyncio.Future:
+        with self._lock:
+            self._queue.put(req)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=f"session-writer:{self.path.name}", daemon=True
+                )
+                self._thread.start()
+        return req.future
+
+    def _new_request(self, **kwargs: Any) -> _Request:
+        loop = asyncio.get_running_loop()
+        return _Request(loop=loop, future=loop.create_future(), **kwargs)
+
+    async def append(self, lines: list[tuple[bytes, int]]) -> None:
+        """Queue encoded lines and wait per the durability mode."""
+
+        if not lines:
+            return
+        await self._submit(self._new_request(lines=lines))
+
+    async def flush(self) -> None:
+        """Wait until all queued writes are written (and fsynced unless mode is "os")."""
+
+        await self._submit(self._new_request(flush=True))
+
+    async def call(self, fn: Callable[[], Any]) -> Any:
+        """Run `fn` in the writer thread, ordered after all queued writes."""
+
+        return await self._submit(self._new_request(call=fn))
+
+    # --- Writer thread side
+
+    def _fsync_fd(self, fd: int) -> None:
+        t0 = time.perf_counter()
+        os.fsync(fd)
+        ms = (time.perf_counter() - t0) * 1000
+        self.stats.fsyncs += 1
+        self.stats.fsync_ms_total += ms
+        self.stats.fsync_ms_max = max(self.stats.fsync_ms_max, ms)
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+
+    def _fsync_file(self) -> None:
+        if not self._dirty:
+            return
+        try:
+            # Write access: fsync on a read-only handle fails on Windows.
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            self._dirty = False
+            return
+        try:
+            self._fsync_fd(fd)
+        finally:
+            os.close(fd)
+
+    def _write_group(self, reqs: list[_Request]) -> None:
+        """Write all appends of a group with one write() and at most one fsync()."""
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        records: list[tuple[int, int]] = []
+        chunks: list[bytes] = []
+
+        t0 = time.perf_counter()
+        with self.path.open("ab") as f:
+            start = pos = f.tell()
+            for req in reqs:
+                for data, kind in req.lines or ():
+                    chunks.append(data)
+                    records.append((pos, kind))
+                    pos += len(data)
+            f.write(b"".join(chunks))
+            f.flush()
+            ms = (time.perf_counter() - t0) * 1000
+            self._dirty = True
+
+            if self.durability.mode == "always":
+                self._fsync_fd(f.fileno())
+            elif self.durability.mode == "batched":
+                if (time.monotonic() - self._last_fsync) * 1000 >= self.durability.interval_ms:
+                    self._fsync_fd(f.fileno())
+
+        self.stats.groups += 1
+        self.stats.batches += len(reqs)
+        self.stats.items += len(records)
+        self.stats.bytes += pos - start
+        self.stats.write_ms_total += ms
+        self.stats.write_ms_max = max(self.stats.write_ms_max, ms)
+
+        try:
+            get_index(self.path, check=False).note_append(start=start, records=records)
+        except Exception:
+            # The index is a cache; readers rebuild it if it falls behind.
+            pass
+
+        if pos >= session_segments.SEGMENT_MAX_BYTES:
+            # Seal a durable segment; the compactor gzips it in the background.
+            self._fsync_file()
+            session_segments.seal_active(self.path)
+
+    def _next_timeout(self) -> float:
+        if self._dirty and self.durability.mode == "batched":
+            elapsed_ms = (time.monotonic() - self._last_fsync) * 1000
+            return max(0.0, (self.durability.interval_ms - elapsed_ms) / 1000)
+        return WRITER_IDLE_EXIT_S
+
+    def _run(self) -> None:
+        while True:
+            try:
+                first = self._queue.get(timeout=self._next_timeout())
+            except queue.Empty:
+                if self._dirty and self.durability.mode == "batched":
+                    self._safe_fsync()
+                    continue
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+
+            # Group commit: take everything queued since the last pass.
+            pending = [first]
+            while True:
+                try:
+                    pending.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            appends: list[_Request] = []
+            for req in pending:
+                if req.lines is not None:
+                    appends.append(req)
+                    continue
+                # Barriers keep ordering: write what came before them first.
+                self._process_appends(appends)
+                appends = []
+                self._process_barrier(req)
+            self._process_appends(appends)
+
+    def _safe_fsync(self) -> None:
+        try:
+            self._fsync_file()
+        except Exception:
+            pass
+
+    def _process_appends(self, reqs: list[_Request]) -> None:
+        if not reqs:
+            return
+        try:
+            self._write_group(reqs)
+        except Exception as e:
+            for req in reqs:
+                _resolve(req, error=e)
+            return
+        for req in reqs:
+            _resolve(req)
+
+    def _process_barrier(self, req: _Request) -> None:
+        try:
+            if req.flush and self.durability.mode != "os":
+                self._fsync_file()
+            result = req.call() if req.call is not None else None
+        except Exception as e:
+            _resolve(req, error=e)
+            return
+        _resolve(req, result)
+
+
+_writers: dict[str, SessionWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path: str | os.PathLike[str], durability: str) -> SessionWriter:
+    """Return the process-wide writer for a session file."""
+
+    key = os.path.abspath(path)
+    parsed = parse_durability(durability)
+    with _writers_lock:
+        w = _writers.get(key)
+        if w is None:
+            w = SessionWriter(path, parsed)
+            _writers[key] = w
+        else:
+            w.durability = parsed
+        return w
+
+
+def writer_stats() -> dict[str, dict[str, Any]]:
+    """Return counters of all session writers, keyed by file path."""
+
+    with _writers_lock:
+        return {key: w.stats.as_dict() for key, w in _writers.items()}
@@ -1,92 +1,354 @@
+"""Sessions index: the session list plus per-session metadata.
+
+The index lives in memory. It is loaded once (from `data/sessions/index.json`,
+reconciled with one directory scan) and then updated incrementally by
+create/append/archive events. Writes to index.json are atomic and debounced.
+
+index.json:
+
+    {
+      "sessions": [
+        {"session_id": "1700000000000", "items": 12, "bytes": 3456,
+         "last_activity": 1700000123456, "title": "first user message"}
+      ],
+      "active_session_id": "1700000000000"
+    }
+
+Notes:
+    - Sessions are sorted by session_id desc (newest first).
+    - `last_activity` is Unix epoch milliseconds.
+"""
+
+import atexit
 import json
+import os
+import threading
 import time
 from pathlib import Path
 from typing import Any
 
+from src import sqlite_session
+from src.fs_watcher import FileEvent
+from src.jsonl_session import item_count, read_items_range
+from src.session_segments import segments_dir_for
+from src.settings import settings
+
 
 SESSIONS_DIR = Path("data/sessions")
 SESSIONS_INDEX_PATH = SESSIONS_DIR / "index.json"
 
+# Delay before index.json is written after a change (changes coalesce).
+INDEX_SAVE_DEBOUNCE_S = 1.0
+# Max characters of a session title.
+TITLE_MAX_CHARS = 80
+# Items scanned from the start of a session to find its title.
+_TITLE_SCAN_ITEMS = 20
 
-def list_session_ids() -> list[str]:
-    """Return session ids from existing db files."""
 
-    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+def _use_sqlite() -> bool:
+    return settings.session_backend == "sqlite"
 
-    session_ids: list[str] = []
-    for p in list(SESSIONS_DIR.glob("*.db")) + list(SESSIONS_DIR.glob("*.jsonl")):
-        sid = p.stem
-        if sid.isdigit():
-            session_ids.append(sid)
 
-    session_ids.sort(reverse=True)
-    return session_ids
+def _sqlite_session_ids() -> list[str]:
+    if not _use_sqlite():
+        return []
+    return [sid for sid in sqlite_session.list_sessions() if sid.isdigit()]
 
 
+def session_exists(session_id: str) -> bool:
+    """Return True if a session store exists for session_id (any backend)."""
+
+    if (SESSIONS_DIR / f"{session_id}.jsonl").exists() or (SESSIONS_DIR / f"{session_id}.db").exists():
+        return True
+    return _use_sqlite() and sqlite_session.has_session(session_id)
 
-def rebuild_sessions_index() -> dict[str, Any]:
-    """Rebuild sessions index from existing jsonl files.
+
+def _new_session_store(session_id: str) -> None:
+    """Create an empty store so the session appears in the index immediately."""
+
+    if _use_sqlite():
+        sqlite_session.create_session(session_id)
+        return
+    db_path = SESSIONS_DIR / f"{session_id}.jsonl"
+    if not db_path.exists():
+        db_path.write_text("", encoding="utf-8")
+
+
+def _title_from_items(items: list[dict[str, Any]]) -> str:
+    for it in items:
+        if it.get("role") != "user":
+            continue
+        content = it.get("content")
+        if isinstance(content, list):
+            content = "".join(p.get("text") or "" for p in content if isinstance(p, dict))
+        if isinstance(content, str) and content.strip():
+            return " ".join(content.split())[:TITLE_MAX_CHARS]
+    return ""
+
+
+def _scan_session(session_id: str, *, title: str = "") -> dict[str, Any]:
+    """Compute metadata of one session from its store."""
+
+    meta: dict[str, Any] = {"session_id": session_id, "items": 0, "bytes": 0, "last_activity": 0, "title": title}
+
+    path = SESSIONS_DIR / f"{session_id}.jsonl"
+    if path.exists():
+        files = [path]
+        seg_dir = segments_dir_for(path)
+        if seg_dir.exists():
+            files.extend(p for p in seg_dir.iterdir() if p.name != "manifest.json")
+        for p in files:
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            meta["bytes"] += st.st_size
+            meta["last_activity"] = max(meta["last_activity"], st.st_mtime_ns // 1_000_000)
+        try:
+            meta["items"] = item_count(path)
+            if not title and meta["items"]:
+                meta["title"] = _title_from_items(read_items_range(path, 0, _TITLE_SCAN_ITEMS))
+        except Exception:
+            pass
+        return meta
+
+    if _use_sqlite():
+        try:
+            meta["items"], meta["bytes"], meta["last_activity"] = sqlite_session.session_stats(session_id)
+            if not title and meta["items"]:
+                meta["title"] = _title_from_items(sqlite_session.read_items_range(session_id, 0, _TITLE_SCAN_ITEMS))
+        except Exception:
+            pass
+    return meta
+
+
+class SessionsIndex:
+    """In-memory sessions index, persisted to index.json on a debounce."""
+
+    def __init__(self, path: str | os.PathLike[str] = SESSIONS_INDEX_PATH):
+        self.path = Path(path)
+        self._sessions: dict[str, dict[str, Any]] = {}
+        self._active: str | None = None
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._save_timer: threading.Timer | None = None
+
+    # --- Loading
+
+    def _read_file(self) -> tuple[dict[str, dict[str, Any]], str | None]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            return {}, None
+        if not isinstance(data, dict):
+            return {}, None
+
+        sessions: dict[str, dict[str, Any]] = {}
+        for s in data.get("sessions") or []:
+            sid = s.get("session_id") if isinstance(s, dict) else None
+            if isinstance(sid, str) and sid.isdigit():
+                sessions[sid] = s
+        active = data.get("active_session_id")
+        return sessions, active if isinstance(active, str) and active.isdigit() else None
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.rebuild()
+
+    def rebuild(self) -> None:
+        """Reconcile with the session stores (one directory scan).
+
+        Notes:
+            - Metadata saved in index.json is reused when the session file
+              was not modified since; other sessions are rescanned.
+        """
+
+        with self._lock:
+            SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+            saved, prev_active = self._read_file()
+
+            session_ids: set[str] = set(_sqlite_session_ids())
+            for p in list(SESSIONS_DIR.glob("*.jsonl")) + list(SESSIONS_DIR.glob("*.db")):
+                if p.stem.isdigit():
+                    session_ids.add(p.stem)
+
+            sessions: dict[str, dict[str, Any]] = {}
+            for sid in session_ids:
+                old = saved.get(sid) or {}
+                if self._saved_is_fresh(sid, old):
+                    sessions[sid] = old
+                else:
+                    sessions[sid] = _scan_session(sid, title=str(old.get("title") or ""))
+
+            self._sessions = sessions
+            self._active = prev_active if prev_active in sessions else self._newest()
+            self._loaded = True
+        self._schedule_save()
+
+    def _saved_is_fresh(self, session_id: str, saved: dict[str, Any]) -> bool:
+        if not saved or "items" not in saved:
+            return False
+        path = SESSIONS_DIR / f"{session_id}.jsonl"
+        try:
+            st = path.stat()
+        except OSError:
+            # SQLite sessions are only rescanned on append events.
+            return _use_sqlite()
+        # Written (e.g. by the CLI) after the metadata was taken?
+        return st.st_mtime_ns // 1_000_000 <= int(saved.get("last_activity") or 0)
+
+    def _newest(self) -> str | None:
+        return max(self._sessions, key=int) if self._sessions else None
+
+    # --- Events
+
+    def note_created(self, session_id: str) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            self._sessions[session_id] = _scan_session(session_id)
+        self._schedule_save()
+
+    def note_activity(self, session_id: str) -> None:
+        """Refresh metadata of a session after items were appended/removed."""
+
+        with self._lock:
+            self._ensure_loaded()
+            old = self._sessions.get(session_id)
+            if old is None and not session_exists(session_id):
+                return
+            meta = _scan_session(session_id, title=str((old or {}).get("title") or ""))
+            meta["last_activity"] = max(int(meta["last_activity"]), int(time.time() * 1000))
+            self._sessions[session_id] = meta
+        self._schedule_save()
+
+    def note_removed(self, session_id: str) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            if self._sessions.pop(session_id, None) is None:
+                return
+            if self._active == session_id:
+                self._active = self._newest()
+        self._schedule_save()
+
+    def set_active(self, session_id: str) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            if session_id not in self._sessions:
+                self._sessions[session_id] = _scan_session(session_id)
+            self._active = session_id
+        self._schedule_save()
+
+    # --- Reading
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return {"sessions": [...], "active_session_id": ...} (copies)."""
+
+        with self._lock:
+            self._ensure_loaded()
+            ids = sorted(self._sessions, key=int, reverse=True)
+            return {
+                "sessions": [dict(self._sessions[sid]) for sid in ids],
+                "active_session_id": self._active,
+            }
+
+    def session_ids(self) -> list[str]:
+        with self._lock:
+            self._ensure_loaded()
+            return sorted(self._sessions, key=int, reverse=True)
+
+    def invalidate(self) -> None:
+        """Drop the in-memory state; the next access reloads and rescans."""
+
+        with self._lock:
+            self._loaded = False
+
+    # --- Persistence
+
+    def _schedule_save(self) -> None:
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(INDEX_SAVE_DEBOUNCE_S, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def save(self) -> None:
+        """Write index.json now (atomic replace)."""
+
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._loaded:
+                return
+            data = self.snapshot()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+
+sessions_index = SessionsIndex()
+atexit.register(sessions_index.save)
+
+
+def session_id_for_path(path: str | os.PathLike[str]) -> str | None:
+    """Return the session a file under data/sessions belongs to, or None.
 
     Notes:
-        - Treat `data/sessions/*.jsonl` as the source of truth.
-        - Sort sessions by session_id desc (newest first).
-        - Preserve active_session_id when possible.
+        - `<id>.jsonl` and `segments/<id>/*` map to `<id>`.
     """
 
-    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    p = Path(os.path.abspath(path))
+    root = Path(os.path.abspath(SESSIONS_DIR))
+    if p.parent == root and p.suffix == ".jsonl" and p.stem.isdigit():
+        return p.stem
+    if p.parent.parent == root / "segments" and p.parent.name.isdigit():
+        return p.parent.name
+    return None
 
-    prev_active: str | None = None
-    try:
-        raw = SESSIONS_INDEX_PATH.read_text(encoding="utf-8")
-        data = json.loads(raw)
-        if isinstance(data, dict):
-            active = data.get("active_session_id")
-            if isinstance(active, str) and active.isdigit():
-                prev_active = active
-    except Exception:
-        prev_active = None
-
-    session_ids: list[str] = []
-    for p in list(SESSIONS_DIR.glob("*.jsonl")):
-        sid = p.stem
-        if sid.isdigit():
-            session_ids.append(sid)
-
-    session_ids.sort(reverse=True)
-
-    active_session_id: str | None = None
-    if prev_active is not None and prev_active in session_ids:
-        active_session_id = prev_active
-    elif session_ids:
-        active_session_id = session_ids[0]
-
-    index: dict[str, Any] = {
-        "sessions": [{"session_id": sid} for sid in session_ids],
-        "active_session_id": active_session_id,
-    }
 
-    tmp_path = SESSIONS_INDEX_PATH.with_suffix(".json.tmp")
-    tmp_path.write_text(json.dumps(index, ensure_ascii=False, indent=2), encoding="utf-8")
-    tmp_path.replace(SESSIONS_INDEX_PATH)
-    return index
+def handle_fs_event(event: FileEvent) -> None:
+    """Apply a watcher event (see `src/fs_watcher.py`) to the sessions index."""
 
+    if event.kind == "overflow":
+        sessions_index.invalidate()
+        return
+    sid = session_id_for_path(event.path)
+    if sid is None:
+        return
+    if event.kind == "deleted" and not session_exists(sid):
+        sessions_index.note_removed(sid)
+    else:
+        sessions_index.note_activity(sid)
 
 
-def load_sessions_index() -> dict[str, Any]:
-    """Load sessions index, rebuilding it if missing or invalid."""
+def list_session_ids() -> list[str]:
+    """Return session ids, newest first."""
 
-    try:
-        raw = SESSIONS_INDEX_PATH.read_text(encoding="utf-8")
-        data = json.loads(raw)
-        if not isinstance(data, dict):
-            raise ValueError("index_not_dict")
-        if not isinstance(data.get("sessions"), list):
-            raise ValueError("sessions_not_list")
-        return data
-    except Exception:
-        return rebuild_sessions_index()
+    return sessions_index.session_ids()
+
+
+def rebuild_sessions_index() -> dict[str, Any]:
+    """Rescan the session stores and return the index.
+
+    Notes:
+        - Treat `data/sessions/*.jsonl` (plus the SQLite store when
+          `session_backend` is "sqlite") as the source of truth.
+        - Only needed after out-of-band changes; regular create/append/archive
+          events keep the index current.
+    """
+
+    sessions_index.rebuild()
+    return sessions_index.snapshot()
 
 
+def load_sessions_index() -> dict[str, Any]:
+    """Return the sessions index (loaded from disk on first use)."""
+
+    return sessions_index.snapshot()
+
 
 def set_active_session_id(session_id: str) -> dict[str, Any]:
     """Persist active session id.
@@ -98,19 +360,11 @@ def set_active_session_id(session_id: str) -> dict[str, Any]:
     if not session_id.isdigit():
         raise ValueError("invalid_session_id")
 
-    db_path = SESSIONS_DIR / f"{session_id}.jsonl"
-    if not db_path.exists():
-        db_path = SESSIONS_DIR / f"{session_id}.db"
-    if not db_path.exists():
+    if not session_exists(session_id):
         raise FileNotFoundError("session_db_missing")
 
-    index = rebuild_sessions_index()
-    index["active_session_id"] = session_id
-    tmp_path = SESSIONS_INDEX_PATH.with_suffix(".json.tmp")
-    tmp_path.write_text(json.dumps(index, ensure_ascii=False, indent=2), encoding="utf-8")
-    tmp_path.replace(SESSIONS_INDEX_PATH)
-    return index
-
+    sessions_index.set_active(session_id)
+    return sessions_index.snapshot()
 
 
 def create_session() -> dict[str, Any]:
@@ -128,36 +382,27 @@ def create_session() -> dict[str, Any]:
 
     session_id = str(int(time.time() * 1000))
     db_path = SESSIONS_DIR / f"{session_id}.jsonl"
-    if not db_path.exists():
-        # Touch the file so it appears in the index immediately.
-        db_path.write_text("", encoding="utf-8")
+    _new_session_store(session_id)
 
-    # Rebuild index first, then explicitly persist active_session_id.
-    # rebuild_sessions_index() preserves previous active_session_id when possible.
-    rebuild_sessions_index()
-    set_active_session_id(session_id)
+    sessions_index.note_created(session_id)
+    sessions_index.set_active(session_id)
 
     return {"session_id": session_id, "db_path": str(db_path)}
 
+
 def ensure_session_db(session_id: str | None) -> str:
     """Ensure a valid session store exists and return session_id."""
 
     if isinstance(session_id, str) and session_id.isdigit():
-        db_path = SESSIONS_DIR / f"{session_id}.jsonl"
-        if not db_path.exists():
-            db_path = SESSIONS_DIR / f"{session_id}.db"
-        if db_path.exists():
+        if session_exists(session_id):
             return session_id
 
     active = load_sessions_index().get("active_session_id")
     if isinstance(active, str) and active.isdigit():
-        db_path = SESSIONS_DIR / f"{active}.jsonl"
-        if not db_path.exists():
-            db_path = SESSIONS_DIR / f"{active}.db"
-        if db_path.exists():
+        if session_exists(active):
             return active
 
     session_id = str(int(time.time() * 1000))
-    (SESSIONS_DIR / f"{session_id}.jsonl").write_text("", encoding="utf-8")
-    rebuild_sessions_index()
+    _new_session_store(session_id)
+    sessions_index.note_created(session_id)
     return session_id
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 import json
 
 @dataclass
@@ -9,6 +9,13 @@ class Settings:
     default_max_turns: int
     default_ignore: list[str]
     default_prompt: str
+    session_durability: str
+    session_backend: str
+    history_token_budget: int
+    session_compact_threshold_tokens: int
+    prompt_layout: str
+    recall_top_k: int
+    recall_token_budget: int
 
 
 def load_settings(path: str = "data/setting.json") -> Settings:
@@ -23,7 +30,34 @@ def load_settings(path: str = "data/setting.json") -> Settings:
         default_max_turns=data.get("default_max_turns", 20),
         default_ignore=data.get("default_ignore", []),
         default_prompt=data.get("default_prompt", ""),
+        session_durability=data.get("session_durability", "always"),
+        session_backend=data.get("session_backend", "jsonl"),
+        history_token_budget=data.get("history_token_budget", 0),
+        session_compact_threshold_tokens=data.get("session_compact_threshold_tokens", 0),
+        prompt_layout=data.get("prompt_layout", "inline"),
+        recall_top_k=data.get("recall_top_k", 8),
+        recall_token_budget=data.get("recall_token_budget", 2000),
     )
 
 
 settings = load_settings()
+
+# Read once at startup; a change only takes effect after a restart.
+RESTART_ONLY_SETTINGS = ("session_backend",)
+
+
+def reload_settings(path: str = "data/setting.json") -> list[str]:
+    """Reload settings in place (modules hold a reference to `settings`).
+
+    Returns:
+        Names of the fields that changed (restart-only fields excluded).
+    """
+
+    new = load_settings(path)
+    changed: list[str] = []
+    for f in fields(Settings):
+        if f.name in RESTART_ONLY_SETTINGS or getattr(settings, f.name) == getattr(new, f.name):
+            continue
+        setattr(settings, f.name, getattr(new, f.name))
+        changed.append(f.name)
+    return changed
@@ -0,0 +1,380 @@
+"""SQLite (WAL) session backend.
+
+All sessions live in one database instead of one JSONL file per session.
+
+Schema (compatible with the SDK's SQLiteSession and `z/export_session.py`):
+
+    agent_sessions(session_id TEXT PRIMARY KEY, created_at, updated_at)
+    agent_messages(
+        id           INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id   TEXT NOT NULL,
+        seq          INTEGER NOT NULL,   -- per-session item number, from 1
+        kind         INTEGER NOT NULL,   -- item kind code, see src/jsonl_index.py
+        message_data TEXT NOT NULL,      -- the item as JSON
+        created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    UNIQUE INDEX on agent_messages(session_id, seq)
+
+Usage:
+    - Select with `"session_backend": "sqlite"` in data/setting.json.
+    - Migrate existing JSONL sessions once:
+      `python -m src.sqlite_session --migrate`
+"""
+
+import argparse
+import asyncio
+import json
+import queue
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from src.blob_store import offload_item
+from src.jsonl_index import CHAT_KINDS, item_kind
+from src.jsonl_session import notify_append
+
+
+SQLITE_DB_PATH = Path("data/sessions/sessions.db")
+SQLITE_POOL_SIZE = 4
+# Per-connection prepared statement cache size.
+SQLITE_CACHED_STATEMENTS = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agent_sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS agent_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    kind INTEGER NOT NULL DEFAULT 0,
+    message_data TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (session_id) REFERENCES agent_sessions (session_id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_agent_messages_session_seq
+    ON agent_messages (session_id, seq);
+"""
+
+# Statements are module constants so each pooled connection reuses its
+# prepared copy from the statement cache.
+_SQL_TOUCH_SESSION = (
+    "INSERT INTO agent_sessions (session_id) VALUES (?) "
+    "ON CONFLICT(session_id) DO UPDATE SET updated_at = CURRENT_TIMESTAMP"
+)
+_SQL_MAX_SEQ = "SELECT COALESCE(MAX(seq), 0) FROM agent_messages WHERE session_id = ?"
+_SQL_INSERT = "INSERT INTO agent_messages (session_id, seq, kind, message_data) VALUES (?, ?, ?, ?)"
+_SQL_SELECT_ALL = "SELECT message_data FROM agent_messages WHERE session_id = ? ORDER BY seq ASC"
+_SQL_SELECT_LAST = "SELECT message_data FROM agent_messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?"
+_SQL_SELECT_LAST_CHAT = (
+    "SELECT message_data FROM agent_messages WHERE session_id = ? AND kind IN ({}) "
+    "ORDER BY seq DESC LIMIT ?".format(",".join(str(k) for k in sorted(CHAT_KINDS)))
+)
+_SQL_SELECT_RANGE = (
+    "SELECT message_data FROM agent_messages WHERE session_id = ? AND seq > ? AND seq <= ? ORDER BY seq ASC"
+)
+_SQL_COUNT = "SELECT COUNT(*) FROM agent_messages WHERE session_id = ?"
+_SQL_SESSION_STATS = (
+    "SELECT COUNT(m.id), COALESCE(SUM(LENGTH(m.message_data)), 0), "
+    "CAST(strftime('%s', s.updated_at) AS INTEGER) * 1000 "
+    "FROM agent_sessions s LEFT JOIN agent_messages m ON m.session_id = s.session_id "
+    "WHERE s.session_id = ?"
+)
+_SQL_SELECT_TOP = "SELECT id, message_data FROM agent_messages WHERE session_id = ? ORDER BY seq DESC LIMIT 1"
+_SQL_DELETE_ID = "DELETE FROM agent_messages WHERE id = ?"
+_SQL_DELETE_SESSION_MESSAGES = "DELETE FROM agent_messages WHERE session_id = ?"
+_SQL_DELETE_SESSION = "DELETE FROM agent_sessions WHERE session_id = ?"
+_SQL_LIST_SESSIONS = "SELECT session_id FROM agent_sessions"
+_SQL_HAS_SESSION = "SELECT 1 FROM agent_sessions WHERE session_id = ?"
+
+
+class ConnectionPool:
+    """Small pool of WAL-mode connections shared across threads."""
+
+    def __init__(self, db_path: str | Path, *, size: int = SQLITE_POOL_SIZE):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._pool: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        for i in range(size):
+            con = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                cached_statements=SQLITE_CACHED_STATEMENTS,
+                isolation_level=None,
+            )
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("PRAGMA busy_timeout=5000")
+            if i == 0:
+                con.executescript(_SCHEMA)
+            self._pool.put(con)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        con = self._pool.get()
+        try:
+            yield con
+        finally:
+            self._pool.put(con)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Yield a connection inside BEGIN IMMEDIATE ... COMMIT."""
+
+        with self.connection() as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                yield con
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            con.execute("COMMIT")
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools: dict[str, ConnectionPool] = {}
+
+
+def get_pool(db_path: str | Path = SQLITE_DB_PATH) -> ConnectionPool:
+    """Return the process-wide pool of a database."""
+
+    key = str(Path(db_path).resolve())
+    pool = _pools.get(key)
+    if pool is None:
+        pool = ConnectionPool(db_path)
+        _pools[key] = pool
+    return pool
+
+
+def _loads(rows: Iterable[tuple[str]]) -> list[dict[str, Any]]:
+    items: list[dict[str, Any]] = []
+    for (raw,) in rows:
+        try:
+            obj = json.loads(raw)
+        except Exception:
+            continue
+        if isinstance(obj, dict):
+            items.append(obj)
+    return items
+
+
+# --- Sync helpers (also used by sessions_index/session_history)
+
+
+def read_items(session_id: str, limit: int | None = None, *, db_path: str | Path = SQLITE_DB_PATH) -> list[dict[str, Any]]:
+    """Return items of a session (the last `limit` if set), oldest first."""
+
+    with get_pool(db_path).connection() as con:
+        if isinstance(limit, int) and limit > 0:
+            rows = con.execute(_SQL_SELECT_LAST, (session_id, limit)).fetchall()
+            rows.reverse()
+        else:
+            rows = con.execute(_SQL_SELECT_ALL, (session_id,)).fetchall()
+    return _loads(rows)
+
+
+def read_items_range(
+    session_id: str,
+    start: int,
+    stop: int,
+    *,
+    db_path: str | Path = SQLITE_DB_PATH,
+) -> list[dict[str, Any]]:
+    """Return items [start, stop) of a session (position = seq - 1)."""
+
+    if max(0, start) >= stop:
+        return []
+    with get_pool(db_path).connection() as con:
+        rows = con.execute(_SQL_SELECT_RANGE, (session_id, max(0, start), stop)).fetchall()
+    return _loads(rows)
+
+
+def count_items(session_id: str, *, db_path: str | Path = SQLITE_DB_PATH) -> int:
+    with get_pool(db_path).connection() as con:
+        return int(con.execute(_SQL_COUNT, (session_id,)).fetchone()[0])
+
+
+def session_stats(session_id: str, *, db_path: str | Path = SQLITE_DB_PATH) -> tuple[int, int, int]:
+    """Return (items, bytes of message_data, last activity as epoch ms) of a session."""
+
+    with get_pool(db_path).connection() as con:
+        row = con.execute(_SQL_SESSION_STATS, (session_id,)).fetchone()
+    return int(row[0] or 0), int(row[1] or 0), int(row[2] or 0)
+
+
+def read_chat_items(session_id: str, limit: int, *, db_path: str | Path = SQLITE_DB_PATH) -> list[dict[str, Any]]:
+    """Return the last `limit` user/assistant items of a session, oldest first."""
+
+    with get_pool(db_path).connection() as con:
+        rows = con.execute(_SQL_SELECT_LAST_CHAT, (session_id, limit)).fetchall()
+    rows.reverse()
+    return _loads(rows)
+
+
+def append_items(session_id: str, items: Iterable[dict[str, Any]], *, db_path: str | Path = SQLITE_DB_PATH) -> None:
+    """Append items to a session in one transaction."""
+
+    with get_pool(db_path).transaction() as con:
+        _append_items(con, session_id, items)
+
+
+def _append_items(con: sqlite3.Connection, session_id: str, items: Iterable[dict[str, Any]]) -> None:
+    con.execute(_SQL_TOUCH_SESSION, (session_id,))
+    (seq,) = con.execute(_SQL_MAX_SEQ, (session_id,)).fetchone()
+    rows = []
+    for it in items:
+        seq += 1
+        rows.append((session_id, seq, item_kind(it), json.dumps(it, ensure_ascii=False)))
+    con.executemany(_SQL_INSERT, rows)
+
+
+def create_session(session_id: str, *, db_path: str | Path = SQLITE_DB_PATH) -> None:
+    """Register an (empty) session."""
+
+    with get_pool(db_path).connection() as con:
+        con.execute(_SQL_TOUCH_SESSION, (session_id,))
+
+
+def has_session(session_id: str, *, db_path: str | Path = SQLITE_DB_PATH) -> bool:
+    with get_pool(db_path).connection() as con:
+        return con.execute(_SQL_HAS_SESSION, (session_id,)).fetchone() is not None
+
+
+def list_sessions(*, db_path: str | Path = SQLITE_DB_PATH) -> list[str]:
+    with get_pool(db_path).connection() as con:
+        return [row[0] for row in con.execute(_SQL_LIST_SESSIONS)]
+
+
+def delete_session(session_id: str, *, db_path: str | Path = SQLITE_DB_PATH) -> bool:
+    """Delete a session and its messages. Returns False if it did not exist."""
+
+    with get_pool(db_path).transaction() as con:
+        con.execute(_SQL_DELETE_SESSION_MESSAGES, (session_id,))
+        cur = con.execute(_SQL_DELETE_SESSION, (session_id,))
+        return cur.rowcount > 0
+
+
+@dataclass
+class SqliteSession:
+    """SQLite-backed session store with the JsonlSession surface.
+
+    Notes:
+        - All sessions share one WAL-mode database and a connection pool.
+        - Queries run in worker threads, never on the event loop.
+    """
+
+    session_id: str
+    db_path: str | Path = field(default=SQLITE_DB_PATH)
+
+    async def get_items(self, limit: int | None = None) -> list[dict[str, Any]]:
+        """Return stored items.
+
+        Args:
+            limit: Optional max number of items (the most recent ones).
+        """
+
+        return await asyncio.to_thread(read_items, self.session_id, limit, db_path=self.db_path)
+
+    async def add_items(self, items: Iterable[dict[str, Any]]) -> None:
+        """Append items to the session (large tool outputs go to the blob store)."""
+
+        items = [offload_item(it) for it in items]
+        if items:
+            await asyncio.to_thread(append_items, self.session_id, items, db_path=self.db_path)
+            notify_append(self.session_id, items)
+
+    async def flush(self) -> dict[str, Any]:
+        """No-op: each add_items is its own committed transaction."""
+
+        return {}
+
+    async def pop_item(self) -> dict[str, Any] | None:
+        """Remove and return the most recent item, or None if empty."""
+
+        def _pop() -> dict[str, Any] | None:
+            with get_pool(self.db_path).transaction() as con:
+                row = con.execute(_SQL_SELECT_TOP, (self.session_id,)).fetchone()
+                if row is None:
+                    return None
+                con.execute(_SQL_DELETE_ID, (row[0],))
+            items = _loads([(row[1],)])
+            return items[0] if items else None
+
+        return await asyncio.to_thread(_pop)
+
+    async def clear_session(self) -> None:
+        """Clear all stored items (the session itself stays registered)."""
+
+        def _clear() -> None:
+            with get_pool(self.db_path).transaction() as con:
+                con.execute(_SQL_DELETE_SESSION_MESSAGES, (self.session_id,))
+
+        await asyncio.to_thread(_clear)
+
+
+def migrate_jsonl_sessions(
+    sessions_dir: str | Path = "data/sessions",
+    *,
+    db_path: str | Path = SQLITE_DB_PATH,
+) -> dict[str, Any]:
+    """Copy `*.jsonl` sessions into the database (one-shot).
+
+    Notes:
+        - Sessions already present in the database are skipped, so running it
+          twice is safe.
+        - Each session is created and filled in one transaction: an
+          interrupted run leaves no empty session behind to be skipped.
+        - JSONL files are left in place; delete them once verified.
+    """
+
+    migrated: list[str] = []
+    skipped: list[str] = []
+    n_items = 0
+    pool = get_pool(db_path)
+    for p in sorted(Path(sessions_dir).glob("*.jsonl")):
+        sid = p.stem
+        if has_session(sid, db_path=db_path):
+            skipped.append(sid)
+            continue
+
+        items: list[dict[str, Any]] = []
+        with p.open("rb") as f:
+            items = _loads((line,) for line in f if line.strip())
+
+        with pool.transaction() as con:
+            if con.execute(_SQL_HAS_SESSION, (sid,)).fetchone() is not None:
+                skipped.append(sid)
+                continue
+            _append_items(con, sid, items)
+        migrated.append(sid)
+        n_items += len(items)
+
+    return {"ok": True, "migrated": migrated, "skipped": skipped, "items": n_items}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tennisbot SQLite session store")
+    parser.add_argument("--migrate", action="store_true", help="Copy data/sessions/*.jsonl into the database")
+    parser.add_argument("--sessions-dir", default="data/sessions", help="Directory with *.jsonl sessions")
+    parser.add_argument("--db", default=str(SQLITE_DB_PATH), help="SQLite db path")
+    args = parser.parse_args()
+
+    if args.migrate:
+        res = migrate_jsonl_sessions(args.sessions_dir, db_path=args.db)
+        print(json.dumps(res, ensure_ascii=False, indent=2))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Lazy registry of the function tools in `src/tools/`.
+
+Convention: `src/tools/<name>.py` defines the tool function `<name>`.
+
+The manifest `src/tools/manifest.json` caches what the SDK derives from each
+tool (name, description, parameters JSON schema), keyed by the sha256 of the
+module source:
+
+    {"tools": {"read_file": {"source_sha256": "...", "description": "...",
+                             "params_json_schema": {...},
+                             "strict_json_schema": true}}}
+
+Notes:
+    - `get_tool()` serves a tool from the manifest without importing its
+      module; the module is imported (and the real tool built) on the first
+      call of the tool.
+    - Tools missing from the manifest or whose source changed since the
+      manifest was built are imported directly (slower, still correct).
+    - Rebuild the manifest after editing tools:
+        python -m src.tool_registry --build
+"""
+
+import argparse
+import copy
+import hashlib
+import importlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+from agents import FunctionTool
+
+from src.logger import logger
+
+
+TOOLS_DIR = Path(__file__).resolve().parent / "tools"
+TOOLS_MANIFEST_PATH = TOOLS_DIR / "manifest.json"
+
+_lock = threading.Lock()
+_manifest: dict[str, dict[str, Any]] | None = None
+_tools: dict[str, FunctionTool] = {}
+
+
+def tool_names() -> list[str]:
+    """Return the names of all tools under `src/tools/` (no imports).
+
+    Notes:
+        - `_`-prefixed modules are helpers or disabled tools and are skipped.
+    """
+
+    return sorted(p.stem for p in TOOLS_DIR.glob("*.py") if not p.stem.startswith("_"))
+
+
+def _source_sha256(name: str) -> str | None:
+    try:
+        return hashlib.sha256((TOOLS_DIR / f"{name}.py").read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def _load_manifest() -> dict[str, dict[str, Any]]:
+    global _manifest
+    if _manifest is None:
+        try:
+            data = json.loads(TOOLS_MANIFEST_PATH.read_text(encoding="utf-8"))
+            _manifest = data.get("tools") or {}
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+def import_tool(name: str) -> FunctionTool | None:
+    """Import `src/tools/<name>.py` and return its tool (None if missing)."""
+
+    if _source_sha256(name) is None:
+        return None
+    mod = importlib.import_module(f"src.tools.{name}")
+    tool = getattr(mod, name, None)
+    return tool if isinstance(tool, FunctionTool) else None
+
+
+def _lazy_tool(name: str, entry: dict[str, Any]) -> FunctionTool:
+    real: FunctionTool | None = None
+
+    async def on_invoke_tool(ctx: Any, input: str) -> Any:
+        nonlocal real
+        if real is None:
+            real = import_tool(name)
+            if real is None:
+                raise RuntimeError(f"tool_not_found_in_src_tools tool={name}")
+        return await real.on_invoke_tool(ctx, input)
+
+    return FunctionTool(
+        name=name,
+        description=entry.get("description") or "",
+        params_json_schema=copy.deepcopy(entry["params_json_schema"]),
+        on_invoke_tool=on_invoke_tool,
+        strict_json_schema=bool(entry.get("strict_json_schema", True)),
+    )
+
+
+def get_tool(name: str) -> FunctionTool | None:
+    """Return the tool named `name` (one shared instance per name), or None."""
+
+    with _lock:
+        tool = _tools.get(name)
+        if tool is not None:
+            return tool
+
+        entry = _load_manifest().get(name)
+        if entry is not None and entry.get("source_sha256") == _source_sha256(name):
+            tool = _lazy_tool(name, entry)
+        else:
+            if entry is not None:
+                logger.log(f"tools.manifest_stale tool={name}")
+            tool = import_tool(name)
+        if tool is not None:
+            _tools[name] = tool
+        return tool
+
+
+def build_manifest(path: str | os.PathLike[str] = TOOLS_MANIFEST_PATH) -> dict[str, Any]:
+    """Import every tool and write its schema to the manifest."""
+
+    tools: dict[str, dict[str, Any]] = {}
+    for name in tool_names():
+        tool = import_tool(name)
+        if tool is None:
+            continue
+        tools[name] = {
+            "source_sha256": _source_sha256(name),
+            "description": tool.description,
+            "params_json_schema": tool.params_json_schema,
+            "strict_json_schema": tool.strict_json_schema,
+        }
+
+    data = {"tools": tools}
+    p = Path(path)
+    tmp = p.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp, p)
+    return data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tool registry maintenance.")
+    parser.add_argument("--build", action="store_true", help="Rebuild src/tools/manifest.json.")
+    args = parser.parse_args()
+    if args.build:
+        data = build_manifest()
+        print(f"{len(data['tools'])} tools -> {TOOLS_MANIFEST_PATH}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,16 @@
 from __future__ import annotations
 
-import pkgutil
 import importlib
+import pkgutil
+
+# Tool modules are imported on first attribute access (`from src.tools import
+# read_file`); agents load their tools through `src/tool_registry.py`.
+__all__ = [m.name for m in pkgutil.iter_modules(__path__)]
 
-__all__ = []
 
-for m in pkgutil.iter_modules(__path__):
-    name = m.name
-    mod = importlib.import_module(f"{__name__}.{name}")
-    fn = getattr(mod, name, None)
+def __getattr__(name: str):
+    if name not in __all__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    fn = getattr(importlib.import_module(f"{__name__}.{name}"), name, None)
     globals()[name] = fn
-    __all__.append(name)
+    return fn
@@ -0,0 +1,49 @@
+from agents import function_tool
+from src.blob_store import get_blob
+from src.logger import logged_tool
+
+
+@function_tool
+@logged_tool
+async def read_blob(
+    sha256: str,
+    offset: int = 0,
+    max_chars: int = 20000) -> dict:
+    """
+    Read the full text of a tool output that was truncated in the history.
+
+    Truncated outputs end with "[blob sha256=<hash> chars=<n>; ...]".
+
+    Args:
+        sha256 (str): The hash from the blob reference.
+        offset (int): Character offset to start from. Default 0.
+        max_chars (int): Maximum number of characters to return. Default 20000.
+
+    Returns:
+        dict: {
+            "success": bool,
+            "content": str | None,
+            "total_chars": int | None,
+            "truncated": bool,       # True if more text follows offset + max_chars
+            "error": str | None,
+        }
+    """
+    text = get_blob(sha256.strip().lower())
+    if text is None:
+        return {
+            "success": False,
+            "content": None,
+            "total_chars": None,
+            "truncated": False,
+            "error": f"Blob not found: {sha256}",
+        }
+
+    offset = max(0, offset)
+    end = offset + max(1, max_chars)
+    return {
+        "success": True,
+        "content": text[offset:end],
+        "total_chars": len(text),
+        "truncated": end < len(text),
+        "error": None,
+    }
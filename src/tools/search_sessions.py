@@ -0,0 +1,39 @@
+from agents import function_tool
+from src.logger import logged_tool
+from src.search_index import search
+
+
+@function_tool
+@logged_tool
+async def search_sessions(
+    query: str,
+    limit: int = 10,
+    session_id: str | None = None) -> dict:
+    """
+    Full-text search over past conversations (user/assistant messages) and session summaries.
+
+    Args:
+        query (str): Text to find (matched as a literal phrase; works for Chinese).
+        limit (int): Maximum number of results. Default 10.
+        session_id (str | None): Only search this session. Default None (all sessions).
+
+    Returns:
+        dict: {
+            "success": bool,
+            "query": str,
+            "results": [
+                {"session_id": str, "kind": "message" | "summary", "role": str | None,
+                 "created_at": int, "snippet": str, "score": float}
+            ],
+            "error": str | None,
+        }
+    """
+    if not query.strip():
+        return {"success": False, "query": query, "results": [], "error": "Empty query"}
+
+    return {
+        "success": True,
+        "query": query,
+        "results": search(query, limit=limit, session_id=session_id),
+        "error": None,
+    }
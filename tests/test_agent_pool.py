@@ -0,0 +1,54 @@
+# Test prebuilt agent bundle pool
+
+from pathlib import Path
+import asyncio
+import itertools
+import sys
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.agent_pool import AgentPool
+
+
+async def _filled(pool: AgentPool) -> None:
+    for _ in range(500):
+        if len(pool._ready) >= pool.size:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("pool not refilled")
+
+
+@pytest.mark.asyncio
+async def test_pool_hands_out_prebuilt_bundles_and_refills():
+    counter = itertools.count(1)
+    pool = AgentPool(lambda: next(counter), size=2)
+    pool.start()
+    await _filled(pool)
+
+    # Served from the pool, then topped up in the background.
+    assert pool.take() in (1, 2)
+    await _filled(pool)
+    assert next(counter) == 4
+
+    pool.clear()
+    await _filled(pool)
+    assert await pool.take_async() >= 5
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_expired_bundles_are_rebuilt_in_the_background():
+    counter = itertools.count(1)
+    pool = AgentPool(lambda: next(counter), size=1, max_age_s=0.05)
+    pool.start()
+    await _filled(pool)
+
+    # Idle past the max age: the refill loop has already replaced the bundle.
+    await asyncio.sleep(0.2)
+    ready = [bundle for _, bundle in pool._ready]
+    assert len(ready) == 1 and ready[0] > 1
+    assert pool.take() == ready[0]
+    await pool.stop()
@@ -0,0 +1,64 @@
+# Test content-addressed blob store for large tool outputs
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import blob_store
+from src.jsonl_session import JsonlSession
+from src.session_cache import item_cache
+from src.tools.read_blob import read_blob
+
+
+@pytest.fixture(autouse=True)
+def _blobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "BLOBS_DIR", tmp_path / "blobs")
+    item_cache.clear()
+    yield
+
+
+def _output_item(text: str) -> dict:
+    return {"type": "function_call_output", "call_id": "c1", "output": text}
+
+
+def test_offload_and_get_blob_roundtrip(tmp_path):
+    big = "x" * (blob_store.BLOB_THRESHOLD_CHARS + 1)
+    small = _output_item("short")
+    assert blob_store.offload_item(small) is small
+
+    out = blob_store.offload_item(_output_item(big))
+    assert len(out["output"]) < blob_store.BLOB_PREVIEW_CHARS + 200
+    sha, chars = blob_store.blob_ref(out["output"])
+    assert chars == len(big)
+
+    # Already offloaded items are left alone; same content is stored once.
+    assert blob_store.offload_item(out) is out
+    assert blob_store.put_blob(big) == sha
+    assert len(list((tmp_path / "blobs").rglob("*"))) == 2  # <aa>/ and the blob
+
+    assert blob_store.get_blob(sha) == big
+
+
+@pytest.mark.asyncio
+async def test_session_stores_reference_and_read_blob_tool(tmp_path):
+    path = tmp_path / "s.jsonl"
+    s = JsonlSession("s", path, durability="os")
+    big = "line\n" * 4000
+
+    await s.add_items([{"role": "user", "content": "hi"}, _output_item(big)])
+    await s.flush()
+
+    assert path.stat().st_size < len(big)
+    stored = (await s.get_items())[-1]
+    sha, _ = blob_store.blob_ref(stored["output"])
+
+    res = await read_blob.on_invoke_tool(None, json.dumps({"sha256": sha, "offset": 5, "max_chars": 10}))  # type: ignore
+    assert res["success"] and res["content"] == big[5:15] and res["truncated"]
+
+    res = await read_blob.on_invoke_tool(None, json.dumps({"sha256": "0" * 64}))  # type: ignore
+    assert not res["success"]
@@ -0,0 +1,97 @@
+# Test token-budgeted session window
+
+from pathlib import Path
+import sys
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import budget_session, jsonl_session
+from src.budget_session import BudgetedSession, estimate_tokens, select_window
+from src.jsonl_session import JsonlSession
+from src.session_segments import load_manifest, seal_active
+from src.sqlite_session import SqliteSession
+
+
+def _turn(i: int) -> list[dict]:
+    return [
+        {"role": "user", "content": f"question {i}"},
+        {"type": "function_call", "call_id": f"c{i}", "name": "grep", "arguments": "{}"},
+        {"type": "function_call_output", "call_id": f"c{i}", "output": "x" * 400},
+        {"role": "assistant", "content": f"answer {i}"},
+    ]
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    ascii_item = {"role": "user", "content": "a" * 400}
+    cjk_item = {"role": "user", "content": "好" * 400}
+    assert estimate_tokens(cjk_item) > 3 * estimate_tokens(ascii_item)
+
+
+def test_select_window_never_splits_tool_calls():
+    items = _turn(0) + _turn(1) + _turn(2)
+    tokens = [estimate_tokens(it) for it in items]
+    turn_tokens = sum(tokens[:4])
+
+    start = select_window(items, tokens, turn_tokens * 2 + 10)
+    assert start == 4
+    assert items[start]["role"] == "user"
+
+    # Budget below a single turn: keep the newest turn whole.
+    assert select_window(items, tokens, 10) == 8
+
+
+@pytest.mark.asyncio
+async def test_budgeted_session_returns_recent_turns(tmp_path: Path):
+    inner = JsonlSession("t", path=tmp_path / "s.jsonl")
+    for i in range(10):
+        await inner.add_items(_turn(i))
+
+    one_turn = sum(estimate_tokens(it) for it in _turn(9))
+    session = BudgetedSession(inner, one_turn * 3)
+    items = await session.get_items()
+
+    assert items[0] == {"role": "user", "content": "question 7"}
+    assert items[-1] == {"role": "assistant", "content": "answer 9"}
+    assert len(await inner.get_items()) == 40
+
+
+@pytest.mark.asyncio
+async def test_budgeted_session_does_not_open_old_segments(tmp_path: Path, monkeypatch):
+    path = tmp_path / "s.jsonl"
+    inner = JsonlSession("t", path=path, durability="os")
+    for i in range(10):
+        await inner.add_items(_turn(i))
+        await inner.flush()
+        seal_active(path)  # One segment per turn.
+    await inner.add_items(_turn(10))
+    await inner.flush()
+
+    opened: list[str] = []
+    real_read_segment = jsonl_session.read_segment_with_tokens
+    monkeypatch.setattr(
+        jsonl_session,
+        "read_segment_with_tokens",
+        lambda p, seg_id, est: opened.append(seg_id) or real_read_segment(p, seg_id, est),
+    )
+
+    one_turn = sum(estimate_tokens(it) for it in _turn(9))
+    items = await BudgetedSession(inner, one_turn * 3 + 10).get_items()
+    assert items[0] == {"role": "user", "content": "question 8"}
+    assert items[-1] == {"role": "assistant", "content": "answer 10"}
+    # Turns 10 (active), 9 and 8 fit; turn 7 only closes the window.
+    assert opened == [s["id"] for s in load_manifest(path)][::-1][:3]
+
+
+@pytest.mark.asyncio
+async def test_budgeted_sqlite_session_reads_batches_backwards(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(budget_session, "_SQLITE_TAIL_BATCH", 4)
+    inner = SqliteSession("1", db_path=tmp_path / "sessions.db")
+    for i in range(10):
+        await inner.add_items(_turn(i))
+
+    one_turn = sum(estimate_tokens(it) for it in _turn(9))
+    items = await BudgetedSession(inner, one_turn * 3).get_items()
+    assert items[0] == {"role": "user", "content": "question 7"} and len(items) == 12
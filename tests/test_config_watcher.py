@@ -0,0 +1,52 @@
+# Test config watcher and in-place settings reload
+
+from pathlib import Path
+import json
+import os
+import sys
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import settings as settings_mod
+from src.config_watcher import ConfigWatcher
+
+
+def _write(p: Path, text: str) -> None:
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_text(text, encoding="utf-8")
+    # Distinct mtime even on coarse-grained filesystems.
+    st = p.stat()
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_watcher_reports_changed_config_files(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write(Path("data/setting.json"), "{}")
+    _write(Path("agents/agent.md"), "main")
+    _write(Path("agents/sub_agents/dev/agent.md"), "dev")
+
+    seen: list[list[Path]] = []
+    watcher = ConfigWatcher(seen.append)
+    assert watcher.check() == [] and seen == []
+
+    _write(Path("agents/sub_agents/dev/agent.md"), "dev v2")
+    _write(Path("agents/sub_agents/new/agent.json"), "{}")
+    _write(Path("agents/sub_agents/dev/notes.md"), "not a config file")
+    assert watcher.check() == [Path("agents/sub_agents/dev/agent.md"), Path("agents/sub_agents/new/agent.json")]
+    assert len(seen) == 1 and watcher.check() == []
+
+
+def test_reload_settings_updates_the_shared_object(tmp_path: Path, monkeypatch):
+    s = settings_mod.settings
+    for name in ("name", "prompt_layout", "session_backend"):
+        monkeypatch.setattr(s, name, getattr(s, name))
+
+    path = tmp_path / "setting.json"
+    path.write_text(json.dumps({"name": "Renamed", "prompt_layout": s.prompt_layout, "session_backend": "other"}), encoding="utf-8")
+    changed = settings_mod.reload_settings(str(path))
+
+    assert "name" in changed and "prompt_layout" not in changed
+    assert s.name == "Renamed"
+    # Restart-only.
+    assert "session_backend" not in changed and s.session_backend != "other"
@@ -0,0 +1,71 @@
+# Test filesystem watcher and sessions index coherence
+
+from pathlib import Path
+import sys
+import time
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import sessions_index as si
+from src.fs_watcher import FileEvent, FsWatcher
+
+
+def _wait_for(pred, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pred():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.mark.parametrize("backend", ["inotify", "poll"])
+def test_watcher_reports_created_modified_deleted(tmp_path: Path, backend: str):
+    if backend == "inotify" and not sys.platform.startswith("linux"):
+        pytest.skip("inotify is Linux-only")
+
+    events: list[FileEvent] = []
+    w = FsWatcher(tmp_path, backend=backend, poll_interval_s=0.05, coalesce_s=0.05)
+    w.subscribe(events.append)
+    w.start()
+    try:
+        p = tmp_path / "segments" / "1" / "a.jsonl"
+        p.parent.mkdir(parents=True)
+        p.write_text("x\n", encoding="utf-8")
+        assert _wait_for(lambda: FileEvent("created", p) in events)
+
+        for _ in range(20):
+            with p.open("a", encoding="utf-8") as f:
+                f.write("y\n")
+        assert _wait_for(lambda: FileEvent("modified", p) in events)
+        # Bursts are coalesced.
+        assert sum(1 for e in events if e.path == p) < 10
+
+        p.unlink()
+        assert _wait_for(lambda: FileEvent("deleted", p) in events)
+    finally:
+        w.stop()
+
+
+def test_fs_events_update_sessions_index(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(si, "SESSIONS_DIR", tmp_path)
+    idx = si.SessionsIndex(tmp_path / "index.json")
+    monkeypatch.setattr(si, "sessions_index", idx)
+    assert si.load_sessions_index()["sessions"] == []
+
+    # Written by another process (e.g. the CLI).
+    p = tmp_path / "42.jsonl"
+    p.write_text('{"role": "user", "content": "hello"}\n', encoding="utf-8")
+    si.handle_fs_event(FileEvent("created", p))
+    assert si.load_sessions_index()["sessions"][0]["title"] == "hello"
+
+    si.handle_fs_event(FileEvent("modified", tmp_path / "segments" / "42" / "manifest.json"))
+    si.handle_fs_event(FileEvent("modified", tmp_path / "index.json"))
+    assert si.list_session_ids() == ["42"]
+
+    p.unlink()
+    si.handle_fs_event(FileEvent("deleted", p))
+    assert si.load_sessions_index() == {"sessions": [], "active_session_id": None}
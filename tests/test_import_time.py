@@ -0,0 +1,42 @@
+# Test web backend import-time budget (python -X importtime)
+
+from pathlib import Path
+import os
+import subprocess
+import sys
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# Cumulative import time of web.backend.app, seconds (override for slow machines).
+BACKEND_IMPORT_BUDGET_S = float(os.getenv("BACKEND_IMPORT_BUDGET_S", "5.0"))
+# Only imported on the first voice_input / voice_output_toggle.
+VOICE_MODULES = {"src.stt", "src.tts", "faster_whisper", "ctranslate2"}
+
+
+def _importtime(module: str) -> dict[str, int]:
+    """Return {module: cumulative import time in us} for a fresh interpreter."""
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if cumulative_us.strip().isdigit():
+            times[name.strip()] = int(cumulative_us)
+    return times
+
+
+def test_backend_import_skips_voice_stack_and_fits_budget():
+    times = _importtime("web.backend.app")
+
+    assert not VOICE_MODULES & times.keys()
+    assert times["web.backend.app"] / 1e6 < BACKEND_IMPORT_BUDGET_S, times["web.backend.app"]
@@ -0,0 +1,110 @@
+# Test persistent job queue
+
+from pathlib import Path
+import asyncio
+import json
+import sys
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import job_queue as jq
+
+
+async def _wait_for(pred, timeout: float = 5.0) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not pred():
+        assert loop.time() < deadline, "timeout"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_jobs_retry_with_backoff_and_concurrency_limit(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(jq, "JOB_BACKOFF_BASE_S", 0.01)
+    monkeypatch.setattr(jq, "JOB_MAX_ATTEMPTS", 3)
+
+    q = jq.JobQueue(tmp_path, concurrency=2)
+    running = peak = 0
+    calls: dict[str, int] = {}
+
+    async def handler(payload: dict) -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        calls[payload["n"]] = calls.get(payload["n"], 0) + 1
+        if payload["n"] == "flaky" and calls["flaky"] < 2:
+            raise RuntimeError("try again")
+        if payload["n"] == "broken":
+            raise RuntimeError("always")
+
+    q.register("t", handler)
+    await q.start()
+    for n in ["a", "b", "c", "flaky", "broken"]:
+        q.submit("t", {"n": n})
+
+    await _wait_for(lambda: [j["state"] for j in q.list_jobs()] == ["failed"])
+    await q.stop()
+
+    assert calls == {"a": 1, "b": 1, "c": 1, "flaky": 2, "broken": 3}
+    assert peak == 2
+    # Finished jobs leave no journal; failed ones are kept.
+    [left] = list(tmp_path.glob("*.json"))
+    assert json.loads(left.read_text(encoding="utf-8"))["last_error"] == "RuntimeError('always')"
+
+
+@pytest.mark.asyncio
+async def test_jobs_resume_from_journal_and_bound(tmp_path: Path):
+    q1 = jq.JobQueue(tmp_path, max_jobs=2)
+    job = q1.submit("t", {"n": 1})
+    q1.submit("t", {"n": 2})
+    with pytest.raises(jq.JobQueueFull):
+        q1.submit("t", {"n": 3})
+
+    # Simulate a crash mid-run.
+    data = json.loads((tmp_path / f"{job.id}.json").read_text(encoding="utf-8"))
+    (tmp_path / f"{job.id}.json").write_text(json.dumps({**data, "state": "running"}), encoding="utf-8")
+
+    seen: list[int] = []
+
+    async def handler(payload: dict) -> None:
+        seen.append(payload["n"])
+
+    q2 = jq.JobQueue(tmp_path)
+    q2.register("t", handler)
+    await q2.start()
+    await _wait_for(lambda: len(seen) == 2)
+    await q2.stop()
+    assert sorted(seen) == [1, 2] and q2.list_jobs() == []
+
+
+def test_archive_idle_sessions_queues_old_inactive_sessions(tmp_path: Path, monkeypatch):
+    from src import session_archive, sessions_index as si
+
+    monkeypatch.setattr(si, "SESSIONS_DIR", tmp_path)
+    idx = si.SessionsIndex(tmp_path / "index.json")
+    for sid in ("1000", "2000", "3000"):
+        (tmp_path / f"{sid}.jsonl").write_text("", encoding="utf-8")
+        idx.note_created(sid)
+    idx.set_active("1000")
+    idx._sessions["2000"]["last_activity"] = 0
+    idx._sessions["3000"]["last_activity"] = 10**13  # far future
+
+    q = jq.JobQueue(tmp_path / "jobs")
+    monkeypatch.setattr(session_archive, "sessions_index", idx)
+    monkeypatch.setattr(session_archive, "job_queue", q)
+
+    assert session_archive.archive_idle_sessions(days=30) == {"ok": True, "queued": ["2000"]}
+    assert [(j["type"], j["payload"]) for j in q.list_jobs()] == [("archive_session", {"session_id": "2000"})]
+
+    # A second sweep does not queue the still-pending job again.
+    assert session_archive.archive_idle_sessions(days=30) == {"ok": True, "queued": []}
+    assert len(q.list_jobs()) == 1
+
+    # A full queue ends the sweep without raising.
+    monkeypatch.setattr(session_archive, "job_queue", jq.JobQueue(tmp_path / "jobs2", max_jobs=0))
+    assert session_archive.archive_idle_sessions(days=30) == {"ok": True, "queued": []}
@@ -0,0 +1,259 @@
+# Test JsonlSession store
+
+from pathlib import Path
+import asyncio
+import json
+import sys
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.jsonl_index import CHAT_KINDS, KIND_ASSISTANT, KIND_FUNCTION_CALL, KIND_FUNCTION_CALL_OUTPUT, KIND_USER, drop_index, get_index, index_path_for
+from src.jsonl_session import JsonlSession, iter_lines_reversed, recover_truncation
+from src import jsonl_session, session_segments
+from src.session_cache import ItemCache
+from src.session_writer import Durability, parse_durability
+
+
+@pytest.mark.asyncio
+async def test_get_items_limit_reads_tail(tmp_path: Path):
+    session = JsonlSession("t", path=tmp_path / "s.jsonl")
+    await session.add_items([{"role": "user", "content": f"msg {i}"} for i in range(50)])
+
+    items = await session.get_items(limit=3)
+    assert [it["content"] for it in items] == ["msg 47", "msg 48", "msg 49"]
+    assert len(await session.get_items()) == 50
+
+
+@pytest.mark.asyncio
+async def test_get_items_limit_skips_truncated_last_line(tmp_path: Path):
+    p = tmp_path / "s.jsonl"
+    session = JsonlSession("t", path=p)
+    await session.add_items([{"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}])
+    with p.open("ab") as f:
+        f.write(b'{"role": "user", "cont')
+
+    items = await session.get_items(limit=2)
+    assert [it["content"] for it in items] == ["a", "b"]
+
+
+def test_iter_lines_reversed_handles_multibyte_chunk_boundaries(tmp_path: Path):
+    p = tmp_path / "s.jsonl"
+    lines = [json.dumps({"content": "你好，世界" * (i + 1)}, ensure_ascii=False) for i in range(20)]
+    p.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    # A tiny odd chunk size forces splits inside multi-byte characters.
+    with p.open("rb") as f:
+        got = [ln.decode("utf-8") for ln in iter_lines_reversed(f, chunk_size=7) if ln]
+    assert got == list(reversed(lines))
+
+
+@pytest.mark.asyncio
+async def test_offset_index_tracks_appends_and_rebuilds_when_stale(tmp_path: Path):
+    p = tmp_path / "s.jsonl"
+    session = JsonlSession("t", path=p)
+    await session.add_items([{"role": "user", "content": "q"}, {"type": "function_call", "name": "grep"}])
+    await session.add_items([{"type": "function_call_output", "output": "x"}, {"role": "assistant", "content": "a"}])
+
+    idx = get_index(p)
+    assert list(idx.kinds) == [KIND_USER, KIND_FUNCTION_CALL, KIND_FUNCTION_CALL_OUTPUT, KIND_ASSISTANT]
+    assert idx.read_at(idx.last_positions(CHAT_KINDS, 2)) == [
+        {"role": "user", "content": "q"},
+        {"role": "assistant", "content": "a"},
+    ]
+
+    # An external append (e.g. another process) makes the index stale.
+    with p.open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"role": "user", "content": "later"}) + "\n")
+    idx = get_index(p)
+    assert len(idx) == 5
+    assert idx.read_range(4) == [{"role": "user", "content": "later"}]
+
+    # A missing index file is rebuilt from the JSONL.
+    drop_index(p)
+    assert not index_path_for(p).exists()
+    assert len(get_index(p)) == 5
+    assert index_path_for(p).exists()
+
+
+@pytest.mark.asyncio
+async def test_clear_session_resets_index(tmp_path: Path):
+    p = tmp_path / "s.jsonl"
+    session = JsonlSession("t", path=p)
+    await session.add_items([{"role": "user", "content": "q"}])
+    await session.clear_session()
+
+    assert await session.get_items(limit=5) == []
+    await session.add_items([{"role": "user", "content": "new"}])
+    assert await session.get_items(limit=5) == [{"role": "user", "content": "new"}]
+
+
+@pytest.mark.asyncio
+async def test_group_commit_writer_durability_modes(tmp_path: Path):
+    for durability in ("always", "batched(50)", "os"):
+        p = tmp_path / f"{durability}.jsonl"
+        session = JsonlSession("t", path=p, durability=durability)
+
+        # Concurrent batches are written in order and visible once add_items returns.
+        await asyncio.gather(*(session.add_items([{"role": "user", "content": str(i)}]) for i in range(20)))
+        assert sorted(int(it["content"]) for it in await session.get_items()) == list(range(20))
+
+        stats = await session.flush()
+        assert stats["items"] == 20
+        assert stats["groups"] <= 20
+        if durability == "os":
+            assert stats["fsyncs"] == 0
+        else:
+            assert stats["fsyncs"] >= 1
+
+
+def test_parse_durability():
+    assert parse_durability("always") == Durability("always")
+    assert parse_durability("batched(25)") == Durability("batched", 25)
+    with pytest.raises(ValueError):
+        parse_durability("sometimes")
+
+
+@pytest.mark.asyncio
+async def test_item_cache_parses_only_appended_bytes(tmp_path: Path):
+    cache = ItemCache()
+    p = tmp_path / "s.jsonl"
+    p.write_text(json.dumps({"role": "user", "content": "a"}) + "\n", encoding="utf-8")
+
+    assert [it["content"] for it in cache.get(p)] == ["a"]
+    assert [it["content"] for it in cache.get(p)] == ["a"]
+
+    # Append plus a partial line: only complete lines are consumed.
+    with p.open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"role": "assistant", "content": "b"}) + "\n" + '{"role": "us')
+    assert [it["content"] for it in cache.get(p)] == ["a", "b"]
+    with p.open("a", encoding="utf-8") as f:
+        f.write('er", "content": "c"}\n')
+    assert [it["content"] for it in cache.get(p)] == ["a", "b", "c"]
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["partial_hits"], stats["misses"]) == (1, 2, 1)
+
+    # Replacing the file (new inode) triggers a full re-parse.
+    tmp = tmp_path / "s.tmp"
+    tmp.write_text(json.dumps({"role": "user", "content": "z"}) + "\n", encoding="utf-8")
+    tmp.replace(p)
+    assert [it["content"] for it in cache.get(p)] == ["z"]
+
+
+def test_item_cache_evicts_lru_by_bytes(tmp_path: Path):
+    cache = ItemCache(max_bytes=100)
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"{i}.jsonl"
+        p.write_text(json.dumps({"content": "x" * 40}) + "\n", encoding="utf-8")
+        paths.append(p)
+        cache.get(p)
+
+    assert cache.get(paths[0], only_cached=True) is None
+    assert cache.get(paths[2], only_cached=True) is not None
+    assert cache.stats()["bytes"] <= 100
+
+
+@pytest.mark.asyncio
+async def test_segments_seal_compress_and_read_across(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(session_segments, "SEGMENT_MAX_BYTES", 200)
+    p = tmp_path / "s.jsonl"
+    session = JsonlSession("t", path=p, durability="os")
+    for i in range(30):
+        await session.add_items([{"role": "user", "content": f"message {i:02d}"}])
+
+    segs = session_segments.load_manifest(p)
+    assert len(segs) > 1
+    assert sum(s["items"] for s in segs) + len(get_index(p)) == 30
+
+    for seg in segs:
+        session_segments.compact_segment(p, seg["id"])
+    assert all(session_segments.segment_file(p, s["id"]).suffix == ".gz" for s in segs)
+
+    all_items = await session.get_items()
+    assert [it["content"] for it in all_items] == [f"message {i:02d}" for i in range(30)]
+    tail = await session.get_items(limit=len(get_index(p)) + 2)
+    assert [it["content"] for it in tail] == [it["content"] for it in all_items[-len(tail):]]
+
+    await session.clear_session()
+    assert await session.get_items() == []
+    assert not session_segments.segments_dir_for(p).exists()
+
+
+@pytest.mark.asyncio
+async def test_reads_racing_a_seal_see_each_item_once(tmp_path: Path, monkeypatch):
+    p = tmp_path / "s.jsonl"
+    session = JsonlSession("t", path=p, durability="os")
+    await session.add_items([{"role": "user", "content": str(i)} for i in range(4)])
+    await session.flush()
+
+    real_read_active = jsonl_session._read_active_items
+
+    def racing(path, limit=None):
+        items = real_read_active(path, limit)
+        if not session_segments.load_manifest(p):
+            # Lands between the active read and the manifest read.
+            session_segments.seal_active(p)
+        return items
+
+    monkeypatch.setattr(jsonl_session, "_read_active_items", racing)
+    assert [it["content"] for it in await session.get_items()] == ["0", "1", "2", "3"]
+    assert jsonl_session.item_count(p) == 4
+
+    # A sealed segment that vanished is an error, not an empty history.
+    session_segments.compact_session(p)
+    seg = session_segments.load_manifest(p)[0]
+    session_segments.segment_file(p, seg["id"]).unlink()
+    with pytest.raises(FileNotFoundError):
+        await session.get_items()
+
+
+@pytest.mark.asyncio
+async def test_pop_item_and_truncate_to(tmp_path: Path):
+    p = tmp_path / "s.jsonl"
+    session = JsonlSession("t", path=p)
+    await session.add_items([{"role": "user", "content": str(i)} for i in range(5)])
+    await session.get_items()  # Warm the shared cache so it gets trimmed, not re-parsed.
+
+    assert await session.pop_item() == {"role": "user", "content": "4"}
+    assert [it["content"] for it in await session.get_items()] == ["0", "1", "2", "3"]
+
+    await session.truncate_to(2)
+    assert [it["content"] for it in await session.get_items()] == ["0", "1"]
+    assert len(get_index(p)) == 2
+
+    await session.add_items([{"role": "assistant", "content": "x"}])
+    assert [it["content"] for it in await session.get_items(limit=2)] == ["1", "x"]
+
+    await session.truncate_to(0)
+    assert await session.pop_item() is None
+
+
+@pytest.mark.asyncio
+async def test_truncate_to_reaches_into_sealed_segments(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(session_segments, "SEGMENT_MAX_BYTES", 120)
+    p = tmp_path / "s.jsonl"
+    session = JsonlSession("t", path=p, durability="os")
+    for i in range(12):
+        await session.add_items([{"role": "user", "content": f"m{i:02d}"}])
+    assert session_segments.load_manifest(p)
+
+    await session.truncate_to(3)
+    assert [it["content"] for it in await session.get_items()] == ["m00", "m01", "m02"]
+
+
+def test_recover_truncation_finishes_interrupted_cut(tmp_path: Path):
+    p = tmp_path / "s.jsonl"
+    lines = [json.dumps({"content": str(i)}) + "\n" for i in range(3)]
+    p.write_text("".join(lines), encoding="utf-8")
+    # Simulate a crash after the journal was written but before ftruncate.
+    size = len(lines[0].encode("utf-8"))
+    (tmp_path / "s.jsonl.journal").write_text(json.dumps({"size": size, "items": 1}), encoding="utf-8")
+
+    assert recover_truncation(p) is True
+    assert p.read_text(encoding="utf-8") == lines[0]
+    assert len(get_index(p)) == 1
+    assert not (tmp_path / "s.jsonl.journal").exists()
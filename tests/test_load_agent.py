@@ -0,0 +1,106 @@
+# Test compiled prompt templates and the mtime-invalidated file cache
+
+from pathlib import Path
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import load_agent as la
+
+
+@pytest.fixture
+def agent_dir(tmp_path: Path, monkeypatch) -> Path:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(la, "_file_cache", {})
+    (tmp_path / "data" / "session_summaries").mkdir(parents=True)
+    (tmp_path / "agents" / "sub_agents" / "recorder").mkdir(parents=True)
+    return tmp_path
+
+
+def _touch(p: Path, text: str) -> None:
+    p.write_text(text, encoding="utf-8")
+    # Distinct mtime even on coarse-grained filesystems.
+    st = p.stat()
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_compile_template_keeps_unknown_placeholders():
+    parts = la.compile_template("Hi <NAME>, <UNKNOWN> at <CURRENT_DATETIME>.")
+    assert parts == [f"Hi {la.settings.name}, <UNKNOWN> at ", "CURRENT_DATETIME", "."]
+    assert la.render_prompt(["a", "CURRENT_MOOD", "b"], layout="inline")[0].startswith("aValence:")
+
+
+def test_placeholders_inside_settings_are_filled(monkeypatch):
+    # data/setting.json's default_prompt holds <CURRENT_DATETIME>.
+    monkeypatch.setattr(la.settings, "default_prompt", ["现在是<CURRENT_DATETIME>", "我是<NAME>"])
+    root = Path(__file__).resolve().parents[1]
+    template = la.compile_template((root / "agents" / "agent.md").read_text(encoding="utf-8"))
+    text = la.render_prompt(template, layout="inline", values={"PREVIOUS_CONV_SUMMARY": ""})[0]
+    assert "<CURRENT_DATETIME>" not in text and "<NAME>" not in text
+    assert f"我是{la.settings.name}" in text
+
+
+def test_file_derived_slots_are_cached_until_files_change(agent_dir: Path, monkeypatch):
+    monkeypatch.setattr(la.settings, "prompt_layout", "inline")
+    summaries = agent_dir / "data" / "session_summaries"
+    _touch(summaries / "1.md", "first")
+    recorder = agent_dir / "agents" / "sub_agents" / "recorder"
+    _touch(recorder / "diary.md", "---\ntitle: Diary\nabstract: daily notes\n---\nbody")
+
+    template = la.compile_template("<PREVIOUS_CONV_SUMMARY>|<RECORDER_MD_FILES>")
+    assert la.render_template(template) == "first\n|Diary: daily notes\n"
+
+    # Cache hit: no file is opened again.
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda *a, **k: (_ for _ in ()).throw(AssertionError("reread")))
+    assert la.render_template(template) == "first\n|Diary: daily notes\n"
+    monkeypatch.setattr("builtins.open", real_open)
+
+    _touch(summaries / "2.md", "second")
+    _touch(summaries / "1.md", "FIRST")
+    _touch(recorder / "diary.md", "---\ntitle: Diary\nabstract: edited\n---\nbody")
+    assert la.render_template(template) == "FIRST\nsecond\n|Diary: edited\n"
+
+
+def test_stable_prefix_layout_moves_volatile_values_to_the_end(monkeypatch):
+    monkeypatch.setattr(la.settings, "default_prompt", ["Now is <CURRENT_DATETIME>."])
+    template = la.compile_template("I am <NAME>.\n<DEFAULT_PROMPT>\nMood: <CURRENT_MOOD>")
+
+    inline, inline_prefix = la.render_prompt(template, layout="inline")
+    assert "<CURRENT_DATETIME>" not in inline and inline_prefix == len(f"I am {la.settings.name}.\nNow is ")
+
+    first, prefix = la.render_prompt(template, layout="stable_prefix")
+    second, prefix2 = la.render_prompt(template, layout="stable_prefix")
+    assert prefix == prefix2 and first[:prefix] == second[:prefix]
+    assert first[:prefix].startswith(f"I am {la.settings.name}.\nNow is <CURRENT_DATETIME>.\nMood: <CURRENT_MOOD>")
+    tail = first[prefix:]
+    assert tail.startswith("<CURRENT_MOOD>:\nValence:") and "\n<CURRENT_DATETIME>:\n" in tail
+
+
+def test_previous_summary_slot_is_recalled_for_the_first_message(agent_dir: Path, monkeypatch):
+    monkeypatch.setattr(la.settings, "prompt_layout", "inline")
+    monkeypatch.setattr(la.settings, "recall_token_budget", 50)
+    hits = [
+        {"session_id": "3", "kind": "summary", "created_at": 0, "text": "long " * 200},
+        {"session_id": "2026/01/2026.01.04.md", "kind": "diary", "created_at": 0, "text": "- 发动机故障灯亮了"},
+    ]
+    queries: list[str] = []
+    monkeypatch.setattr(la.search_index, "recall", lambda q, k: queries.append(q) or hits)
+    _touch(agent_dir / "agents" / "agent.md", "Notes:\n<PREVIOUS_CONV_SUMMARY>\nMood: <CURRENT_MOOD>")
+
+    instructions = la.agent_instructions("Tennisbot", "agents/agent.md")
+
+    async def run(query: str) -> str:
+        la.recall_query.set(query)
+        return await instructions(None, None)
+
+    first = asyncio.run(run("车又坏了"))
+    # Best hit over the token budget: skipped, the next one fits.
+    assert first.startswith("Notes:\n[diary 2026.01.04]\n- 发动机故障灯亮了\nMood: Valence:")
+    # Kept for the agent's lifetime: stable prompt, no new lookup.
+    assert asyncio.run(run("另一个话题")) == first and queries == ["车又坏了"]
@@ -0,0 +1,116 @@
+# Test full-text search index
+
+from pathlib import Path
+import sys
+import time
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import jsonl_session, search_index as si
+from src.jsonl_session import JsonlSession
+
+
+@pytest.fixture
+def index(tmp_path: Path, monkeypatch) -> si.SearchIndex:
+    monkeypatch.setattr(si, "SESSIONS_DIR", tmp_path / "sessions")
+    monkeypatch.setattr(si, "SUMMARIES_DIR", tmp_path / "summaries")
+    monkeypatch.setattr(si, "DIARY_DIR", tmp_path / "diary")
+    (tmp_path / "sessions").mkdir()
+    (tmp_path / "summaries").mkdir()
+    idx = si.SearchIndex(tmp_path / "search.db")
+    monkeypatch.setattr(si, "search_index", idx)
+    monkeypatch.setattr(jsonl_session, "append_listeners", [])
+    return idx
+
+
+@pytest.mark.asyncio
+async def test_backfill_then_incremental_feed(index: si.SearchIndex, tmp_path: Path):
+    old = JsonlSession("1", path=tmp_path / "sessions" / "1.jsonl", durability="os")
+    await old.add_items([{"role": "user", "content": "帮我整理一下论文的引用格式"}, {"type": "function_call", "name": "grep"}])
+    await old.flush()
+    (tmp_path / "summaries" / "1.md").write_text("讨论了 BibTeX citation style", encoding="utf-8")
+
+    si.start_indexer()
+    assert index.wait_idle()
+    assert [r["session_id"] for r in si.search("论文的引用")] == ["1"]
+    assert si.search("bibtex")[0]["kind"] == "summary"
+
+    # Fed from add_items, no rescan.
+    await old.add_items([{"role": "assistant", "content": [{"type": "output_text", "text": "好的，用 APA 格式"}]}])
+    assert index.wait_idle()
+    hits = si.search("APA 格式")
+    assert hits and hits[0]["role"] == "assistant" and "[APA 格式]" in hits[0]["snippet"]
+
+    assert si.search("论") and si.search("不存在的内容") == []
+    assert si.search("引用", session_id="2") == []
+
+
+def test_recall_ranks_summaries_and_diary_groups(index: si.SearchIndex, tmp_path: Path):
+    (tmp_path / "summaries" / "1.md").write_text("讨论了论文引用格式，决定用 BibTeX", encoding="utf-8")
+    (tmp_path / "summaries" / "2.md").write_text("聊了周末去 Elk Island 徒步的路线", encoding="utf-8")
+    day = tmp_path / "diary" / "2026" / "01" / "2026.01.04.md"
+    day.parent.mkdir(parents=True)
+    day.write_text("- 上午取件。\n\n- 发动机故障灯亮了，又花了约 500 刀修车。\n", encoding="utf-8")
+
+    index.start()
+    index.queue_backfill()
+    assert index.wait_idle()
+
+    hits = index.recall("我的车发动机又出问题了")
+    assert hits[0]["kind"] == "diary" and hits[0]["session_id"] == "2026/01/2026.01.04.md"
+    assert hits[0]["text"] == "- 发动机故障灯亮了，又花了约 500 刀修车。"
+    assert [h["session_id"] for h in index.recall("周末想去徒步")] == ["2"]
+    assert index.recall("完全无关的话题") == [] and si.search("发动机") == []
+
+    # Picked up by the next refresh: edits, new files, deletions.
+    day.unlink()
+    (day.parent / "2026.01.05.md").write_text("- 去 Elk Island 徒步，看到了野牛。", encoding="utf-8")
+    index.refresh_notes()
+    assert index.wait_idle()
+    assert index.recall("发动机故障") == []
+    assert sorted(h["kind"] for h in index.recall("又去徒步了")) == ["diary", "summary"]
+
+
+@pytest.mark.asyncio
+async def test_queued_appends_index_each_message_once(index: si.SearchIndex, tmp_path: Path):
+    session = JsonlSession("1", path=tmp_path / "sessions" / "1.jsonl", durability="os")
+    jsonl_session.append_listeners.append(si._on_items_added)
+    # All appends are on disk before the indexer sees the first job.
+    for n in range(3):
+        await session.add_items([{"role": "user", "content": f"第{n}条消息 kiwi"}])
+    await session.flush()
+    si.start_indexer()
+    assert index.wait_idle()
+    assert _message_rows(index) == 3
+
+    await session.add_items([{"role": "assistant", "content": "又一条 kiwi"}])
+    assert index.wait_idle()
+    assert _message_rows(index) == 4
+    assert len(si.search("kiwi", limit=10)) == 4
+
+
+def _message_rows(index: si.SearchIndex) -> int:
+    con = si._connect(index.db_path)
+    try:
+        return con.execute("SELECT count(*) FROM docs WHERE kind = 'message'").fetchone()[0]
+    finally:
+        con.close()
+
+
+def test_diary_watcher_indexes_new_entries(index: si.SearchIndex, tmp_path: Path):
+    index.start()
+    watcher = si.watch_diary()
+    try:
+        day = tmp_path / "diary" / "2026" / "02" / "2026.02.01.md"
+        day.parent.mkdir(parents=True)
+        day.write_text("- 给网球拍换了新的线。", encoding="utf-8")
+
+        deadline = time.monotonic() + 5
+        while not index.recall("网球拍换线") and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert [h["session_id"] for h in index.recall("网球拍换线")] == ["2026/02/2026.02.01.md"]
+    finally:
+        watcher.stop()
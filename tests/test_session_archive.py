@@ -0,0 +1,178 @@
+# Test session archiving: map-reduce summaries and cold-storage packs
+
+from pathlib import Path
+import asyncio
+import json
+import sys
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import archive_pack
+from src import session_archive as sa
+from src import sessions_index as si
+from src.job_queue import JobQueue
+from src.jsonl_session import read_items
+from src.session_segments import compact_session, seal_active, segment_file
+
+
+class _FakeSummarizer:
+    def __init__(self) -> None:
+        self.prompts: list[str] = []
+        self.running = 0
+        self.peak = 0
+
+    async def __call__(self, prompt: str, text: str) -> str:
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        self.prompts.append(prompt)
+        return f"summary of {len(text)} chars"
+
+
+@pytest.fixture
+def fake_llm(tmp_path: Path, monkeypatch) -> _FakeSummarizer:
+    monkeypatch.setattr(sa, "SUMMARY_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(sa, "SUMMARY_CHUNK_CHARS", 200)
+    monkeypatch.setattr(sa, "SUMMARY_CONCURRENCY", 2)
+    fake = _FakeSummarizer()
+    monkeypatch.setattr(sa, "_summarize_text", fake)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_summarize_transcript_map_reduce_is_incremental(fake_llm: _FakeSummarizer):
+    lines = [f"user: message number {i} " + "x" * 30 for i in range(40)]
+
+    # Short transcript: one call.
+    await sa.summarize_transcript(lines[:2])
+    assert fake_llm.prompts == [sa._FINAL_PROMPT]
+    fake_llm.prompts.clear()
+
+    await sa.summarize_transcript(lines)
+    assert fake_llm.prompts.count(sa._MAP_PROMPT) == len(sa._chunk_lines(lines, 200)) > 1
+    assert fake_llm.prompts[-1] == sa._REDUCE_PROMPT
+    assert fake_llm.peak == 2
+    fake_llm.prompts.clear()
+
+    # Session grew: only the changed last chunk is summarized again.
+    await sa.summarize_transcript(lines + ["assistant: done"])
+    assert fake_llm.prompts.count(sa._MAP_PROMPT) == 1
+
+
+@pytest.mark.asyncio
+async def test_summarize_transcript_terminates_with_verbose_partials(fake_llm: _FakeSummarizer, monkeypatch):
+    # Every partial is longer than half a chunk: none could share a group.
+    async def verbose(prompt: str, text: str) -> str:
+        await fake_llm(prompt, text)
+        return "y" * 150
+
+    monkeypatch.setattr(sa, "_summarize_text", verbose)
+    lines = [f"user: message number {i} " + "x" * 30 for i in range(40)]
+
+    await sa.summarize_transcript(lines)
+    n_map = len(sa._chunk_lines(lines, 200))
+    assert fake_llm.prompts[-1] == sa._REDUCE_PROMPT
+    # Each merge level at most halves the partials.
+    assert fake_llm.prompts.count(sa._MERGE_PROMPT) < n_map
+
+
+def test_chunk_lines_is_prefix_stable():
+    lines = [str(i) * 15 for i in range(30)]
+    a = sa._chunk_lines(lines, 100)
+    b = sa._chunk_lines(lines + ["tail"], 100)
+    assert b[: len(a) - 1] == a[:-1]
+    assert all(len(c) <= 100 for c in a)
+
+
+@pytest.fixture
+def live_dir(tmp_path: Path, monkeypatch) -> Path:
+    # Sessions, archive packs and jobs all live under data/ (relative paths).
+    monkeypatch.chdir(tmp_path)
+    sessions = tmp_path / "data" / "sessions"
+    sessions.mkdir(parents=True)
+    idx = si.SessionsIndex(sessions / "index.json")
+    monkeypatch.setattr(si, "sessions_index", idx)
+    monkeypatch.setattr(sa, "sessions_index", idx)
+    monkeypatch.setattr(sa, "job_queue", JobQueue(tmp_path / "data" / "jobs"))
+    return sessions
+
+
+def _write_items(path: Path, items: list[dict]) -> None:
+    with path.open("a", encoding="utf-8") as f:
+        for it in items:
+            f.write(json.dumps(it, ensure_ascii=False) + "\n")
+
+
+def test_archive_moves_session_into_pack_and_restores(live_dir: Path):
+    path = live_dir / "1700000000000.jsonl"
+    old = [{"role": "user", "content": f"old {i}"} for i in range(3)]
+    new = [{"role": "assistant", "content": "新的回复"}]
+    _write_items(path, old)
+    seal_active(path)
+    compact_session(path)
+    _write_items(path, new)
+
+    res = sa.archive_session_store(session_id="1700000000000")
+    assert res["ok"] and not path.exists() and not (live_dir / "segments" / "1700000000000").exists()
+    assert (Path("data/archive") / f"{res['pack']}.pack").exists()
+
+    entry = archive_pack.find_member("1700000000000")
+    assert entry is not None and entry["items"] == 4
+    assert list(archive_pack.iter_member_items(entry)) == old + new
+    assert [e["session_id"] for e in archive_pack.list_members()] == ["1700000000000"]
+
+    assert sa.restore_session_store(session_id="1700000000000") == {
+        "ok": True, "restored_session_id": "1700000000000", "items": 4,
+    }
+    assert read_items(path) == old + new
+    assert sa.restore_session_store(session_id="1700000000000")["error"] == "session_exists"
+
+
+def test_corrupt_member_is_not_restored(live_dir: Path):
+    path = live_dir / "1.jsonl"
+    _write_items(path, [{"role": "user", "content": "x" * 1000}])
+    assert sa.archive_session_store(session_id="1")["ok"]
+
+    entry = archive_pack.find_member("1")
+    pack = Path("data/archive") / f"{entry['pack']}.pack"
+    data = bytearray(pack.read_bytes())
+    data[entry["offset"] + entry["length"] - 12] ^= 0xFF
+    pack.write_bytes(bytes(data))
+
+    assert sa.restore_session_store(session_id="1")["error"] == "archive_member_corrupt"
+    assert not path.exists()
+
+
+def test_unreadable_segment_keeps_live_store_and_queues_nothing(live_dir: Path):
+    path = live_dir / "1.jsonl"
+    _write_items(path, [{"role": "user", "content": "sealed"}])
+    seg_id = seal_active(path)
+    compact_session(path)
+    _write_items(path, [{"role": "assistant", "content": "active"}])
+    segment_file(path, seg_id).unlink()
+
+    assert sa.archive_session_store(session_id="1")["error"] == "archive_pack_failed"
+    assert path.exists() and sa.job_queue.list_jobs() == []
+    assert archive_pack.find_member("1") is None
+
+
+def test_corrupt_line_is_skipped_and_short_member_leaves_nothing(live_dir: Path):
+    path = live_dir / "1.jsonl"
+    _write_items(path, [{"role": "user", "content": "q"}])
+    with path.open("a", encoding="utf-8") as f:
+        f.write('{"role": "assistant", "cont\n')  # torn line, not an item
+    _write_items(path, [{"role": "assistant", "content": "a"}])
+
+    res = sa.archive_session_store(session_id="1")
+    assert res["ok"] and archive_pack.find_member("1")["items"] == 2
+
+    # A member short of the expected count is truncated away, unindexed.
+    pack = Path("data/archive") / f"{res['pack']}.pack"
+    size = pack.stat().st_size
+    with pytest.raises(archive_pack.MemberIncomplete):
+        archive_pack.append_member("2", [b'{"role": "user"}\n'], expected_items=lambda: 2)
+    assert pack.stat().st_size == size and archive_pack.find_member("2") is None
@@ -0,0 +1,108 @@
+# Test rolling session compaction
+
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import session_compactor
+from src.budget_session import estimate_tokens
+from src.jsonl_session import JsonlSession, read_items
+from src.session_segments import compact_session as compress_segments, load_manifest, seal_active, segment_file
+
+
+def _turn(i: int) -> list[dict]:
+    return [
+        {"role": "user", "content": f"question {i} " + "q" * 200},
+        {"role": "assistant", "content": f"answer {i} " + "a" * 200},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_compact_session_folds_oldest_turns(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def fake_summarize(items):
+        return f"{len(items)} items"
+
+    monkeypatch.setattr(session_compactor, "summarize_items", fake_summarize)
+
+    session = JsonlSession("1", path=tmp_path / "data/sessions/1.jsonl")
+    for i in range(20):
+        await session.add_items(_turn(i))
+
+    assert await session_compactor.compact_session(session, lock=asyncio.Lock(), threshold_tokens=1000)
+
+    items = await session.get_items()
+    assert session_compactor.is_summary_item(items[0])
+    assert items[-1]["content"].startswith("answer 19")
+    assert len(items) < 40
+    folded = int(items[0]["content"].split("\n")[1].split()[0])
+    assert folded + len(items) - 1 == 40
+    assert list((tmp_path / "data/sessions/compacted/1").glob("*.jsonl.gz"))
+
+    # Below the threshold: nothing to do.
+    assert not await session_compactor.compact_session(session, lock=asyncio.Lock(), threshold_tokens=100000)
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_unfolded_segments_untouched(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def fake_summarize(items):
+        return f"{len(items)} items"
+
+    monkeypatch.setattr(session_compactor, "summarize_items", fake_summarize)
+
+    path = tmp_path / "data/sessions/1.jsonl"
+    session = JsonlSession("1", path=path)
+    for seg in range(3):
+        for i in range(10 * seg, 10 * seg + 10):
+            await session.add_items(_turn(i))
+        await session.flush()
+        seal_active(path)
+    await session.add_items(_turn(30))
+    await session.flush()
+    compress_segments(path)
+    before = await session.get_items()
+    last_seg = load_manifest(path)[-1]
+    last_file = segment_file(path, last_seg["id"])
+
+    # Keeps ~15 turns verbatim: the fold ends inside the second segment.
+    assert await session_compactor.compact_session(session, lock=asyncio.Lock(), threshold_tokens=3900)
+
+    segs = load_manifest(path)
+    assert len(segs) == 2 and segs[-1] == last_seg and segment_file(path, last_seg["id"]) == last_file
+    items = read_items(path)
+    assert session_compactor.is_summary_item(items[0])
+    folded = int(items[0]["content"].split("\n")[1].split()[0])
+    assert 20 < folded < 40 and items[1:] == before[folded:]
+
+
+@pytest.mark.asyncio
+async def test_long_prefix_is_folded_in_bounded_passes(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    calls: list[int] = []
+
+    async def fake_summarize(items):
+        calls.append(sum(estimate_tokens(it) for it in items))
+        return f"{len(items)} items"
+
+    monkeypatch.setattr(session_compactor, "summarize_items", fake_summarize)
+    monkeypatch.setattr(session_compactor, "COMPACT_MAX_FOLD_TOKENS", 1000)
+
+    path = tmp_path / "elsewhere" / "1.jsonl"
+    session = JsonlSession("1", path=path)
+    for i in range(40):
+        await session.add_items(_turn(i))
+
+    assert await session_compactor.compact_session(session, lock=asyncio.Lock(), threshold_tokens=2000)
+    assert len(calls) > 1 and max(calls) <= 1000
+    assert sum(estimate_tokens(it) for it in read_items(path)) <= 2000
+    # Raw items are kept next to the session file, not under the cwd.
+    assert list((tmp_path / "elsewhere" / "compacted" / "1").glob("*.jsonl.gz"))
+    assert not (tmp_path / "data").exists()
@@ -0,0 +1,92 @@
+# Test paginated session history
+
+from pathlib import Path
+import json
+import sys
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import session_history, session_segments
+from src.jsonl_session import JsonlSession
+
+
+def _turns(n: int) -> list[dict]:
+    items: list[dict] = []
+    for i in range(n):
+        items.append({"role": "user", "content": f"q{i}"})
+        items.append({"type": "function_call", "name": "grep", "call_id": f"c{i}", "arguments": "{}"})
+        items.append({"type": "function_call_output", "call_id": f"c{i}", "output": "ok"})
+        items.append({"role": "assistant", "content": f"a{i}"})
+    return items
+
+
+@pytest.fixture
+def sessions_dir(tmp_path: Path, monkeypatch) -> Path:
+    monkeypatch.setattr(session_history, "SESSIONS_DIR", tmp_path)
+    monkeypatch.setattr(session_segments, "SEGMENT_MAX_BYTES", 400)
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_history_page_walks_back_across_segments(sessions_dir: Path):
+    session = JsonlSession("1", path=sessions_dir / "1.jsonl", durability="os")
+    await session.add_items(_turns(30))
+    await session.flush()
+    assert session_segments.load_manifest(sessions_dir / "1.jsonl")
+
+    texts: list[str] = []
+    page = session_history.history_page(session_id="1", limit=7)
+    while True:
+        texts[:0] = [e["text"] for e in page["events"] if "text" in e]
+        if not page["has_more"]:
+            break
+        page = session_history.history_page(session_id="1", before=page["before"], limit=7)
+
+    assert texts == [t for i in range(30) for t in (f"q{i}", f"a{i}")]
+
+
+@pytest.mark.asyncio
+async def test_messages_page_and_ws_initial_page(sessions_dir: Path):
+    session = JsonlSession("2", path=sessions_dir / "2.jsonl", durability="os")
+    await session.add_items(_turns(10))
+    await session.flush()
+
+    first = session_history.get_messages_page(session_id="2", limit=4)
+    assert [m["text"] for m in first["messages"]] == ["q8", "a8", "q9", "a9"]
+    older = session_history.get_messages_page(session_id="2", before=first["before"], limit=100)
+    assert len(older["messages"]) == 16 and not older["has_more"]
+
+    class _WS:
+        def __init__(self) -> None:
+            self.sent: list[dict] = []
+
+        async def send_text(self, s: str) -> None:
+            self.sent.append(json.loads(s))
+
+    ws = _WS()
+    await session_history.push_session_history(ws, session_id="2", limit=4)
+    assert [e["type"] for e in ws.sent[:-1]] == ["user_message", "tool_call", "tool_call", "assistant_message"]
+    assert ws.sent[-1] == {"type": "meta", "event": "history_cursor", "before": 36, "has_more": True}
+
+
+def test_batch_frames_are_size_bounded():
+    events = [{"type": "user_message", "text": "x" * 100} for _ in range(50)]
+    frames = session_history.batch_frames(events, max_bytes=1000)
+
+    assert len(frames) > 1
+    assert all(len(f) <= 1000 for f in frames)
+    decoded = [json.loads(f) for f in frames]
+    assert all(d["type"] == "history_batch" for d in decoded)
+    assert [e for d in decoded for e in d["events"]] == events
+
+    # An oversized event still goes out, alone.
+    big = [{"type": "user_message", "text": "y" * 5000}]
+    assert [json.loads(f)["events"] for f in session_history.batch_frames(big, max_bytes=1000)] == [big]
+
+    # The bound is in UTF-8 bytes, not characters.
+    cjk = [{"type": "user_message", "text": "网" * 100} for _ in range(20)]
+    frames = session_history.batch_frames(cjk, max_bytes=1000)
+    assert all(len(f.encode("utf-8")) <= 1000 for f in frames)
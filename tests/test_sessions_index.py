@@ -0,0 +1,73 @@
+# Test in-memory sessions index
+
+from pathlib import Path
+import json
+import sys
+import time
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import sessions_index as si
+from src.jsonl_session import JsonlSession
+
+
+@pytest.fixture
+def index(tmp_path: Path, monkeypatch) -> si.SessionsIndex:
+    monkeypatch.setattr(si, "SESSIONS_DIR", tmp_path)
+    idx = si.SessionsIndex(tmp_path / "index.json")
+    monkeypatch.setattr(si, "sessions_index", idx)
+    return idx
+
+
+@pytest.mark.asyncio
+async def test_index_tracks_create_append_remove_without_rescans(index: si.SessionsIndex, tmp_path: Path, monkeypatch):
+    a = si.create_session()["session_id"]
+    (tmp_path / "1.jsonl").write_text("", encoding="utf-8")
+    index.note_created("1")
+
+    session = JsonlSession(a, path=tmp_path / f"{a}.jsonl", durability="os")
+    await session.add_items([{"role": "user", "content": "  How do I\\n rotate logs?  "}, {"role": "assistant", "content": "x"}])
+    await session.flush()
+
+    # Reads and events must not glob the directory again.
+    monkeypatch.setattr(Path, "glob", lambda *a, **k: (_ for _ in ()).throw(AssertionError("rescan")))
+    index.note_activity(a)
+    snap = si.load_sessions_index()
+    assert [s["session_id"] for s in snap["sessions"]] == [a, "1"]
+    assert snap["active_session_id"] == a
+    meta = snap["sessions"][0]
+    assert meta["items"] == 2 and meta["bytes"] == (tmp_path / f"{a}.jsonl").stat().st_size
+    assert meta["title"] == "How do I\\n rotate logs?" and meta["last_activity"] > 0
+
+    index.note_removed(a)
+    assert si.load_sessions_index()["active_session_id"] == "1"
+
+
+def test_index_save_is_debounced_and_reloads(index: si.SessionsIndex, tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(si, "INDEX_SAVE_DEBOUNCE_S", 0.2)
+    writes: list[float] = []
+    save = index.save
+    monkeypatch.setattr(index, "save", lambda: (writes.append(time.monotonic()), save()))
+
+    # A burst of mutations...
+    t0 = time.monotonic()
+    sid = si.create_session()["session_id"]
+    for other in ("1", "2"):
+        (tmp_path / f"{other}.jsonl").write_text("", encoding="utf-8")
+        index.note_created(other)
+    index.set_active(sid)
+    index.note_activity(sid)
+    path = tmp_path / "index.json"
+    assert not path.exists()
+
+    # ...is written once, after the debounce interval.
+    time.sleep(0.6)
+    assert len(writes) == 1 and writes[0] - t0 >= 0.2
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["active_session_id"] == sid and len(data["sessions"]) == 3
+
+    fresh = si.SessionsIndex(path)
+    assert fresh.snapshot() == data
@@ -0,0 +1,76 @@
+# Test SqliteSession store
+
+from pathlib import Path
+import json
+import sqlite3
+import sys
+
+import pytest
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import sqlite_session
+from src.sqlite_session import SqliteSession, count_items, migrate_jsonl_sessions, read_chat_items, read_items_range
+
+
+@pytest.mark.asyncio
+async def test_sqlite_session_roundtrip(tmp_path: Path):
+    db = tmp_path / "sessions.db"
+    session = SqliteSession("1", db_path=db)
+    await session.add_items([{"role": "user", "content": "q"}, {"type": "function_call", "name": "grep"}])
+    await session.add_items([{"role": "assistant", "content": "a"}])
+
+    assert [it.get("content") for it in await session.get_items()] == ["q", None, "a"]
+    assert await session.get_items(limit=1) == [{"role": "assistant", "content": "a"}]
+    assert [it["content"] for it in read_chat_items("1", 5, db_path=db)] == ["q", "a"]
+    assert count_items("1", db_path=db) == 3
+    assert read_items_range("1", 1, 3, db_path=db)[1] == {"role": "assistant", "content": "a"}
+
+    assert await session.pop_item() == {"role": "assistant", "content": "a"}
+    assert len(await session.get_items()) == 2
+
+    await session.clear_session()
+    assert await session.get_items() == []
+    assert await SqliteSession("2", db_path=db).pop_item() is None
+
+
+@pytest.mark.asyncio
+async def test_migrate_jsonl_sessions_is_export_compatible(tmp_path: Path):
+    sessions_dir = tmp_path / "sessions"
+    sessions_dir.mkdir()
+    lines = [json.dumps({"role": "user", "content": str(i)}) for i in range(3)]
+    (sessions_dir / "123.jsonl").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    db = tmp_path / "sessions.db"
+    res = migrate_jsonl_sessions(sessions_dir, db_path=db)
+    assert res["migrated"] == ["123"] and res["items"] == 3
+    assert migrate_jsonl_sessions(sessions_dir, db_path=db)["skipped"] == ["123"]
+
+    # Same query as z/export_session.py.
+    con = sqlite3.connect(db)
+    rows = con.execute(
+        "SELECT id, session_id, created_at, message_data FROM agent_messages "
+        "WHERE session_id = ? ORDER BY created_at ASC, id ASC",
+        ("123",),
+    ).fetchall()
+    con.close()
+    assert [json.loads(r[3])["content"] for r in rows] == ["0", "1", "2"]
+
+
+def test_interrupted_migration_leaves_no_empty_session(tmp_path: Path, monkeypatch):
+    sessions_dir = tmp_path / "sessions"
+    sessions_dir.mkdir()
+    (sessions_dir / "123.jsonl").write_text(json.dumps({"role": "user", "content": "q"}) + "\n", encoding="utf-8")
+    db = tmp_path / "sessions.db"
+
+    def boom(item):
+        raise RuntimeError("interrupted")
+
+    with monkeypatch.context() as m:
+        m.setattr(sqlite_session, "item_kind", boom)
+        with pytest.raises(RuntimeError):
+            migrate_jsonl_sessions(sessions_dir, db_path=db)
+
+    res = migrate_jsonl_sessions(sessions_dir, db_path=db)
+    assert res["migrated"] == ["123"] and count_items("123", db_path=db) == 1
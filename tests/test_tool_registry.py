@@ -0,0 +1,36 @@
+# Test lazy tool registry and its schema manifest
+
+from pathlib import Path
+import asyncio
+import json
+import sys
+
+# Ensure repo root is importable so `import src...` works under pytest/uv on Windows
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import tool_registry as tr
+
+
+def test_manifest_is_up_to_date():
+    # If this fails: python -m src.tool_registry --build
+    manifest = json.loads(tr.TOOLS_MANIFEST_PATH.read_text(encoding="utf-8"))["tools"]
+    assert sorted(manifest) == tr.tool_names()
+    for name, entry in manifest.items():
+        assert entry["source_sha256"] == tr._source_sha256(name), name
+        assert entry["params_json_schema"] == tr.import_tool(name).params_json_schema
+
+
+def test_tools_are_imported_on_first_call(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(tr, "_tools", {})
+    imported: list[str] = []
+    real_import = tr.import_tool
+    monkeypatch.setattr(tr, "import_tool", lambda name: imported.append(name) or real_import(name))
+
+    tool = tr.get_tool("read_file")
+    assert tool is tr.get_tool("read_file") and imported == []
+    assert tool.params_json_schema == real_import("read_file").params_json_schema
+
+    (tmp_path / "a.txt").write_text("hello", encoding="utf-8")
+    out = asyncio.run(tool.on_invoke_tool(None, json.dumps({"path": str(tmp_path / "a.txt")})))
+    assert imported == ["read_file"] and "hello" in str(out)
+    assert tr.get_tool("no_such_tool") is None
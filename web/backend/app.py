@@ -1,34 +1,45 @@
 import asyncio
+import importlib
 import json
 import os
+import sys
 import time
 import uuid
+from pathlib import Path
+from types import ModuleType
 from typing import Any
 import subprocess
 
-from src.stt import b64decode_audio, stt_transcribe_audio
-from src.tts import (
-    get_tts_state,
-    tts_enqueue_text,
-    tts_finalize_reply,
-    tts_maybe_start_worker,
-    tts_reset_session,
-    voice_output_enabled_by_session,
-)
-
 import dotenv
 from agents import Runner
 from openai.types.responses import ResponseTextDeltaEvent
 
+from src.budget_session import with_token_budget
 from src.jsonl_session import JsonlSession
+from src.session_compactor import compact_session
+from src.session_segments import schedule_pending_compactions
+from src.fs_watcher import FsWatcher
+from src.search_index import search_index, start_indexer as start_search_indexer, watch_diary
+from src.session_store import open_session, prefetch_session, watch_sessions
 from fastapi import FastAPI, WebSocket
-
-from src.load_agent import create_handoff_obj, load_main_agent, load_sub_agents
-from src.session_history import get_recent_messages, push_session_history
-from src.sessions_index import SESSIONS_DIR, create_session as create_session_store, ensure_session_db, load_sessions_index, rebuild_sessions_index, set_active_session_id
-from src.settings import settings
+from fastapi.responses import StreamingResponse
+
+from src.agent_pool import AgentPool
+from src.config_watcher import SETTINGS_PATH, ConfigWatcher
+from src.load_agent import create_handoff_obj, invalidate_caches as invalidate_agent_caches, load_main_agent, load_sub_agents, recall_query
+from src.session_history import (
+    HISTORY_PAGE_SIZE,
+    WS_PROTOCOL_VERSION,
+    get_messages_page,
+    history_page,
+    push_session_history,
+)
+from src.sessions_index import SESSIONS_DIR, create_session as create_session_store, ensure_session_db, load_sessions_index, sessions_index, set_active_session_id
+from src.settings import reload_settings, settings
 from src.logger import current_session_id, logger
-from src.session_archive import archive_session_store
+from src.job_queue import JobQueueFull, backoff_s, job_queue
+from src import archive_pack
+from src.session_archive import archive_session_store, register_archive_jobs, restore_session_store
 
 # Voice output (TTS) debug: if set, server will send this mp3 payload for every tts_audio_segment.
 # Prefer setting env var `TTS_FAKE_AUDIO_PATH` instead of hardcoding.
@@ -129,6 +140,9 @@ class EventBus:
                         self._clients.pop(ws, None)
 
 event_bus = EventBus()
+# Watcher on data/sessions (started on startup).
+sessions_watcher: FsWatcher | None = None
+diary_watcher: FsWatcher | None = None
 
 
 async def _emit(payload: dict[str, Any]) -> None:
@@ -152,17 +166,50 @@ async def _startup() -> None:
     asyncio.create_task(event_bus.run())
     # Ensure sessions index exists.
     load_sessions_index()
+    # Compress sealed session segments left over from a previous run.
+    schedule_pending_compactions(SESSIONS_DIR)
+    # Background jobs (archive summaries, bulk archive), resumed from data/jobs/.
+    register_archive_jobs(job_queue)
+    await job_queue.start()
+    # Full-text search: feed from add_items, backfill older sessions.
+    start_search_indexer()
+    # Follow writes from other processes (CLI) instead of re-globbing.
+    global sessions_watcher
+    sessions_watcher = watch_sessions(SESSIONS_DIR)
+    logger.log(f"sessions.watcher backend={sessions_watcher.backend}")
+    # Keep recalled diary notes current as the recorder writes them.
+    global diary_watcher
+    diary_watcher = watch_diary()
+    # Agent bundles for new sessions, built off the event loop.
+    agent_pool.start()
+    # Apply edits to agents/ and data/setting.json without a restart.
+    global config_watcher
+    loop = asyncio.get_running_loop()
+    config_watcher = ConfigWatcher(lambda changed: loop.call_soon_threadsafe(_schedule_config_reload, changed)).start()
+
+
+@app.on_event("shutdown")
+async def _shutdown() -> None:
+    if config_watcher is not None:
+        config_watcher.stop()
+    await agent_pool.stop()
+    await job_queue.stop()
+    if sessions_watcher is not None:
+        sessions_watcher.stop()
+    if diary_watcher is not None:
+        diary_watcher.stop()
+    sessions_index.save()
 
 @app.get("/api/sessions")
 async def list_sessions() -> dict[str, Any]:
     """List available sessions.
 
     Notes:
-        - Source of truth is `data/sessions/*.jsonl`.
-        - Index is rebuilt on demand.
+        - Served from the in-memory sessions index (see `src/sessions_index.py`).
+        - Each entry carries items, bytes, last_activity and title.
     """
 
-    index = rebuild_sessions_index()
+    index = load_sessions_index()
     return {"sessions": index.get("sessions", []), "active_session_id": index.get("active_session_id")}
 
 
@@ -197,8 +244,8 @@ async def create_session() -> dict[str, Any]:
     created = create_session_store()
     session_id = created["session_id"]
 
-    # Pre-warm agent bundle for the new session.
-    agents_by_session[session_id] = _new_session_agent()
+    # Hand the new session a prebuilt agent bundle (see `src/agent_pool.py`).
+    agents_by_session[session_id] = await agent_pool.take_async()
 
     return created
 
@@ -210,7 +257,7 @@ async def archive_session(session_id: str) -> dict[str, Any]:
     Notes:
         - Triggered by WebUI "End session".
         - Runs the sync archiver in a worker thread (it calls Runner.run_sync).
-        - Ensure no active SQLiteSession is holding the jsonl file.
+        - Ensure no active session store is holding the jsonl file.
     """
 
     # Drop in-memory agent bundle for this session.
@@ -223,25 +270,97 @@ async def archive_session(session_id: str) -> dict[str, Any]:
     return await asyncio.to_thread(archive_session_store, session_id=session_id)
 
 
+@app.get("/api/archive")
+async def list_archived_sessions() -> dict[str, Any]:
+    """List sessions in cold storage (see `src/archive_pack.py`), newest first."""
+
+    return {"sessions": await asyncio.to_thread(archive_pack.list_members)}
+
+
+@app.get("/api/archive/{session_id}", response_model=None)
+async def export_archived_session(session_id: str) -> StreamingResponse | dict[str, Any]:
+    """Stream the raw items of an archived session as JSONL."""
+
+    entry = await asyncio.to_thread(archive_pack.find_member, session_id) if session_id.isdigit() else None
+    if entry is None:
+        return {"ok": False, "error": "archived_session_missing"}
+    return StreamingResponse(
+        archive_pack.iter_member(entry),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{session_id}.jsonl"'},
+    )
+
+
+@app.post("/api/archive/{session_id}/restore")
+async def restore_archived_session(session_id: str) -> dict[str, Any]:
+    """Move an archived session back into the live sessions."""
+
+    return await asyncio.to_thread(restore_session_store, session_id=session_id)
+
+
+@app.post("/api/sessions/archive_idle")
+async def archive_idle_sessions(days: float = 30) -> dict[str, Any]:
+    """Queue a bulk job archiving every session idle for more than `days` days."""
+
+    if days <= 0:
+        return {"ok": False, "error": "invalid_days"}
+    try:
+        job = job_queue.submit("archive_idle", {"days": days})
+    except JobQueueFull:
+        return {"ok": False, "error": "job_queue_full"}
+    return {"ok": True, "job_id": job.id}
+
+
+@app.get("/api/jobs")
+async def list_jobs() -> dict[str, Any]:
+    """List open (pending/running) and failed background jobs."""
+
+    jobs = job_queue.list_jobs()
+    for j in jobs:
+        # Captured transcripts can be large.
+        j["payload"] = {k: v for k, v in j["payload"].items() if k != "messages"}
+    return {"jobs": jobs}
+
+
+@app.get("/api/search")
+async def search_conversations(q: str, limit: int = 20, session_id: str | None = None) -> dict[str, Any]:
+    """Full-text search over past messages and session summaries."""
+
+    t0 = time.perf_counter()
+    results = await asyncio.to_thread(search_index.search, q, limit=limit, session_id=session_id)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    return {"query": q, "results": results, "elapsed_ms": round(elapsed_ms, 2)}
+
+
 @app.get("/api/messages")
-async def get_messages(limit: int = 50, session_id: str | None = None) -> dict[str, Any]:
+async def get_messages(limit: int = 50, session_id: str | None = None, before: int | None = None) -> dict[str, Any]:
+    """Return user/assistant messages, newest page first.
+
+    Pagination: pass the returned `before` cursor back to get older messages.
+    """
+
     limit = max(1, min(int(limit), 200))
 
     if session_id is None:
         session_id = load_sessions_index().get("active_session_id")
     if not isinstance(session_id, str) or not session_id.isdigit():
-        return {"messages": []}
+        return {"messages": [], "before": 0, "has_more": False}
 
-    return {"messages": get_recent_messages(session_id=session_id, limit=limit)}
+    return await asyncio.to_thread(get_messages_page, session_id=session_id, before=before, limit=limit)
 
-def _new_session_agent():
-    """Create a fresh agent bundle for a new session."""
+def _new_session_agent(current: str | None = None):
+    """Create a fresh agent bundle for a new session.
+
+    Args:
+        current: Return this agent of the bundle (by name) instead of the
+            main agent, e.g. to keep a session on the sub-agent it is on.
+    """
 
     agent = load_main_agent()
     agent_handoff_obj = create_handoff_obj(agent)
     subs = load_sub_agents(handoffs=[agent_handoff_obj])
     agent.handoffs = [create_handoff_obj(sub_agent) for sub_agent in subs]
-    return agent
+    return next((a for a in subs if a.name == current), agent)
 
 def _get_run_lock(session_id: str) -> asyncio.Lock:
     """Get per-session run lock.
@@ -260,9 +379,147 @@ def _get_run_lock(session_id: str) -> asyncio.Lock:
 
 run_locks_by_session: dict[str, asyncio.Lock] = {}
 agents_by_session: dict[str, Any] = {}
+agent_pool = AgentPool(_new_session_agent)
+compaction_tasks_by_session: dict[str, asyncio.Task] = {}
+# session_id -> (consecutive compaction failures, earliest retry time).
+compaction_failures_by_session: dict[str, tuple[int, float]] = {}
+config_watcher: ConfigWatcher | None = None
+# One reload at a time, so an older rebuild never lands after a newer one.
+config_reload_lock = asyncio.Lock()
+# Running reloads (the loop only keeps weak references to tasks).
+config_reload_tasks: set[asyncio.Task] = set()
+
+
+def _schedule_config_reload(changed: list[Path]) -> None:
+    task = asyncio.create_task(_reload_configs(changed))
+    config_reload_tasks.add(task)
+    task.add_done_callback(config_reload_tasks.discard)
+
+
+async def _reload_configs(changed: list[Path]) -> None:
+    """Apply changed agent configs / settings (see `src/config_watcher.py`).
+
+    Notes:
+        - New bundles are built in worker threads; each session's bundle is
+          swapped under its run lock, i.e. between turns.
+        - Sessions, websockets, caches and the voice models stay loaded.
+    """
+
+    async with config_reload_lock:
+        await _reload_configs_locked(changed)
+
+
+async def _reload_configs_locked(changed: list[Path]) -> None:
+    t0 = time.perf_counter()
+    if SETTINGS_PATH in changed:
+        try:
+            changed_fields = await asyncio.to_thread(reload_settings, str(SETTINGS_PATH))
+        except Exception as e:
+            logger.log(f"config.reload_failed path={SETTINGS_PATH} err={e!r}")
+            return
+        logger.log(f"config.settings_reloaded changed={','.join(changed_fields) or '-'}")
+    # Compiled templates embed settings values.
+    invalidate_agent_caches()
+    agent_pool.clear()
+
+    swapped = failed = 0
+    for session_id in list(agents_by_session):
+        current = getattr(agents_by_session.get(session_id), "name", None)
+        try:
+            bundle = await asyncio.to_thread(_new_session_agent, current)
+            async with _get_run_lock(session_id):
+                if session_id not in agents_by_session:
+                    continue
+                if getattr(agents_by_session[session_id], "name", None) != current:
+                    # Handed off meanwhile.
+                    bundle = await asyncio.to_thread(_new_session_agent, agents_by_session[session_id].name)
+                agents_by_session[session_id] = bundle
+                swapped += 1
+        except Exception as e:
+            # E.g. a half-written agent.json: this session keeps its bundle
+            # (the next change retries); the others are still swapped.
+            failed += 1
+            logger.log(f"config.reload_failed session_id={session_id} err={e!r}")
+
+    elapsed_ms = int((time.perf_counter() - t0) * 1000)
+    logger.log(f"config.reloaded files={len(changed)} sessions={swapped} failed={failed} elapsed_ms={elapsed_ms}")
+
+
+
+def _schedule_compaction(session_id: str, session: Any) -> None:
+    """Fold old turns into a summary item in the background.
+
+    Notes:
+        - At most one compaction per session at a time.
+        - Only the final splice takes the per-session run lock.
+        - After a failure, the session is not retried before an exponential
+          backoff (as for background jobs) has passed.
+    """
+
+    if not isinstance(session, JsonlSession):
+        return
+    task = compaction_tasks_by_session.get(session_id)
+    if task is not None and not task.done():
+        return
+    failures, retry_at = compaction_failures_by_session.get(session_id, (0, 0.0))
+    if time.time() < retry_at:
+        return
+
+    async def _run() -> None:
+        try:
+            await compact_session(session, lock=_get_run_lock(session_id))
+        except Exception as e:
+            n = failures + 1
+            compaction_failures_by_session[session_id] = (n, time.time() + backoff_s(n))
+            logger.log(f"session.compact.failed session_id={session_id} failures={n} err={e!r}")
+        else:
+            compaction_failures_by_session.pop(session_id, None)
+
+    compaction_tasks_by_session[session_id] = asyncio.create_task(_run())
+
+async def _prefetch_session(session_id: str) -> None:
+    """Prepare a session for its next turn (on WS connect).
+
+    Notes:
+        - Assigns a pooled agent bundle if the session has none yet.
+        - Loads the session items (and token estimates) into the item cache.
+    """
+
+    t0 = time.perf_counter()
+    try:
+        if session_id not in agents_by_session:
+            bundle = await agent_pool.take_async()
+            agents_by_session.setdefault(session_id, bundle)
+        items = await asyncio.to_thread(prefetch_session, session_id)
+    except Exception as e:
+        logger.log(f"session.prefetch_failed session_id={session_id} err={e!r}")
+        return
+    elapsed_ms = int((time.perf_counter() - t0) * 1000)
+    logger.log(f"session.prefetched session_id={session_id} items={items} elapsed_ms={elapsed_ms}")
+
+# --- Voice stack (src/stt.py, src/tts.py)
+# Imported on the first voice_input / voice_output_toggle: faster_whisper and
+# the TTS client are not needed by text-only use and slow down startup.
+
+async def _voice_module(name: str) -> ModuleType:
+    """Import `src.<name>` ("stt" or "tts") off the event loop on first use."""
+
+    mod = sys.modules.get(f"src.{name}")
+    if mod is None:
+        t0 = time.perf_counter()
+        mod = await asyncio.to_thread(importlib.import_module, f"src.{name}")
+        logger.log(f"voice.imported module=src.{name} ms={int((time.perf_counter() - t0) * 1000)}")
+    return mod
+
+
+def _tts_if_enabled(session_id: str) -> ModuleType | None:
+    """Return src.tts if voice output is on for the session (never imports it)."""
+
+    tts = sys.modules.get("src.tts")
+    if tts is None or not tts.get_tts_state(session_id).enabled:
+        return None
+    return tts
 
-# --- Voice output (TTS)
-# Implementation moved to src/tts.py
 
 async def _ws_publish(session_id: str, payload: dict[str, Any]) -> None:
     """Publish a websocket event scoped to a session."""
@@ -297,8 +554,8 @@ async def _run_agent_streaming_for_user_text(
     async with _get_run_lock(session_id):
         current_agent = agents_by_session.get(session_id)
         if current_agent is None:
-            current_agent = _new_session_agent()
-            agents_by_session[session_id] = current_agent
+            # Normally already set by the WS-connect prefetch.
+            current_agent = agents_by_session.setdefault(session_id, await agent_pool.take_async())
 
         message_id = reply_to_message_id
         t0 = time.time()
@@ -308,12 +565,14 @@ async def _run_agent_streaming_for_user_text(
             + f"model={getattr(current_agent, 'model', None)} key_set={bool(os.getenv('OPENAI_API_KEY'))}"
         )
 
-        session = JsonlSession(session_id, path=str(SESSIONS_DIR / f"{session_id}.jsonl"))
+        session = open_session(session_id)
 
+        # Past summaries/diary entries relevant to this message (first run of the bundle).
+        recall_query.set(user_text)
         streamed = Runner.run_streamed(
             current_agent,
             user_text,
-            session=session,  # type: ignore
+            session=with_token_budget(session),  # type: ignore
             max_turns=settings.default_max_turns,
         )
 
@@ -340,9 +599,9 @@ async def _run_agent_streaming_for_user_text(
                 )
 
                 try:
-                    st = get_tts_state(session_id)
-                    if st.enabled:
-                        await tts_enqueue_text(
+                    tts = _tts_if_enabled(session_id)
+                    if tts is not None:
+                        await tts.tts_enqueue_text(
                             session_id=session_id,
                             reply_to=reply_to_message_id,
                             text_delta=delta,
@@ -356,6 +615,36 @@ async def _run_agent_streaming_for_user_text(
         dt_ms = int((time.time() - t0) * 1000)
         logger.log(f"ws.runner.stream.done id={message_id} ms={dt_ms}")
 
+        # Provider-side prompt cache hits (see settings.prompt_layout).
+        try:
+            usage = streamed.context_wrapper.usage
+            cached = usage.input_tokens_details.cached_tokens or 0
+            logger.log(
+                "ws.runner.usage "
+                + f"id={message_id} requests={usage.requests} input_tokens={usage.input_tokens} "
+                + f"cached_tokens={cached} cache_hit={cached / max(1, usage.input_tokens):.2f}"
+            )
+        except Exception:
+            pass
+
+        # Turn boundary: make this turn's items durable.
+        try:
+            ws_stats = await session.flush()
+            logger.log(
+                "session.writer "
+                + f"session_id={session_id} groups={ws_stats['groups']} fsyncs={ws_stats['fsyncs']} "
+                + f"write_ms_avg={ws_stats['write_ms_avg']:.2f} fsync_ms_avg={ws_stats['fsync_ms_avg']:.2f} "
+                + f"fsync_ms_max={ws_stats['fsync_ms_max']:.2f}"
+            )
+        except Exception as e:
+            logger.log(f"session.flush_failed session_id={session_id} err={e!r}")
+
+        # Refresh item count/bytes/title in the sessions index.
+        await asyncio.to_thread(sessions_index.note_activity, session_id)
+
+        # Between turns: compact old history off the request path.
+        _schedule_compaction(session_id, session)
+
         last_agent = getattr(streamed, "current_agent", None)
         if last_agent is not None:
             agents_by_session[session_id] = last_agent
@@ -380,9 +669,9 @@ async def _run_agent_streaming_for_user_text(
 
         # Flush final tail buffer and notify client that TTS for this reply is done.
         try:
-            st = get_tts_state(session_id)
-            if st.enabled:
-                await tts_finalize_reply(session_id=session_id, reply_to=reply_to_message_id, publish=_tts_publish)
+            tts = _tts_if_enabled(session_id)
+            if tts is not None:
+                await tts.tts_finalize_reply(session_id=session_id, reply_to=reply_to_message_id, publish=_tts_publish)
         except Exception as e:
             logger.log(f"tts.finalize_failed session_id={session_id} err={e!r}")
         return assistant_message_id, final_text
@@ -394,6 +683,10 @@ async def ws_endpoint(ws: WebSocket) -> None:
 
     Protocol:
         - Client -> server: {"type": "user_message", "message_id": str, "text": str}
+        - Client -> server: {"type": "history_page", "before": int, "limit": int}
+          (cursor from the "history_cursor" meta event / previous page)
+        - Connect with `?proto=2` to receive stored history as
+          {"type": "history_batch", "events": [...]} frames.
         - Server -> client: events published via EventBus.
     """
 
@@ -404,22 +697,41 @@ async def ws_endpoint(ws: WebSocket) -> None:
 
     # Bind confirmation for frontend.
     # Frontend uses this to avoid session switch race conditions.
-    await _ws_publish(session_id, {"type": "meta", "event": "ws_bound", "session_id": session_id})
+    await _ws_publish(
+        session_id,
+        {"type": "meta", "event": "ws_bound", "session_id": session_id, "protocol": WS_PROTOCOL_VERSION},
+    )
     # Frontend uses this to confirm the websocket is bound to the expected session.
 
     await event_bus.add(ws, session_id=session_id)
 
     token = current_session_id.set(session_id)
 
+    # Clients announce their protocol version via ?proto=N (default 1).
+    try:
+        protocol = min(int(ws.query_params.get("proto") or 1), WS_PROTOCOL_VERSION)
+    except ValueError:
+        protocol = 1
+
     try:
-        await push_session_history(ws, session_id=session_id, limit=200)
+        t0 = time.perf_counter()
+        pushed = await push_session_history(ws, session_id=session_id, limit=HISTORY_PAGE_SIZE, protocol=protocol)
+        elapsed_ms = int((time.perf_counter() - t0) * 1000)
+        logger.log(
+            f"ws.history_pushed session_id={session_id} protocol={protocol} events={pushed['events']} "
+            + f"frames={pushed['frames']} bytes={pushed['bytes']} elapsed_ms={elapsed_ms}"
+        )
     except Exception:
         pass
 
+    # Warm the first turn: agent bundle and parsed items, off the request path.
+    prefetch_task = asyncio.create_task(_prefetch_session(session_id))
+
     while True:
         try:
             raw = await ws.receive_text()
         except Exception:
+            prefetch_task.cancel()
             await event_bus.remove(ws)
             current_session_id.reset(token)
             return
@@ -432,6 +744,22 @@ async def ws_endpoint(ws: WebSocket) -> None:
 
         msg_type = msg.get("type")
 
+        if msg_type == "history_page":
+            # Client -> Server: history_page {before, limit}; reply goes to this socket only.
+            before = msg.get("before")
+            limit = msg.get("limit")
+            if not isinstance(before, int) or isinstance(before, bool) or before < 0:
+                await ws.send_text(json.dumps({"type": "error", "message": "invalid_before"}))
+                continue
+            page = await asyncio.to_thread(
+                history_page,
+                session_id=session_id,
+                before=before,
+                limit=limit if isinstance(limit, int) and limit > 0 else HISTORY_PAGE_SIZE,
+            )
+            await ws.send_text(json.dumps(page, ensure_ascii=False))
+            continue
+
         if msg_type == "voice_output_toggle":
             # Client -> Server: voice_output_toggle {session_id, enabled}
             client_session_id = msg.get("session_id")
@@ -453,15 +781,16 @@ async def ws_endpoint(ws: WebSocket) -> None:
                 await _ws_publish(session_id, {"type": "error", "message": "invalid_enabled"})
                 continue
 
-            voice_output_enabled_by_session[session_id] = enabled
+            tts = await _voice_module("tts")
+            tts.voice_output_enabled_by_session[session_id] = enabled
 
-            st = get_tts_state(session_id)
+            st = tts.get_tts_state(session_id)
             st.enabled = enabled
 
             if not enabled:
-                tts_reset_session(session_id=session_id)
+                tts.tts_reset_session(session_id=session_id)
             else:
-                tts_maybe_start_worker(session_id=session_id, publish=_tts_publish)
+                tts.tts_maybe_start_worker(session_id=session_id, publish=_tts_publish)
 
             # Optional ack/meta so frontend can reflect server truth.
             await _ws_publish(session_id, {"type": "meta", "event": "voice_output", "enabled": enabled})
@@ -502,7 +831,13 @@ async def ws_endpoint(ws: WebSocket) -> None:
                 continue
 
             try:
-                audio_bytes = b64decode_audio(audio_b64=audio_b64)
+                stt = await _voice_module("stt")
+            except ImportError as e:
+                logger.log(f"ws.voice_input.stt_unavailable err={e!r}")
+                await _ws_publish(session_id, {"type": "error", "message": "stt_unavailable", "detail": repr(e)})
+                continue
+            try:
+                audio_bytes = stt.b64decode_audio(audio_b64=audio_b64)
             except ValueError as e:
                 await _ws_publish(session_id, {"type": "error", "message": str(e)})
                 continue
@@ -524,7 +859,7 @@ async def ws_endpoint(ws: WebSocket) -> None:
             #     logger.log(f"ws.voice_input.dump_failed id={message_id} err={e!r}")
 
             try:
-                transcript = await stt_transcribe_audio(audio_bytes=audio_bytes, mime=mime)
+                transcript = await stt.stt_transcribe_audio(audio_bytes=audio_bytes, mime=mime)
             except subprocess.CalledProcessError as e:
                 logger.log(f"ws.voice_input.ffmpeg_failed id={message_id} err={e!r}")
                 await _ws_publish(session_id, {"type": "error", "message": "ffmpeg_failed", "detail": repr(e)})